@@ -0,0 +1 @@
+"""Benchmarks of the NApp kytos/of_multi_table."""
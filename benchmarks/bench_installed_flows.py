@@ -0,0 +1,117 @@
+"""Benchmark reading installed flows from MongoDB against flow_manager's API.
+
+It needs a MongoDB reachable with the same environment variables used by
+kytos (MONGO_HOST_SEEDS, MONGO_USERNAME, MONGO_PASSWORD, MONGO_DBNAME).
+By default synthetic flows are inserted in the flows collection of a scratch
+database, which is dropped on every run:
+
+    MONGO_DBNAME=bench_of_multi_table \\
+        python3 -m benchmarks.bench_installed_flows --switches 100 --flows 1000
+
+To compare with the REST path, run kytos with flow_manager on the same
+database and pass --keep-flows, so its stored flows are read, and --rest.
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+
+import httpx
+from bson.decimal128 import Decimal128
+
+from napps.kytos.of_multi_table.controllers import FlowsController
+from napps.kytos.of_multi_table.settings import FLOW_MANAGER_URL
+
+
+def build_flows(switches: int, flows: int) -> list[dict]:
+    """Build `flows` installed mef_eline flows on each of `switches` switches"""
+    utc_now = datetime.utcnow()
+    documents = []
+    for switch in range(switches):
+        dpid = f"00:00:00:00:00:00:{switch // 256:02x}:{switch % 256:02x}"
+        for index in range(flows):
+            cookie = 0xAA00000000000000 | index
+            documents.append(
+                {
+                    "_id": f"{dpid}-{index}",
+                    "flow_id": f"{dpid}-{index}",
+                    "id": f"{dpid}-{index}",
+                    "switch": dpid,
+                    "state": "installed",
+                    "flow": {
+                        "owner": "mef_eline",
+                        "table_group": "evpl",
+                        "table_id": 0,
+                        "priority": 20000,
+                        "cookie": Decimal128(Decimal(cookie)),
+                        "match": {"in_port": 1, "dl_vlan": index % 4095 + 1},
+                        "actions": [{"action_type": "output", "port": 2}],
+                    },
+                    "inserted_at": utc_now,
+                    "updated_at": utc_now,
+                }
+            )
+    return documents
+
+
+def measure(func, repeat: int) -> dict:
+    """Measure the latency in milliseconds and peak memory in MiB of `func`"""
+    latencies = []
+    peaks = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func()
+        latencies.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 2**20)
+        tracemalloc.stop()
+    return {
+        "mean": statistics.mean(latencies),
+        "min": min(latencies),
+        "peak": max(peaks),
+        "flows": sum(len(flows) for flows in result.values()),
+    }
+
+
+def get_rest_flows(client: httpx.Client) -> dict:
+    """Get the installed flows through flow_manager's API"""
+    response = client.get("v2/stored_flows", params={"state": "installed"})
+    response.raise_for_status()
+    return response.json()
+
+
+def main() -> None:
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--switches", type=int, default=100)
+    parser.add_argument("--flows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep-flows", action="store_true")
+    parser.add_argument("--rest", action="store_true")
+    args = parser.parse_args()
+
+    controller = FlowsController()
+    if not args.keep_flows:
+        controller.db.flows.drop()
+        controller.db.flows.insert_many(build_flows(args.switches, args.flows))
+
+    sources = {"mongo": controller.get_installed_flows}
+    if args.rest:
+        client = httpx.Client(base_url=FLOW_MANAGER_URL, timeout=300)
+        sources["rest"] = lambda: get_rest_flows(client)
+    for name, func in sources.items():
+        result = measure(func, args.repeat)
+        print(
+            f"  {name:<6} {result['flows']} flows, mean {result['mean']:10.3f} ms"
+            f" min {result['min']:10.3f} ms peak {result['peak']:8.1f} MiB"
+        )
+
+    if not args.keep_flows:
+        controller.db.flows.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Benchmark a pipeline migration with synthetic flows, offline.
+
+The stored flows of N switches with M flows each, spread over the table
+groups of K NApps, are served in place of flow_manager's API, pipelines are
+kept by an in-memory PipelineController and events are counted by a stub
+buffers.app, so neither MongoDB nor flow_manager are needed:
+
+    python3 -m benchmarks.bench_migration --switches 100 --flows 1000 --owners 4
+
+It reports, for each stage, the mean latency, the throughput in flows per
+second, the peak memory traced while it ran and the memory blocks still
+allocated after it. With --json, the results are also written to a file, to
+be compared between releases.
+"""
+
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from kytos.lib.helpers import get_controller_mock
+
+from napps.kytos.of_multi_table.flows import to_records
+from napps.kytos.of_multi_table.main import Main
+from napps.kytos.of_multi_table.migration import Migrator
+from napps.kytos.of_multi_table.pipeline import compile_pipeline
+from napps.kytos.of_multi_table.settings import NAPPS_COOKIE_PREFIX
+
+# Table groups of each NApp, in the order NApps are added with --owners
+TABLE_GROUPS = {
+    "mef_eline": ["evpl", "epl"],
+    "telemetry_int": ["evpl", "epl"],
+    "of_lldp": ["base"],
+    "coloring": ["base"],
+}
+
+
+class StubBuffer:
+    """buffers.app that counts the events and flows put in it"""
+
+    def __init__(self) -> None:
+        self.events = 0
+        self.flows = 0
+
+    def put(self, event, timeout=None) -> None:
+        """Count an event and its flows"""
+        self.events += 1
+        flow_dict = event.content.get("flow_dict") if event.content else None
+        if flow_dict:
+            self.flows += len(flow_dict["flows"])
+
+    @staticmethod
+    def qsize() -> int:
+        """The events are consumed as soon as they are put"""
+        return 0
+
+
+class MemoryPipelineController:
+    """PipelineController keeping a single pipeline in memory"""
+
+    def __init__(self, pipeline: dict) -> None:
+        self.pipeline = pipeline
+
+    def bootstrap_indexes(self) -> None:
+        """Nothing to index"""
+
+    def get_active_pipeline(self) -> dict:
+        """Get the pipeline, unless it is disabled"""
+        if self.pipeline["status"] == "disabled":
+            return {}
+        return self.pipeline
+
+    def enabled_pipeline(self, pipeline_id: str, status: str) -> None:
+        """Set the pipeline as enabled"""
+        self.pipeline["status"] = "enabled"
+
+    def disabled_pipeline(self, pipeline_id: str, status: str) -> None:
+        """Set the pipeline as disabled"""
+        self.pipeline["status"] = "disabled"
+
+    def error_pipeline(self, pipeline_id: str, status: str) -> None:
+        """Set the pipeline error status"""
+        self.pipeline["status"] = status
+
+
+def build_pipeline(owners: int) -> dict:
+    """Build a pipeline with a table for each of the first `owners` NApps,
+    chained by goto_table miss flows"""
+    napps = list(TABLE_GROUPS)[:owners]
+    multi_table = []
+    for table_id, napp in enumerate(napps):
+        table = {
+            "table_id": table_id,
+            "napps_table_groups": {napp: TABLE_GROUPS[napp]},
+        }
+        if table_id < len(napps) - 1:
+            table["table_miss_flow"] = {
+                "priority": 0,
+                "instructions": [
+                    {"instruction_type": "goto_table", "table_id": table_id + 1}
+                ],
+            }
+        multi_table.append(table)
+    return {"id": "bench_pipeline", "status": "enabling", "multi_table": multi_table}
+
+
+def build_stored_flows(switches: int, flows: int, owners: int) -> dict:
+    """Build `flows` installed flows in table 0 on each of `switches`
+    switches, round robin over the table groups of the first `owners` NApps"""
+    groups = [
+        (napp, group)
+        for napp in list(TABLE_GROUPS)[:owners]
+        for group in TABLE_GROUPS[napp]
+    ]
+    stored_flows = {}
+    for switch in range(switches):
+        dpid = f"00:00:00:00:00:00:{switch // 256:02x}:{switch % 256:02x}"
+        stored_flows[dpid] = switch_flows = []
+        for index in range(flows):
+            owner, table_group = groups[index % len(groups)]
+            cookie = NAPPS_COOKIE_PREFIX.get(owner, 0xAA) << 56 | index
+            switch_flows.append(
+                {
+                    "switch": dpid,
+                    "state": "installed",
+                    "flow": {
+                        "owner": owner,
+                        "table_group": table_group,
+                        "table_id": 0,
+                        "priority": 20000,
+                        "cookie": cookie,
+                        "match": {"in_port": 1, "dl_vlan": index % 4095 + 1},
+                        "actions": [{"action_type": "output", "port": 2}],
+                    },
+                }
+            )
+    return stored_flows
+
+
+def build_napp(pipeline: dict, stored_flows: dict) -> Main:
+    """Build the NApp serving `stored_flows` and migrating to `pipeline`"""
+    controller = get_controller_mock()
+    controller.napps = {}
+    controller.switches = dict.fromkeys(stored_flows)
+    controller.buffers.app = StubBuffer()
+    pipeline_controller = MemoryPipelineController(pipeline)
+
+    def get_installed_flows(dpids=None, cookie_ranges=None):
+        return {dpid: stored_flows[dpid] for dpid in dpids or stored_flows}
+
+    with patch.object(
+        Main, "get_pipeline_controller", return_value=pipeline_controller
+    ), patch.object(Migrator, "get_installed_flows", side_effect=get_installed_flows):
+        napp = Main(controller)
+        # Without NApps to acknowledge enable_table, the pipeline loaded on
+        # setup is migrated right away
+        napp.job_executor.submit(lambda: None).result()
+
+    napp.migrator.get_installed_flows = get_installed_flows
+    return napp
+
+
+def measure(func, flows: int, repeat: int, setup=None) -> dict:
+    """Measure the latency in milliseconds, the flows per second, the peak
+    memory in MiB and the blocks left allocated by `func`"""
+    latencies = []
+    peaks = []
+    blocks = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 2**20)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        blocks.append(
+            sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        )
+    mean = statistics.mean(latencies)
+    return {
+        "mean_ms": mean * 1000,
+        "min_ms": min(latencies) * 1000,
+        "flows_per_second": flows / mean if mean else 0.0,
+        "peak_mib": max(peaks),
+        "blocks": max(blocks),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Run every stage and return the results by stage"""
+    pipeline = build_pipeline(args.owners)
+    stored_flows = build_stored_flows(args.switches, args.flows, args.owners)
+    total = args.switches * args.flows
+    napp = build_napp(pipeline, stored_flows)
+    compiled = compile_pipeline(pipeline)
+    records_by_switch = {
+        dpid: to_records(flows) for dpid, flows in stored_flows.items()
+    }
+    install_flows = {
+        dpid: [stored["flow"] for stored in flows]
+        for dpid, flows in stored_flows.items()
+    }
+
+    def reset_pipeline():
+        pipeline["status"] = "enabling"
+        napp.applied_pipeline = None
+        napp.create_job(pipeline["id"], "enable", dict(pipeline))
+
+    stages = {
+        "build_content": (lambda: napp.build_content(pipeline), 0, None),
+        "manage_miss_flows": (
+            lambda: napp.migrator.manage_miss_flows(compiled, records_by_switch),
+            total,
+            None,
+        ),
+        "send_flows": (
+            lambda: napp.migrator.send_flows(install_flows, "install"),
+            total,
+            None,
+        ),
+        "get_flows_to_be_installed": (
+            napp.get_flows_to_be_installed,
+            total,
+            reset_pipeline,
+        ),
+    }
+    results = {}
+    for name, (func, flows, setup) in stages.items():
+        results[name] = measure(func, flows, args.repeat, setup)
+    assert pipeline["status"] == "enabled", pipeline["status"]
+    napp.shutdown()
+    return results
+
+
+def main() -> None:
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--switches", type=int, default=100)
+    parser.add_argument("--flows", type=int, default=1000)
+    parser.add_argument("--owners", type=int, default=len(TABLE_GROUPS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="file the results are written to")
+    args = parser.parse_args()
+    args.owners = max(1, min(args.owners, len(TABLE_GROUPS)))
+
+    print(
+        f"{args.switches} switches, {args.flows} flows per switch, "
+        f"{args.owners} NApps"
+    )
+    results = run(args)
+    for name, result in results.items():
+        print(
+            f"  {name:<26} mean {result['mean_ms']:10.3f} ms"
+            f" {result['flows_per_second']:12.0f} flows/s"
+            f" peak {result['peak_mib']:8.1f} MiB blocks {result['blocks']:8d}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
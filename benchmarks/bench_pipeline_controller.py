@@ -0,0 +1,102 @@
+"""Benchmark PipelineController queries with many stored pipelines.
+
+It needs a MongoDB reachable with the same environment variables used by
+kytos (MONGO_HOST_SEEDS, MONGO_USERNAME, MONGO_PASSWORD, MONGO_DBNAME).
+Use a scratch database, the pipelines collection is dropped on every run:
+
+    MONGO_DBNAME=bench_of_multi_table \\
+        python3 -m benchmarks.bench_pipeline_controller --pipelines 10000
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from napps.kytos.of_multi_table.controllers import PipelineController
+
+
+def build_pipelines(count: int) -> list[dict]:
+    """Build `count` disabled pipelines and a single enabled one"""
+    utc_now = datetime.utcnow()
+    pipelines = []
+    for index in range(count):
+        _id = uuid4().hex
+        pipelines.append(
+            {
+                "_id": _id,
+                "id": _id,
+                "status": "enabled" if index == count - 1 else "disabled",
+                "multi_table": [
+                    {"table_id": 0, "napps_table_groups": {"of_lldp": ["base"]}},
+                    {"table_id": 1, "napps_table_groups": {"mef_eline": ["epl"]}},
+                ],
+                "inserted_at": utc_now - timedelta(seconds=count - index),
+                "updated_at": utc_now - timedelta(seconds=count - index),
+            }
+        )
+    return pipelines
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """Measure the latency of `func` in milliseconds, calling `setup` before
+    each call outside of the measure"""
+    latencies = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "mean": statistics.mean(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def run(controller: PipelineController, pipeline_id: str, repeat: int) -> None:
+    """Measure and print the latency of the queries"""
+    queries = {
+        "get_pipelines()": (controller.get_pipelines, None),
+        "get_pipelines('enabled')": (
+            lambda: controller.get_pipelines("enabled"),
+            None,
+        ),
+        "get_pipeline(id)": (lambda: controller.get_pipeline(pipeline_id), None),
+        # The cache is invalidated so that the query is measured
+        "get_active_pipeline()": (
+            controller.get_active_pipeline,
+            controller.invalidate_active_pipeline,
+        ),
+        "get_active_pipeline() cached": (controller.get_active_pipeline, None),
+    }
+    for name, (func, setup) in queries.items():
+        result = measure(func, repeat, setup)
+        print(f"  {name:<28} mean {result['mean']:8.3f} ms p95 {result['p95']:8.3f} ms")
+
+
+def main() -> None:
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pipelines", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    controller = PipelineController()
+    controller.db.pipelines.drop()
+    pipelines = build_pipelines(args.pipelines)
+    controller.db.pipelines.insert_many(pipelines)
+    pipeline_id = pipelines[args.pipelines // 2]["id"]
+
+    print(f"{args.pipelines} pipelines, without indexes:")
+    run(controller, pipeline_id, args.repeat)
+    controller.bootstrap_indexes()
+    print(f"{args.pipelines} pipelines, with indexes:")
+    run(controller, pipeline_id, args.repeat)
+    controller.db.pipelines.drop()
+
+
+if __name__ == "__main__":
+    main()
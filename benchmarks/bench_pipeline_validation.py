@@ -0,0 +1,151 @@
+"""Benchmark the validation of large pipelines, as done on insertion.
+
+Pipelines of up to 255 tables, whose miss flows match on many fields, are
+validated and dumped like PipelineController.insert_pipeline does, with
+PipelineBaseDoc and with the previous validators, which dumped each table
+and each miss flow again:
+
+    python3 -m benchmarks.bench_pipeline_validation --tables 255
+"""
+
+import argparse
+import statistics
+import time
+
+from pydantic import field_validator, model_validator
+
+from napps.kytos.of_multi_table.db.models import MultitableDoc, PipelineBaseDoc
+
+
+class PreviousMultitableDoc(MultitableDoc):
+    """MultitableDoc with the previous validation of its instructions"""
+
+    @model_validator(mode="after")
+    def validate_intructions(self):
+        """Validate intructions"""
+        table_miss_flow = self.table_miss_flow
+        if not table_miss_flow:
+            return self
+        table_id = self.table_id
+        instructions = table_miss_flow.model_dump(exclude_none=True)["instructions"]
+        for instruction in instructions:
+            miss_table_id = instruction.get("table_id")
+            if miss_table_id is not None and miss_table_id <= table_id:
+                msg = (
+                    f"Table {table_id} has a lower or equal "
+                    f"table_id {miss_table_id} in instructions"
+                )
+                raise ValueError(msg)
+        return self
+
+
+class PreviousPipelineDoc(PipelineBaseDoc):
+    """PipelineBaseDoc with the previous validation of its tables"""
+
+    multi_table: list[PreviousMultitableDoc]
+
+    @field_validator("multi_table")
+    @classmethod
+    def validate_multi_table(cls, tables):
+        """Validate table groups"""
+        content = {}
+        id_set = set()
+        for table in tables:
+            table_dict = table.model_dump(exclude_none=True)
+            table_groups = table_dict.get("napps_table_groups", {})
+            table_id = table_dict["table_id"]
+            if table_id in id_set:
+                msg = f"Table id {table_id} repeated"
+                raise ValueError(msg)
+            id_set.add(table_id)
+            for napp in table_groups:
+                if napp not in content:
+                    content[napp] = set(table_groups[napp])
+                else:
+                    repeated = content[napp] & set(table_groups[napp])
+                    if repeated:
+                        msg = (
+                            f"Repeated {napp} table groups, {repeated}"
+                            f" in table id: {table_id}"
+                        )
+                        raise ValueError(msg)
+                    content[napp] |= set(table_groups[napp])
+        return tables
+
+
+def build_pipeline(tables: int) -> dict:
+    """Build a pipeline of `tables` tables chained by miss flows matching on
+    many fields, with a table group in each one"""
+    match = {
+        "in_port": 1,
+        "dl_src": "00:00:00:00:00:01",
+        "dl_dst": "00:00:00:00:00:02",
+        "dl_type": 0x800,
+        "dl_vlan": "100/4095",
+        "nw_src": "10.0.0.1",
+        "nw_dst": "10.0.0.2",
+        "nw_proto": 6,
+        "tp_src": 1024,
+        "tp_dst": 80,
+        "ipv6_src": "2001:db8::1",
+        "ipv6_dst": "2001:db8::2",
+        "mpls_lab": 100,
+        "metadata": 1,
+    }
+    multi_table = []
+    for table_id in range(tables):
+        table = {
+            "table_id": table_id,
+            "description": f"Table {table_id}",
+            "napps_table_groups": {"mef_eline": [f"group_{table_id}"]},
+        }
+        if table_id < tables - 1:
+            table["table_miss_flow"] = {
+                "priority": 0,
+                "match": match,
+                "instructions": [
+                    {"instruction_type": "goto_table", "table_id": table_id + 1}
+                ],
+            }
+        multi_table.append(table)
+    return {"_id": "pipeline_id", "multi_table": multi_table}
+
+
+def measure(model, pipeline: dict, repeat: int) -> dict:
+    """Measure the latency in milliseconds of validating and dumping
+    `pipeline` with `model`"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model(**pipeline).model_dump(exclude_none=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "mean": statistics.mean(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main() -> None:
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, default=255)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for tables in sorted({1, 16, 64, args.tables}):
+        pipeline = build_pipeline(tables)
+        print(f"{tables} tables")
+        for name, model in (
+            ("previous", PreviousPipelineDoc),
+            ("PipelineBaseDoc", PipelineBaseDoc),
+        ):
+            result = measure(model, pipeline, args.repeat)
+            print(
+                f"  {name:<16} mean {result['mean']:8.3f} ms"
+                f" p95 {result['p95']:8.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
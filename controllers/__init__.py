@@ -1,22 +1,46 @@
-"""PipelineController"""
+"""PipelineController and FlowsController"""
 
 # pylint: disable=unnecessary-lambda,invalid-name,unnecessary-comprehension
 import os
 from datetime import datetime
-from typing import Dict, Optional
+from decimal import Decimal
+from threading import Event, Lock
+from typing import Dict, Iterable, Optional
 from uuid import uuid4
 
+import pymongo
+from bson.decimal128 import Decimal128
 from pydantic import ValidationError
 from pymongo.collection import ReturnDocument
 from pymongo.errors import AutoReconnect
 from pymongo.results import InsertOneResult
 from tenacity import retry_if_exception_type, stop_after_attempt, wait_random
 
+from kytos.core import log
 from kytos.core.db import Mongo
 from kytos.core.retry import before_sleep, for_all_methods, retries
 from napps.kytos.of_multi_table.db.models import PipelineBaseDoc
 from napps.kytos.of_multi_table.status import PipelineStatus
 
+# Status of the pipelines that are not disabled
+ACTIVE_STATUSES = [
+    status.value for status in PipelineStatus if status != PipelineStatus.DISABLED
+]
+
+# Fields of the stored flows needed to diff and reinstall them in another table
+FLOW_FIELDS = (
+    "owner",
+    "table_group",
+    "table_id",
+    "cookie",
+    "match",
+    "priority",
+    "instructions",
+    "actions",
+    "idle_timeout",
+    "hard_timeout",
+)
+
 
 @for_all_methods(
     retries,
@@ -38,46 +62,98 @@ class PipelineController:
         self.mongo = get_mongo()
         self.db_client = self.mongo.client
         self.db = self.db_client[self.mongo.db_name]
+        # Cached active pipeline, None when it has to be read from the DB
+        self._active_pipeline: Optional[Dict] = None
+        self._active_version = 0
+        self._active_lock = Lock()
+
+    def bootstrap_indexes(self) -> None:
+        """Bootstrap of_multi_table related indexes."""
+        index_tuples = [
+            ("pipelines", [("id", pymongo.ASCENDING)], {"unique": True}),
+            ("pipelines", [("status", pymongo.ASCENDING)], {}),
+            (
+                "pipelines",
+                [("status", pymongo.ASCENDING), ("updated_at", pymongo.DESCENDING)],
+                {"partialFilterExpression": {"status": {"$in": ACTIVE_STATUSES}}},
+            ),
+        ]
+        for collection, keys, kwargs in index_tuples:
+            if self.mongo.bootstrap_index(collection, keys, **kwargs):
+                log.info(f"Created DB index {keys}, collection: {collection}")
 
     def insert_pipeline(self, pipeline: Dict) -> InsertOneResult:
         """Insert a pipeline"""
         utc_now = datetime.utcnow()
         _id = str(uuid4().hex)
         try:
-            self.db.pipelines.insert_one(
-                PipelineBaseDoc(
-                    **{
-                        "_id": _id,
-                        **pipeline,
-                        "inserted_at": utc_now,
-                        "updated_at": utc_now,
-                    }
-                ).model_dump(exclude_none=True)
+            pipeline_doc = PipelineBaseDoc(
+                **{
+                    "_id": _id,
+                    **pipeline,
+                    "inserted_at": utc_now,
+                    "updated_at": utc_now,
+                }
             )
         except ValidationError as err:
             raise err
+        for warning in pipeline_doc.warnings or ():
+            log.warning(f"Pipeline {_id}: {warning}")
+        self.db.pipelines.insert_one(pipeline_doc.model_dump(exclude_none=True))
+        self.invalidate_active_pipeline()
         return _id
 
+    def set_active_pipeline(self, pipeline: Optional[Dict]) -> None:
+        """Cache the active pipeline, `{}` if there is none and None to
+        read it again from the DB"""
+        with self._active_lock:
+            self._active_pipeline = pipeline
+            self._active_version += 1
+
+    def invalidate_active_pipeline(self) -> None:
+        """Read the active pipeline again from the DB on next access"""
+        self.set_active_pipeline(None)
+
+    def watch_pipelines(self, stop: Event) -> None:
+        """Invalidate the cached active pipeline whenever the pipelines
+        collection changes, until `stop` is set. It needs a replica set."""
+        with self.db.pipelines.watch(max_await_time_ms=1000) as stream:
+            while not stop.is_set() and stream.alive:
+                if stream.try_next() is not None:
+                    self.invalidate_active_pipeline()
+
     def get_active_pipeline(self) -> Dict:
-        """Get a pipeline that is not disabled."""
-        return (
+        """Get a pipeline that is not disabled.
+        It is read from the DB only if it is not cached."""
+        with self._active_lock:
+            if self._active_pipeline is not None:
+                return dict(self._active_pipeline)
+            version = self._active_version
+        pipeline = (
             self.db.pipelines.find_one(
-                {"status": {"$ne": PipelineStatus.DISABLED.value}}
+                {"status": {"$in": ACTIVE_STATUSES}},
+                sort=[("updated_at", pymongo.DESCENDING)],
             )
             or {}
         )
+        with self._active_lock:
+            # Only cache it if there was no transition while reading it
+            if version == self._active_version:
+                self._active_pipeline = pipeline
+        return dict(pipeline)
 
     def get_pipelines(self, status: str = None) -> Dict:
         """Get a list of pipelines"""
         match_filters = {"$match": {}}
         if status:
             match_filters["$match"]["status"] = status.lower()
+        # $match goes first so the status index can be used
         result = self.db.pipelines.aggregate(
             [
+                match_filters,
                 {
                     "$project": PipelineBaseDoc.projection(),
                 },
-                match_filters,
             ]
         )
         return {"pipelines": [pipeline for pipeline in result]}
@@ -95,55 +171,146 @@ class PipelineController:
         utc_now = datetime.utcnow()
         pipeline = self.db.pipelines.find_one_and_update(
             {"id": id_},
-            {"$set": {"status": PipelineStatus.ENABLING.value, "updated_at": utc_now}},
+            {
+                "$set": {
+                    "status": PipelineStatus.ENABLING.value,
+                    "updated_at": utc_now,
+                },
+                "$unset": {"errors": ""},
+            },
             return_document=ReturnDocument.AFTER,
         )
         if not pipeline:
             return pipeline
         self.db.pipelines.find_one_and_update(
-            {"status": {"$ne": "disabled"}, "id": {"$ne": id_}},
+            {"status": {"$in": ACTIVE_STATUSES}, "id": {"$ne": id_}},
             {"$set": {"status": "disabled", "updated_at": utc_now}},
         )
+        self.set_active_pipeline(pipeline)
         return pipeline
 
-    def enabled_pipeline(self, id_: str) -> Optional[Dict]:
-        """Change pipeline status to enabled"""
+    def enabled_pipeline(
+        self, id_: str, status: str = PipelineStatus.ENABLING.value
+    ) -> Optional[Dict]:
+        """Change pipeline status to enabled, only if it is still `status`,
+        so a newer change of the pipeline is not overwritten"""
         utc_now = datetime.utcnow()
         pipeline = self.db.pipelines.find_one_and_update(
-            {"id": id_},
+            {"id": id_, "status": status},
             {"$set": {"status": PipelineStatus.ENABLED.value, "updated_at": utc_now}},
             return_document=ReturnDocument.AFTER,
         )
+        self.set_active_pipeline(pipeline)
         return pipeline
 
     def disabling_pipeline(self, id_: str) -> Optional[Dict]:
         """Change pipeline status to disabling"""
         utc_now = datetime.utcnow()
+        update = {"status": PipelineStatus.DISABLING.value, "updated_at": utc_now}
         pipeline = self.db.pipelines.find_one_and_update(
             {"id": id_},
-            {"$set": {"status": PipelineStatus.DISABLING.value, "updated_at": utc_now}},
+            {"$set": update},
             return_document=ReturnDocument.BEFORE,
         )
+        if pipeline:
+            self.set_active_pipeline({**pipeline, **update})
         return pipeline
 
-    def disabled_pipeline(self, id_: str) -> Optional[Dict]:
-        """Change pipeline status to disabled
+    def disabled_pipeline(
+        self, id_: str, status: str = PipelineStatus.DISABLING.value
+    ) -> Optional[Dict]:
+        """Change pipeline status to disabled, only if it is still `status`,
+        so a newer change of the pipeline is not overwritten
         ReturnDocument set to before to check if actions are needed
         if it was disabled, no need to analyze flows"""
         utc_now = datetime.utcnow()
         pipeline = self.db.pipelines.find_one_and_update(
-            {"id": id_},
+            {"id": id_, "status": status},
             {"$set": {"status": PipelineStatus.DISABLED.value, "updated_at": utc_now}},
             return_document=ReturnDocument.BEFORE,
         )
+        with self._active_lock:
+            active_id = (self._active_pipeline or {}).get("id")
+        if pipeline and active_id == id_:
+            self.set_active_pipeline({})
+        else:
+            self.invalidate_active_pipeline()
         return pipeline
 
-    def error_pipeline(self, id_: str, status: str) -> Dict:
-        """Add '-error' to the current status"""
+    def error_pipeline(
+        self, id_: str, status: str, errors: Optional[Dict] = None
+    ) -> Dict:
+        """Add '-error' to the current status
+        `errors` is a summary of the flow errors by switch"""
         utc_now = datetime.utcnow()
+        update = {"status": status, "updated_at": utc_now}
+        if errors:
+            update["errors"] = errors
         pipeline = self.db.pipelines.find_one_and_update(
             {"id": id_},
-            {"$set": {"status": status, "updated_at": utc_now}},
+            {"$set": update},
             return_document=ReturnDocument.BEFORE,
         )
+        if pipeline:
+            self.set_active_pipeline({**pipeline, **update})
         return pipeline
+
+
+@for_all_methods(
+    retries,
+    stop=stop_after_attempt(
+        int(os.environ.get("MONGO_AUTO_RETRY_STOP_AFTER_ATTEMPT", 3))
+    ),
+    wait=wait_random(
+        min=int(os.environ.get("MONGO_AUTO_RETRY_WAIT_RANDOM_MIN", 0.1)),
+        max=int(os.environ.get("MONGO_AUTO_RETRY_WAIT_RANDOM_MAX", 1)),
+    ),
+    before_sleep=before_sleep,
+    retry=retry_if_exception_type((AutoReconnect,)),
+)
+class FlowsController:
+    """Read only access to the flows stored by flow_manager"""
+
+    def __init__(self, get_mongo=lambda: Mongo()) -> None:
+        """FlowsController."""
+        self.mongo = get_mongo()
+        self.db_client = self.mongo.client
+        self.db = self.db_client[self.mongo.db_name]
+
+    def get_installed_flows(
+        self,
+        dpids: Optional[Iterable[str]] = None,
+        cookie_ranges: Optional[Iterable[tuple[int, int]]] = None,
+        owners: Optional[Iterable[str]] = None,
+        batch_size: int = 10000,
+    ) -> Dict[str, list]:
+        """Get the installed flows by switch, like flow_manager v2/stored_flows,
+        only from `dpids`, `cookie_ranges` and `owners` if given.
+        Only the FLOW_FIELDS of each flow are read, streamed from the cursor
+        in batches of `batch_size` documents."""
+        query = {"state": "installed"}
+        if dpids:
+            query["switch"] = {"$in": list(dpids)}
+        if owners:
+            query["flow.owner"] = {"$in": sorted(owners)}
+        cookie_filters = [
+            {
+                "flow.cookie": {
+                    "$gte": Decimal128(Decimal(start)),
+                    "$lte": Decimal128(Decimal(end)),
+                }
+            }
+            for start, end in cookie_ranges or ()
+        ]
+        if cookie_filters:
+            query["$or"] = cookie_filters
+        flows_by_switch = {}
+        projection = {"_id": 0, "switch": 1}
+        projection.update((f"flow.{field}", 1) for field in FLOW_FIELDS)
+        cursor = self.db.flows.find(query, projection, batch_size=batch_size)
+        for flow in cursor:
+            cookie = flow["flow"].get("cookie")
+            if isinstance(cookie, Decimal128):
+                flow["flow"]["cookie"] = int(cookie.to_decimal())
+            flows_by_switch.setdefault(flow["switch"], []).append(flow)
+        return flows_by_switch
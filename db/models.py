@@ -101,58 +101,135 @@ class MultitableDoc(BaseModel):
     description: Optional[str] = None
     napps_table_groups: Optional[dict[str, List[str]]] = None
 
-    @model_validator(mode="after")
-    def validate_intructions(self):
-        """Validate intructions"""
-        table_miss_flow = self.table_miss_flow
-        if not table_miss_flow:
-            return self
-        table_id = self.table_id
-        instructions = table_miss_flow.model_dump(exclude_none=True)["instructions"]
-        for instruction in instructions:
-            miss_table_id = instruction.get("table_id")
-            if miss_table_id is not None and miss_table_id <= table_id:
-                msg = (
-                    f"Table {table_id} has a lower or equal "
-                    f"table_id {miss_table_id} in instructions"
-                )
-                raise ValueError(msg)
-        return self
-
 
 class PipelineBaseDoc(DocumentBaseModel):
     """Base model for Pipeline documents"""
 
     status: str = "disabled"
     multi_table: List[MultitableDoc]
+    warnings: Optional[List[str]] = None
 
     @field_validator("multi_table")
     @classmethod
-    def validate_table_groups(cls, pipeline):
-        """Validate table groups"""
+    def validate_multi_table(cls, tables):
+        """Validate the tables in a single pass, reporting every repeated
+        table id, table group repeated by a NApp and miss flow instruction
+        with a lower or equal table_id, then the goto_table graph"""
+        errors = []
+        # Tables each table goes to through its miss flow
+        gotos = {}
         content = {}
-        id_set = set()
-        for table in pipeline:
-            table_dict = table.model_dump(exclude_none=True)
-            table_groups = table_dict.get("napps_table_groups", {})
-            table_id = table_dict["table_id"]
-            if table_id in id_set:
-                msg = f"Table id {table_id} repeated"
-                raise ValueError(msg)
-            id_set.add(table_id)
-            for napp in table_groups:
-                if napp not in content:
-                    content[napp] = set(table_groups[napp])
-                else:
-                    repeated = content[napp] & set(table_groups[napp])
-                    if repeated:
-                        msg = (
-                            f"Repeated {napp} table groups, {repeated}"
-                            f" in table id: {table_id}"
-                        )
-                        raise ValueError(msg)
-                    content[napp] |= set(table_groups[napp])
-        return pipeline
+        content_by_table = {}
+        for table in tables:
+            if table.table_id in gotos:
+                errors.append(f"Table id {table.table_id} repeated")
+            errors.extend(cls.table_errors(table, gotos, content))
+            if table.napps_table_groups:
+                content_by_table[table.table_id] = table.napps_table_groups
+        errors.extend(cls.goto_table_errors(gotos, content_by_table))
+        if errors:
+            raise ValueError("; ".join(errors))
+        return tables
+
+    @staticmethod
+    def table_errors(
+        table: MultitableDoc, gotos: dict[int, set[int]], content: dict
+    ) -> List[str]:
+        """Check the table groups repeated by a NApp and the miss flow
+        instructions of a table, adding the tables it goes to in gotos and
+        its table groups by NApp in content"""
+        errors = []
+        table_id = table.table_id
+        table_gotos = gotos.setdefault(table_id, set())
+        for napp, table_groups in (table.napps_table_groups or {}).items():
+            napp_groups = content.setdefault(napp, set())
+            repeated = napp_groups.intersection(table_groups)
+            if repeated:
+                errors.append(
+                    f"Repeated {napp} table groups, {repeated}"
+                    f" in table id: {table_id}"
+                )
+            napp_groups.update(table_groups)
+        table_miss_flow = table.table_miss_flow
+        if not table_miss_flow:
+            return errors
+        for instruction in table_miss_flow.instructions or ():
+            miss_table_id = instruction.get("table_id")
+            if miss_table_id is None:
+                continue
+            table_gotos.add(miss_table_id)
+            if miss_table_id <= table_id:
+                errors.append(
+                    f"Table {table_id} has a lower or equal "
+                    f"table_id {miss_table_id} in instructions"
+                )
+        return errors
+
+    @staticmethod
+    def goto_table_errors(
+        gotos: dict[int, set[int]], content_by_table: dict[int, dict]
+    ) -> List[str]:
+        """Check the graph of the tables going to other tables through their
+        miss flows. Every table they go to has to be in the pipeline, table 0
+        has to be in it and no table can be dead, without table groups and
+        without any miss flow going to it."""
+        errors = []
+        for table_id, table_gotos in gotos.items():
+            missing = sorted(table_gotos - gotos.keys())
+            if missing:
+                errors.append(
+                    f"Table {table_id} goes to table ids {missing} "
+                    "missing from the pipeline"
+                )
+        if 0 not in gotos:
+            errors.append("Table 0 is missing, packets are matched from it")
+        targets = set().union(*gotos.values())
+        for table_id in sorted(gotos.keys() - targets - content_by_table.keys()):
+            if table_id:
+                errors.append(
+                    f"Table {table_id} is dead, it has no table groups "
+                    "and no miss flow goes to it"
+                )
+        return errors
+
+    @staticmethod
+    def unreachable_table_warnings(
+        gotos: dict[int, set[int]], content_by_table: dict[int, dict]
+    ) -> List[str]:
+        """Report the tables not reachable from table 0 through the miss
+        flows, with their table groups. They aren't rejected, since NApps
+        flows can go to tables too."""
+        reachable = set()
+        pending = [0]
+        while pending:
+            table_id = pending.pop()
+            if table_id in reachable or table_id not in gotos:
+                continue
+            reachable.add(table_id)
+            pending.extend(gotos[table_id])
+        warnings = []
+        for table_id in sorted(gotos.keys() - reachable):
+            msg = f"Table {table_id} is not reachable from table 0 by miss flows"
+            if table_id in content_by_table:
+                msg += f", with table groups {content_by_table[table_id]}"
+            warnings.append(msg)
+        return warnings
+
+    @model_validator(mode="after")
+    def warn_unreachable_tables(self):
+        """Set the warnings of the tables not reachable from table 0"""
+        gotos = {}
+        content_by_table = {}
+        for table in self.multi_table:
+            table_gotos = gotos.setdefault(table.table_id, set())
+            if table.napps_table_groups:
+                content_by_table[table.table_id] = table.napps_table_groups
+            if table.table_miss_flow:
+                for instruction in table.table_miss_flow.instructions or ():
+                    if instruction.get("table_id") is not None:
+                        table_gotos.add(instruction["table_id"])
+        self.warnings = self.unreachable_table_warnings(gotos, content_by_table) or None
+        return self
 
     @staticmethod
     def projection() -> dict:
@@ -162,6 +239,8 @@ class PipelineBaseDoc(DocumentBaseModel):
             "id": 1,
             "multi_table": 1,
             "status": 1,
+            "errors": 1,
+            "warnings": 1,
             "inserted_at": 1,
             "updated_at": 1,
         }
@@ -0,0 +1,113 @@
+"""Compact records of the flows migrated between tables"""
+
+import sys
+from typing import Dict, Iterable, Iterator, Optional
+
+# Keys of a flow kept in their own slots, the rest are kept in `fields`
+RECORD_KEYS = ("owner", "table_group", "table_id", "cookie", "priority", "match")
+
+
+def intern(value):
+    """Intern strings repeated in every flow, like owners and table groups"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class FlowRecord:
+    """Flow stored by flow_manager, kept with the least memory needed to
+    diff it and send it again.
+
+    The match is frozen as sorted (field, value) pairs, so it is hashable,
+    and the remaining keys are kept as pairs referencing the stored values.
+    Flow dicts are only built when they are sent.
+    """
+
+    __slots__ = RECORD_KEYS + ("fields",)
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        owner: Optional[str],
+        table_group: Optional[str],
+        table_id: int,
+        *,
+        cookie: Optional[int] = None,
+        priority: Optional[int] = None,
+        match: Optional[tuple] = None,
+        fields: tuple = (),
+    ) -> None:
+        self.owner = intern(owner)
+        self.table_group = intern(table_group)
+        self.table_id = table_id
+        self.cookie = cookie
+        self.priority = priority
+        self.match = match
+        self.fields = fields
+
+    @classmethod
+    def from_flow(cls, flow: Dict) -> "FlowRecord":
+        """Build a record from a flow dict"""
+        match = flow.get("match")
+        return cls(
+            flow.get("owner"),
+            flow.get("table_group"),
+            flow.get("table_id"),
+            cookie=flow.get("cookie"),
+            priority=flow.get("priority"),
+            match=None if match is None else tuple(sorted(match.items())),
+            fields=tuple(
+                (intern(key), value)
+                for key, value in flow.items()
+                if key not in RECORD_KEYS and value is not None
+            ),
+        )
+
+    @property
+    def key(self) -> tuple[Optional[str], Optional[str]]:
+        """(owner, table_group) of the flow"""
+        return (self.owner, self.table_group)
+
+    def as_dict(self, table_id: Optional[int] = None) -> Dict:
+        """Build the flow dict, in `table_id` if given"""
+        flow = {
+            key: value
+            for key, value in (
+                ("owner", self.owner),
+                ("table_group", self.table_group),
+                ("table_id", self.table_id if table_id is None else table_id),
+                ("cookie", self.cookie),
+                ("priority", self.priority),
+            )
+            if value is not None
+        }
+        if self.match is not None:
+            flow["match"] = dict(self.match)
+        flow.update(self.fields)
+        return flow
+
+    def as_delete(self) -> Dict:
+        """Build the dict to delete this flow from its table"""
+        delete = {
+            "cookie": self.cookie,
+            "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
+            "table_id": self.table_id,
+            "owner": self.owner,
+        }
+        if self.match:
+            delete["match"] = dict(self.match)
+        return delete
+
+
+def to_records(stored_flows: Iterable[Dict]) -> list[FlowRecord]:
+    """Get the records of flows stored by flow_manager"""
+    return [FlowRecord.from_flow(stored["flow"]) for stored in stored_flows]
+
+
+def installs(moves: Iterable[tuple[FlowRecord, int]]) -> Iterator[Dict]:
+    """Build the flow dicts to install moved flows in their new table"""
+    for record, table_id in moves:
+        yield record.as_dict(table_id)
+
+
+def deletes(moves: Iterable[tuple[FlowRecord, int]]) -> Iterator[Dict]:
+    """Build the flow dicts to delete moved flows from their old table"""
+    for record, _ in moves:
+        yield record.as_delete()
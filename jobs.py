@@ -0,0 +1,98 @@
+"""Jobs tracking the progress of pipeline changes"""
+
+import time
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Optional
+from uuid import uuid4
+
+from napps.kytos.of_multi_table.status import JobStatus
+
+
+class PipelineJob:
+    """Progress of a pipeline being enabled or disabled"""
+
+    def __init__(self, pipeline_id: Optional[str], action: str) -> None:
+        self.id = uuid4().hex
+        self.pipeline_id = pipeline_id
+        self.action = action
+        self.status = JobStatus.PENDING
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.switches_total = 0
+        self.switches_done = 0
+        self.flows_moved = 0
+        self.errors: list[str] = []
+        # Tracing span of the job, ended when the job is done
+        self.span = None
+        # Pipeline document the job migrates to, as it was when the job was
+        # created, {} for the default pipeline
+        self.pipeline: Dict = {}
+        self._started_at: Optional[float] = None
+        self._lock = Lock()
+
+    @property
+    def done(self) -> bool:
+        """Check if the job will not make more progress"""
+        return self.status in {
+            JobStatus.FINISHED,
+            JobStatus.FAILED,
+            JobStatus.SUPERSEDED,
+        }
+
+    def set_status(self, status: JobStatus) -> None:
+        """Set the job status, unless it is already done"""
+        with self._lock:
+            if self.done:
+                return
+            self.status = status
+            if not self.done:
+                return
+            self.finished_at = datetime.utcnow()
+        if self.span is not None:
+            self.span.set_attribute("status", status.value)
+            self.span.end()
+
+    def start(self, switches_total: int) -> None:
+        """Start migrating flows of `switches_total` switches"""
+        with self._lock:
+            self.switches_total = switches_total
+            self._started_at = time.monotonic()
+        self.set_status(JobStatus.RUNNING)
+
+    def add_progress(self, switches_done: int, flows_moved: int) -> None:
+        """Add switches done and flows moved"""
+        with self._lock:
+            self.switches_done += switches_done
+            self.flows_moved += flows_moved
+
+    def fail(self, error: str) -> None:
+        """Finish the job with an error"""
+        with self._lock:
+            self.errors.append(error)
+        self.set_status(JobStatus.FAILED)
+
+    def eta(self) -> Optional[float]:
+        """Estimate the seconds left to migrate the remaining switches"""
+        with self._lock:
+            if self.status != JobStatus.RUNNING or not self.switches_done:
+                return None
+            elapsed = time.monotonic() - self._started_at
+            remaining = max(self.switches_total - self.switches_done, 0)
+            return elapsed / self.switches_done * remaining
+
+    def as_dict(self) -> Dict:
+        """Return a dictionary representation of the job"""
+        return {
+            "id": self.id,
+            "pipeline_id": self.pipeline_id,
+            "action": self.action,
+            "status": self.status.value,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at and self.finished_at.isoformat(),
+            "switches_total": self.switches_total,
+            "switches_done": self.switches_done,
+            "flows_moved": self.flows_moved,
+            "errors": list(self.errors),
+            "eta": self.eta(),
+        }
@@ -6,13 +6,17 @@ This NApp implements Oplenflow multi tables
 # pylint: disable=unused-argument, too-many-arguments, too-many-public-methods
 # pylint: disable=attribute-defined-outside-init
 import pathlib
-from typing import Dict, Iterable, Optional
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Event, Lock, Thread, Timer
+from typing import Dict, Optional
 
-import httpx
 import tenacity
-from httpx import RequestError
 from pydantic import ValidationError
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_fixed
+from pymongo.errors import PyMongoError
+from starlette.responses import PlainTextResponse
 
 from kytos.core import KytosNApp, log, rest
 from kytos.core.events import KytosEvent
@@ -24,15 +28,33 @@ from kytos.core.rest_api import (
     error_msg,
     get_json_or_400,
 )
-from kytos.core.retry import before_sleep
 
-from .controllers import PipelineController
+from .controllers import FlowsController, PipelineController
+from .jobs import PipelineJob
+from .metrics import Metrics
+from .migration import Migrator
+from .pipeline import CompiledPipeline, compile_pipeline
+from .rollout import RolloutAborted, TokenBucket
 from .settings import (
+    AUDIT_AUTO_REPAIR,
+    AUDIT_INTERVAL,
+    AUDIT_REPAIR_FLOW_MODS_PER_SECOND,
+    AUDIT_SWITCHES_PER_INTERVAL,
     COOKIE_PREFIX,
     DEFAULT_PIPELINE,
-    FLOW_MANAGER_URL,
+    ENABLE_TABLE_TIMEOUT,
+    FLOW_ERRORS_WINDOW,
+    INCREMENTAL_MIGRATION,
+    INSTALLED_FLOWS_SOURCE,
+    JOBS_HISTORY_SIZE,
+    PIPELINES_CHANGE_STREAM,
     SUBSCRIBED_NAPPS,
+    TRACES_BUFFER_SIZE,
+    TRACES_OTLP_ENDPOINT,
+    TRACING_ENABLED,
 )
+from .status import JobStatus
+from .tracing import NOOP_SPAN, OTLPExporter, Tracer
 
 
 class Main(KytosNApp):
@@ -54,11 +76,71 @@ class Main(KytosNApp):
         self.default_pipeline = DEFAULT_PIPELINE
         self.subscribed_napps = SUBSCRIBED_NAPPS
         self.pipeline_controller = self.get_pipeline_controller()
+        self.pipeline_controller.bootstrap_indexes()
+        self.metrics = Metrics()
+        self.tracer = self.get_tracer()
+        self.enable_table_sent_at = time.monotonic()
+        self.enable_table_span = NOOP_SPAN
+        self.flows_controller = None
+        if INSTALLED_FLOWS_SOURCE == "mongo":
+            self.flows_controller = self.get_flows_controller()
+        self.watch_pipelines_stop = Event()
+        if PIPELINES_CHANGE_STREAM:
+            Thread(
+                target=self.watch_pipelines,
+                name="of_multi_table_watch_pipelines",
+                daemon=True,
+            ).start()
         self.required_napps = set()
+        # NApps that did not acknowledge enable_table before the deadline,
+        # whose flows are not migrated yet
+        self.deferred_napps = set()
+        self.enable_table_lock = Lock()
+        self.enable_table_timer = None
+        self.applied_pipeline = self.get_applied_pipeline()
+        self.flow_errors = {}
+        self.flow_errors_lock = Lock()
+        self.flow_errors_timer = None
+        self.migrator = Migrator(
+            self.controller, self.metrics, self.tracer, self.flows_controller
+        )
+        self.jobs: Dict[str, PipelineJob] = {}
+        self.current_job: Optional[PipelineJob] = None
+        self.job_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="of_multi_table_job"
+        )
+        # Switches connected during a pipeline change, reconciled once it is
+        # done. Only changed in job_executor
+        self.pending_reconciles: set[str] = set()
+        self.drift: Dict[str, dict] = {}
+        self.audit_lock = Lock()
+        self.audit_last_dpid: Optional[str] = None
+        # Active pipeline id and status last warned of as not settled
+        self.unsettled_pipeline: Optional[tuple[str, str]] = None
+        self.audit_bucket = TokenBucket(AUDIT_REPAIR_FLOW_MODS_PER_SECOND)
+        if AUDIT_INTERVAL > 0:
+            self.execute_as_loop(AUDIT_INTERVAL)
+        pipeline = self.pipeline_controller.get_active_pipeline()
+        self.create_job(pipeline.get("id"), "load", pipeline)
         self.load_pipeline(self.get_enabled_table(), event_timeout=1)
 
     def execute(self):
-        """Execute once when the napp is running."""
+        """Audit the next switches every AUDIT_INTERVAL seconds, if set"""
+        if AUDIT_INTERVAL <= 0:
+            return
+        try:
+            self.audit_switches()
+        except Exception:  # pylint: disable=broad-except
+            log.exception("of_multi_table audit failed")
+
+    @staticmethod
+    def get_tracer() -> Tracer:
+        """Get the Tracer of pipeline changes, exporting to
+        TRACES_OTLP_ENDPOINT if set"""
+        exporter = None
+        if TRACING_ENABLED and TRACES_OTLP_ENDPOINT:
+            exporter = OTLPExporter(TRACES_OTLP_ENDPOINT)
+        return Tracer(TRACING_ENABLED, TRACES_BUFFER_SIZE, exporter)
 
     def get_enabled_table(self) -> dict:
         """Get the only enabled table, if exists"""
@@ -67,8 +149,32 @@ class Main(KytosNApp):
             return pipeline
         return self.default_pipeline
 
-    def load_pipeline(self, pipeline: dict, event_timeout: Optional[float] = None):
-        """If a pipeline was received, set 'self' variables"""
+    def watch_pipelines(self):
+        """Invalidate the cached active pipeline when the pipelines are
+        changed by other processes"""
+        try:
+            self.pipeline_controller.watch_pipelines(self.watch_pipelines_stop)
+        except PyMongoError as err:
+            log.error(f"Stopped watching pipelines changes: {err}")
+
+    def get_applied_pipeline(self) -> Optional[CompiledPipeline]:
+        """Get the pipeline whose flows are in place, None if unknown"""
+        pipeline = self.pipeline_controller.get_active_pipeline()
+        if not pipeline:
+            return compile_pipeline(self.default_pipeline)
+        if pipeline.get("status") == "enabled":
+            return compile_pipeline(pipeline)
+        return None
+
+    def load_pipeline(
+        self,
+        pipeline: dict,
+        event_timeout: Optional[float] = None,
+        job: Optional[PipelineJob] = None,
+    ):
+        """If a pipeline was received, set 'self' variables.
+        `job`, the current job by default, is skipped if it is done."""
+        job = job or self.current_job
         found_napps = set()
         content = self.build_content(pipeline)
         enable_napps = self.get_enabled_napps()
@@ -76,8 +182,114 @@ class Main(KytosNApp):
         for napp in content:
             if napp in enable_napps:
                 found_napps.add(napp)
-        self.required_napps = found_napps
+        with self.enable_table_lock:
+            if job.done:
+                # Superseded by a newer pipeline change while queued
+                return
+            self.required_napps = found_napps
+            # NApps left out of the pipeline have no flows to be migrated
+            self.deferred_napps &= found_napps
+            job.set_status(JobStatus.WAITING_NAPPS)
+            # A handshake still waiting on NApps is superseded by this one
+            self.enable_table_span.end()
+            self.enable_table_span = self.tracer.start_span(
+                "enable_table", job.span, napps=sorted(found_napps)
+            )
+            self.start_enable_table_timer(job)
+            if not found_napps:
+                self.enable_table_span.end()
         self.start_enabling_pipeline(content, event_timeout)
+        if not found_napps:
+            # No NApps to wait for, flows are migrated right away
+            self.submit_job(job, self.get_flows_to_be_installed, job)
+
+    def start_enable_table_timer(self, job: Optional[PipelineJob] = None) -> None:
+        """Start the ENABLE_TABLE_TIMEOUT deadline of the handshake of `job`,
+        the current job by default, cancelling the previous one"""
+        if self.enable_table_timer is not None:
+            self.enable_table_timer.cancel()
+            self.enable_table_timer = None
+        if ENABLE_TABLE_TIMEOUT <= 0 or not self.required_napps:
+            return
+        self.enable_table_timer = Timer(
+            ENABLE_TABLE_TIMEOUT,
+            self.handle_enable_table_timeout,
+            (job or self.current_job,),
+        )
+        self.enable_table_timer.daemon = True
+        self.enable_table_timer.start()
+
+    def handle_enable_table_timeout(self, job: PipelineJob) -> None:
+        """Migrate the flows of the NApps that acknowledged enable_table
+        before the deadline of `job`, deferring the NApps that did not"""
+        with self.enable_table_lock:
+            if job is not self.current_job or not self.required_napps:
+                return
+            self.enable_table_timer = None
+            deferred, self.required_napps = self.required_napps, set()
+            self.deferred_napps |= deferred
+            self.enable_table_span.set_attribute("deferred", sorted(deferred))
+            self.enable_table_span.end()
+        log.warning(
+            f"NApps {sorted(deferred)} did not acknowledge enable_table in "
+            f"{ENABLE_TABLE_TIMEOUT}s, their flows will be migrated once they do"
+        )
+        self.submit_job(job, self.get_flows_to_be_installed, job)
+
+    def create_job(
+        self, pipeline_id: Optional[str], action: str, pipeline: Optional[dict] = None
+    ) -> PipelineJob:
+        """Create a job migrating to `pipeline` and set it as the current one.
+        A previous job that has not started migrating flows is superseded,
+        only the last pipeline change is migrated. A running job is left to
+        finish its migration but skips the status transition."""
+        job = self.add_job(pipeline_id, action)
+        job.pipeline = pipeline or {}
+        previous, self.current_job = self.current_job, job
+        if previous and previous.status in {
+            JobStatus.PENDING,
+            JobStatus.WAITING_NAPPS,
+        }:
+            previous.set_status(JobStatus.SUPERSEDED)
+        return job
+
+    def add_job(self, pipeline_id: Optional[str], action: str) -> PipelineJob:
+        """Create a job kept in the last JOBS_HISTORY_SIZE jobs"""
+        job = PipelineJob(pipeline_id, action)
+        job.span = self.tracer.start_span(
+            "pipeline_change", pipeline_id=pipeline_id, action=action, job_id=job.id
+        )
+        self.jobs[job.id] = job
+        while len(self.jobs) > JOBS_HISTORY_SIZE:
+            del self.jobs[next(iter(self.jobs))]
+        return job
+
+    def start_job(self, action: str, pipeline: dict) -> PipelineJob:
+        """Create a job migrating to `pipeline`, or to the default pipeline if
+        it is disabling, and load it in the background"""
+        job = self.create_job(pipeline["id"], action, pipeline)
+        if "disabl" in pipeline.get("status", ""):
+            pipeline = self.default_pipeline
+        self.submit_job(job, self.load_pipeline, pipeline, None, job)
+        return job
+
+    def submit_job(self, job: PipelineJob, func, *args):
+        """Run `func` in job_executor, failing `job` if it raises.
+        It is skipped if `job` is done, like superseded, once it runs."""
+
+        def run():
+            if job.done:
+                log.debug(f"of_multi_table job {job.id} {job.status}, skipped")
+                return
+            try:
+                func(*args)
+            except Exception as exc:  # pylint: disable=broad-except
+                log.exception(f"of_multi_table job {job.id} failed")
+                job.fail(str(exc))
+            if job.done:
+                self.reconcile_pending_switches()
+
+        return self.job_executor.submit(run)
 
     def get_enabled_napps(self) -> set:
         """Get the NApps that are enabled and subscribed"""
@@ -96,19 +308,13 @@ class Main(KytosNApp):
         new table set up.
         """
         name = "enable_table"
+        self.enable_table_sent_at = time.monotonic()
         self.emit_event(name, content, event_timeout)
 
-    def build_content(self, pipeline: dict) -> dict:
+    @staticmethod
+    def build_content(pipeline: dict) -> dict:
         """Build content to be sent through an event"""
-        content = {}
-        for table in pipeline["multi_table"]:
-            table_id = table["table_id"]
-            for napp in table.get("napps_table_groups", {}):
-                if napp not in content:
-                    content[napp] = {}
-                for flow_type in table["napps_table_groups"][napp]:
-                    content[napp][flow_type] = table_id
-        return content
+        return compile_pipeline(pipeline).content()
 
     def emit_event(
         self, name: str, content: dict = None, event_timeout: Optional[float] = None
@@ -128,227 +334,197 @@ class Main(KytosNApp):
         """Handle NApps responses from enable_table
         Second, wait for all the napps to respond"""
         napp = event.name.split("/")[1].split(".")[0]
-        try:
-            self.required_napps.remove(napp)
-        except KeyError:
-            log.error(
-                f"{napp} NApp loaded after pipeline was installed. "
-                "Flow inconsistencies may have appeared. "
-                f"Try modifying `kytos.json` from {napp} then restart or "
-                "redeploy the pipeline."
+        with self.enable_table_lock:
+            elapsed = time.monotonic() - self.enable_table_sent_at
+            job = self.current_job
+            if napp in self.required_napps:
+                self.required_napps.remove(napp)
+                self.deferred_napps.discard(napp)
+                late = False
+            elif napp in self.deferred_napps:
+                self.deferred_napps.remove(napp)
+                late = True
+            else:
+                log.error(
+                    f"{napp} NApp loaded after pipeline was installed. "
+                    "Flow inconsistencies may have appeared. "
+                    f"Try modifying `kytos.json` from {napp} then restart or "
+                    "redeploy the pipeline."
+                )
+                return
+            self.metrics.enable_table_seconds.observe(elapsed, napp=napp)
+            if not late:
+                self.enable_table_span.set_attribute(f"{napp}.seconds", elapsed)
+                if self.required_napps:
+                    # There are more required napps, 'waiting' responses
+                    return
+                # No NApps are left, the deadline is cancelled
+                self.start_enable_table_timer()
+                self.enable_table_span.end()
+        if late:
+            log.info(
+                f"{napp} acknowledged enable_table after {elapsed:.3f}s, "
+                "migrating its deferred flows"
             )
+            job = self.add_job(job.pipeline_id, "migrate_napp")
+            self.submit_job(job, self.migrate_deferred_napp, napp, job)
             return
-        if self.required_napps:
-            # There are more required napps, 'waiting' responses
+        self.submit_job(job, self.get_flows_to_be_installed, job)
+
+    def migrate_pipeline(
+        self, pipeline: dict, job: Optional[PipelineJob] = None, span=None
+    ) -> dict[str, float]:
+        """Migrate the flows of every switch to `pipeline`.
+        With INCREMENTAL_MIGRATION, only the table groups that changed from
+        the applied pipeline are migrated. The table groups of the NApps
+        deferred by ENABLE_TABLE_TIMEOUT are left out.
+        Switches are migrated in waves by Migrator.migrate_waves.
+        Return the seconds each switch took to converge."""
+        compiled = compile_pipeline(pipeline)
+        table_groups = None
+        if INCREMENTAL_MIGRATION:
+            table_groups = compiled.delta(self.applied_pipeline)
+        with self.enable_table_lock:
+            deferred = frozenset(self.deferred_napps)
+        if deferred:
+            # The flows of the NApps that missed the enable_table deadline
+            # are migrated by migrate_deferred_napp once they acknowledge it
+            if table_groups is None:
+                table_groups = frozenset(compiled.table_ids)
+            table_groups = frozenset(
+                pair for pair in table_groups if pair[0] not in deferred
+            )
+        if INCREMENTAL_MIGRATION or deferred:
+            log.info(f"of_multi_table table groups to migrate: {table_groups}")
+        self.applied_pipeline = None
+        converged = self.migrator.migrate_waves(compiled, table_groups, job, span)
+        if not deferred:
+            self.applied_pipeline = compiled
+        return converged
+
+    def migrate_deferred_napp(self, napp: str, job: PipelineJob) -> None:
+        """Migrate the flows of a NApp that acknowledged enable_table after
+        ENABLE_TABLE_TIMEOUT to the pipeline already applied without them"""
+        pipeline = self.pipeline_controller.get_active_pipeline()
+        if pipeline and pipeline.get("status") != "enabled":
+            msg = (
+                f"Pipeline {pipeline['id']} is {pipeline.get('status')}, "
+                f"flows of {napp} not migrated"
+            )
+            log.error(msg)
+            job.fail(msg)
             return
-        self.get_flows_to_be_installed()
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_fixed(20),
-        before_sleep=before_sleep,
-        retry=retry_if_exception_type(RequestError),
-    )
-    def get_installed_flows(self) -> Optional[Dict]:
-        """Get flows from flow_manager"""
-        command = "v2/stored_flows?state=installed"
-        response = httpx.get(f"{FLOW_MANAGER_URL}/{command}", timeout=20)
-
-        if response.is_server_error:
-            raise RequestError(message=f"{response.text} on {command}")
-
-        return response.json()
-
-    def get_flows_to_be_installed(self):
+        compiled = compile_pipeline(pipeline or self.default_pipeline)
+        table_groups = frozenset(pair for pair in compiled.table_ids if pair[0] == napp)
+        with self.tracer.start_span("migration", job.span, napp=napp) as span:
+            self.migrator.migrate_waves(compiled, table_groups, job, span)
+        with self.enable_table_lock:
+            if not self.deferred_napps and self.applied_pipeline is None:
+                self.applied_pipeline = compiled
+        log.info(f"of_multi_table flows of {napp} migrated to {compiled.id}")
+        job.set_status(JobStatus.FINISHED)
+
+    def get_migration_plan(self, pipeline: dict, detail: bool = False) -> dict:
+        """Plan the migration of every switch to `pipeline`, like
+        migrate_pipeline does, without applying it.
+        Return a summary, and the plan of each switch if `detail`."""
+        compiled = compile_pipeline(pipeline)
+        table_groups = None
+        if INCREMENTAL_MIGRATION:
+            table_groups = compiled.delta(self.applied_pipeline)
+        plan_by_switch = self.migrator.plan(compiled, table_groups)
+        result = self.migrator.summarize_plan(plan_by_switch, table_groups)
+        if detail:
+            result["switches"] = plan_by_switch
+        return result
+
+    def get_flows_to_be_installed(self, job: Optional[PipelineJob] = None):
         """Get flows from flow manager so this NApp can modify them
-        and, install the flows with different table_id"""
-        pipeline = self.pipeline_controller.get_active_pipeline()
+        and, install the flows with different table_id.
+        Progress is reported to `job`, the current job by default."""
+        job = job or self.current_job
+        pipeline = job.pipeline
         if not pipeline or pipeline.get("status") == "enabled":
             # Default or enabled pipeline, not need to get flows
+            job.set_status(JobStatus.FINISHED)
             return
 
         pipeline_id = pipeline["id"]
-        if "disabl" in pipeline.get("status", ""):
+        from_status = pipeline["status"]
+        if "disabl" in from_status:
             pipeline = self.default_pipeline
 
-        try:
-            flows_by_swich = self.get_installed_flows()
-        except tenacity.RetryError:
-            status = pipeline.get("status")
-            status = "enabling_error" if status else "disabling_error"
-            msg = f"Could not get flows. Pipeline {pipeline_id} {status}"
-            self.pipeline_controller.error_pipeline(pipeline_id, status)
-            log.error(msg)
-            return
-
-        if flows_by_swich is None:
-            return
-
-        set_up = self.build_content(pipeline)
-        delete_flows = {}
-        install_flows = {}
-        for switch in flows_by_swich:
-            delete_flows[switch] = []
-            install_flows[switch] = []
-            for flow in flows_by_swich[switch]:
-                owner = flow["flow"].get("owner")
-                if owner not in set_up:
-                    continue
-                expected_table_id = set_up[owner][flow["flow"]["table_group"]]
-                # if table_id needs to change
-                if expected_table_id != flow["flow"]["table_id"]:
-                    # Get key-value from flow to be sent to flow_manager
-                    delete = {
-                        "cookie": flow["flow"].get("cookie"),
-                        "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
-                        "table_id": flow["flow"]["table_id"],
-                        "owner": owner,
-                    }
-                    if flow["flow"].get("match"):
-                        delete["match"] = flow["flow"].get("match")
-                    delete_flows[switch].append(delete)
-                    # Change table_id before being added
-                    flow["flow"].update({"table_id": expected_table_id})
-                    install_flows[switch].append(flow["flow"])
-
         log.info(f"of_multi_table pushing flows, pipeline: {pipeline}")
-        self.manage_miss_flows(pipeline, flows_by_swich)
-        self.send_flows(delete_flows, "delete")
-        self.send_flows(install_flows, "install")
-
-        if pipeline.get("status") is None:
-            self.pipeline_controller.disabled_pipeline(pipeline_id)
-            msg = f"Pipeline {pipeline_id} disabled"
-            log.debug(f"of_multi_table result {msg}")
-        else:
-            self.pipeline_controller.enabled_pipeline(pipeline_id)
-            msg = f"Pipeline {pipeline_id} enabled"
-            log.debug(f"of_multi_table result {msg}")
-
-    @staticmethod
-    def get_miss_flows_installed(
-        flows_by_swich: Dict[str, Dict]
-    ) -> tuple[dict[int, dict], set[str]]:
-        """Get miss flows reformated as {"table_id": {flow}} from
-        a single switch"""
-        miss_flows = {}
-        stored_table_ids = set()
-        # Keys needed to compare miss flow entries, except table_id
-        compare = {"priority", "instructions", "match"}
-        for _, flows in flows_by_swich.items():
-            for flow in flows:
-                owner = flow["flow"].get("owner")
-                if owner == "of_multi_table":
-                    flow = flow["flow"]
-                    miss_flows[flow["table_id"]] = {
-                        key: flow[key] for key in compare if flow.get(key) is not None
-                    }
-                    stored_table_ids.add(flow["table_id"])
-            # Miss flows are the same in all switches
-            break
-        return miss_flows, stored_table_ids
-
-    def manage_miss_flows(self, pipeline: Dict, flows_by_swich: Dict[str, Dict]):
-        """Determine whether to install and/or delete miss_flows"""
-        miss_table = {}
-        pipeline_table_ids = set()
-        miss_flows, stored_table_ids = self.get_miss_flows_installed(flows_by_swich)
-        for table in pipeline["multi_table"]:
-            table_miss_flow = table.get("table_miss_flow")
-            if table_miss_flow:
-                miss_table[table["table_id"]] = table_miss_flow
-                pipeline_table_ids.add(table["table_id"])
-
-        if stored_table_ids and pipeline_table_ids:
-            # Miss flows may need to be modified
-            # Tables that need miss flows installed
-            install = pipeline_table_ids - stored_table_ids
-            # Tables that have extra miss flows, delete them
-            delete = stored_table_ids - pipeline_table_ids
-            # Tables that need to modify its miss flows
-            modify = set()
-            for id_ in pipeline_table_ids - install:
-                if miss_flows[id_] != miss_table[id_]:
-                    modify.add(id_)
-            self.delete_miss_flows(delete | modify)
-            self.install_miss_flows(miss_table, install | modify)
-
-        elif not stored_table_ids:
-            # Not miss flows installed, install new miss flows from pipeline
-            self.install_miss_flows(miss_table, pipeline_table_ids)
-
-        elif not pipeline_table_ids:
-            # No miss flows in pipeline, delete all miss flows installed
-            self.delete_miss_flows(stored_table_ids)
-
-    def delete_miss_flows(self, table_ids: Iterable[int]):
-        """Delete miss flows"""
-        if not table_ids:
-            return
-        delete_flows = {}
-        for switch in self.controller.switches:
-            delete_flows[switch] = []
-            cookie = self.get_cookie(switch)
-            for table_id in table_ids:
-                delete = {
-                    "cookie": cookie,
-                    "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
-                    "table_id": table_id,
-                    "owner": "of_multi_table",
-                }
-
-                delete_flows[switch].append(delete)
-        self.send_flows(delete_flows, "delete")
+        with self.tracer.start_span("migration", job.span) as span:
+            try:
+                converged = self.migrate_pipeline(pipeline, job, span)
+            except (tenacity.RetryError, RolloutAborted) as err:
+                status = pipeline.get("status")
+                status = "enabling_error" if status else "disabling_error"
+                if isinstance(err, RolloutAborted):
+                    msg = f"Rollout aborted, {err}. Pipeline {pipeline_id} {status}"
+                else:
+                    msg = f"Could not get flows. Pipeline {pipeline_id} {status}"
+                span.set_attribute("error", msg)
+                if self.check_superseded(job):
+                    return
+                with self.migrator.stage("db_transition", job.span):
+                    self.pipeline_controller.error_pipeline(pipeline_id, status)
+                log.error(msg)
+                job.fail(msg)
+                return
+
+        for dpid, elapsed in sorted(converged.items(), key=lambda item: item[1]):
+            log.debug(f"of_multi_table switch {dpid} converged in {elapsed:.3f}s")
+        if converged:
+            log.info(
+                f"of_multi_table {len(converged)} switches converged in "
+                f"{max(converged.values()):.3f}s, pipeline {pipeline_id}"
+            )
 
-    def install_miss_flows(
-        self,
-        miss_table: Dict[int, Dict],
-        table_ids: Iterable[int],
-    ):
-        """Install miss flow entry to a switch"""
-        if not table_ids:
+        if self.check_superseded(job):
             return
-        install_flows = {}
-        for switch in self.controller.switches:
-            install_flows[switch] = []
-            cookie = self.get_cookie(switch)
-            for table_id in table_ids:
-                miss_flow = miss_table[table_id]
-                flow = {
-                    "priority": miss_flow.get("priority", 0),
-                    "cookie": cookie,
-                    "owner": "of_multi_table",
-                    "table_group": "base",
-                    "table_id": table_id,
-                }
-                if miss_flow.get("match"):
-                    flow["match"] = miss_flow.get("match")
-                instruction = miss_flow.get("instructions")
-                if instruction and instruction[0]:
-                    flow["instructions"] = miss_flow.get("instructions")
-                install_flows[switch].append(flow)
-        self.send_flows(install_flows, "install")
-
-    def send_flows(self, flows_dict: Dict, action: str, force: bool = True):
-        """Send flows to flow_manager through event"""
-
-        for dpid, flows in flows_dict.items():
-            self.controller.buffers.app.put(
-                KytosEvent(
-                    name=f"kytos.flow_manager.flows.{action}",
-                    content={
-                        "dpid": dpid,
-                        "flow_dict": {"flows": flows},
-                        "force": force,
-                    },
+        with self.migrator.stage("db_transition", job.span):
+            # The status is only changed if the pipeline is still the one
+            # migrated, not changed meanwhile by another process
+            if pipeline.get("status") is None:
+                changed = self.pipeline_controller.disabled_pipeline(
+                    pipeline_id, from_status
                 )
-            )
+                msg = f"Pipeline {pipeline_id} disabled"
+            else:
+                changed = self.pipeline_controller.enabled_pipeline(
+                    pipeline_id, from_status
+                )
+                msg = f"Pipeline {pipeline_id} enabled"
+        if not changed:
+            msg = f"Pipeline {pipeline_id} no longer {from_status}, status kept"
+        log.debug(f"of_multi_table result {msg}")
+        job.set_status(JobStatus.FINISHED)
+
+    def check_superseded(self, job: PipelineJob) -> bool:
+        """Check if a newer pipeline change was requested while `job` was
+        migrating flows. The newer job sets the pipelines status, so `job`
+        is superseded without changing it."""
+        if job is self.current_job:
+            return False
+        log.info(
+            f"of_multi_table job {job.id} superseded during its migration, "
+            f"pipeline {job.pipeline_id} status kept"
+        )
+        job.set_status(JobStatus.SUPERSEDED)
+        return True
 
     @staticmethod
     def get_pipeline_controller():
         """Get PipelineController"""
         return PipelineController()
 
+    @staticmethod
+    def get_flows_controller():
+        """Get FlowsController"""
+        return FlowsController()
+
     @rest("/v1/pipeline", methods=["POST"])
     @validate_openapi(spec)
     def add_pipeline(self, request: Request) -> JSONResponse:
@@ -414,10 +590,10 @@ class Main(KytosNApp):
             msg = f"Pipeline {pipeline_id} not found"
             log.debug(f"enable_pipeline result {msg} 404")
             raise HTTPException(404, detail=msg)
-        self.load_pipeline(pipeline)
+        job = self.start_job("enable", pipeline)
         msg = f"Pipeline {pipeline_id} enabling"
-        log.debug(f"enable_pipeline result {msg} 200")
-        return JSONResponse(msg)
+        log.debug(f"enable_pipeline result {msg} 202")
+        return JSONResponse({"job_id": job.id, "message": msg}, status_code=202)
 
     @rest("/v1/pipeline/{pipeline_id}/disable", methods=["POST"])
     def disable_pipeline(self, request: Request) -> JSONResponse:
@@ -435,11 +611,243 @@ class Main(KytosNApp):
             msg = f"Pipeline {pipeline_id} disabled"
             log.debug(f"disable_pipeline result {msg} 200")
             return JSONResponse(msg)
-        pipeline = self.pipeline_controller.disabling_pipeline(pipeline_id)
-        self.load_pipeline(self.default_pipeline)
+        self.pipeline_controller.disabling_pipeline(pipeline_id)
+        job = self.start_job("disable", {"id": pipeline_id, "status": "disabling"})
         msg = f"Pipeline {pipeline_id} disabling"
-        log.debug(f"disable_pipeline result {msg} 200")
-        return JSONResponse(msg)
+        log.debug(f"disable_pipeline result {msg} 202")
+        return JSONResponse({"job_id": job.id, "message": msg}, status_code=202)
+
+    @rest("/v1/pipeline/{pipeline_id}/plan", methods=["POST"])
+    def plan_pipeline(self, request: Request) -> JSONResponse:
+        """Plan the migration to a pipeline without applying it"""
+        pipeline_id = request.path_params["pipeline_id"]
+        log.debug(f"plan_pipeline /v1/pipeline/{pipeline_id}/plan")
+        detail = request.query_params.get("detail", "false").lower() == "true"
+        pipeline = self.pipeline_controller.get_pipeline(pipeline_id)
+        if not pipeline:
+            msg = f"Pipeline {pipeline_id} not found"
+            log.debug(f"plan_pipeline result {msg} 404")
+            raise HTTPException(404, detail=msg)
+        try:
+            plan = self.get_migration_plan(pipeline, detail)
+        except tenacity.RetryError:
+            msg = f"Could not get flows to plan pipeline {pipeline_id}"
+            log.debug(f"plan_pipeline result {msg} 503")
+            raise HTTPException(503, detail=msg)
+        log.debug(f"plan_pipeline result {plan['summary']} 200")
+        return JSONResponse(plan)
+
+    @rest("/v1/metrics", methods=["GET"])
+    def get_metrics(self, request: Request) -> PlainTextResponse:
+        """Get the metrics in Prometheus text format"""
+        log.debug("get_metrics /v1/metrics")
+        return PlainTextResponse(
+            self.metrics.render(), media_type="text/plain; version=0.0.4"
+        )
+
+    @rest("/v1/traces", methods=["GET"])
+    def get_traces(self, request: Request) -> JSONResponse:
+        """Get the spans of the last pipeline changes, grouped by trace"""
+        log.debug("get_traces /v1/traces")
+        return JSONResponse(self.tracer.traces())
+
+    @rest("/v1/drift", methods=["GET"])
+    def get_drift(self, request: Request) -> JSONResponse:
+        """Get the switches whose flows drifted from the active pipeline
+        when they were last audited"""
+        log.debug("get_drift /v1/drift")
+        with self.audit_lock:
+            drift = dict(self.drift)
+        return JSONResponse(drift)
+
+    @rest("/v1/pipeline/{pipeline_id}/jobs/{job_id}", methods=["GET"])
+    def get_pipeline_job(self, request: Request) -> JSONResponse:
+        """Get the progress of a pipeline job"""
+        pipeline_id = request.path_params["pipeline_id"]
+        job_id = request.path_params["job_id"]
+        log.debug(f"get_pipeline_job /v1/pipeline/{pipeline_id}/jobs/{job_id}")
+        job = self.jobs.get(job_id)
+        if not job or job.pipeline_id != pipeline_id:
+            msg = f"Job {job_id} not found"
+            log.debug(f"get_pipeline_job result {msg} 404")
+            raise HTTPException(404, detail=msg)
+        log.debug(f"get_pipeline_job result {job.status.value} 200")
+        return JSONResponse(job.as_dict())
+
+    @listen_to("kytos/of_core.handshake.completed")
+    def on_handshake_completed(self, event):
+        """Reconcile a switch once it connects"""
+        self.handle_handshake_completed(event)
+
+    def handle_handshake_completed(self, event):
+        """Reconcile the flows and miss flows of the connected switch in
+        job_executor, after any pipeline change already queued"""
+        dpid = event.content["switch"].id
+
+        def run():
+            try:
+                self.reconcile_switch(dpid)
+            except Exception:  # pylint: disable=broad-except
+                log.exception(f"of_multi_table could not reconcile switch {dpid}")
+
+        self.job_executor.submit(run)
+
+    def get_settled_pipeline(self) -> Optional[CompiledPipeline]:
+        """Get the active pipeline compiled, or the default one if none is
+        enabled. None while a pipeline change is in progress or if it failed,
+        warning once of the failed ones."""
+        if self.current_job and not self.current_job.done:
+            return None
+        pipeline = self.pipeline_controller.get_active_pipeline()
+        if pipeline and pipeline.get("status") != "enabled":
+            unsettled = (pipeline["id"], pipeline.get("status", ""))
+            if unsettled[1].endswith("_error") and unsettled != self.unsettled_pipeline:
+                log.warning(
+                    f"of_multi_table pipeline {pipeline['id']} is "
+                    f"{unsettled[1]}, switches are not audited nor reconciled "
+                    "until it is enabled or disabled again"
+                )
+            self.unsettled_pipeline = unsettled
+            return None
+        self.unsettled_pipeline = None
+        return compile_pipeline(pipeline or self.default_pipeline)
+
+    def get_settled_table_groups(
+        self, compiled: CompiledPipeline
+    ) -> Optional[frozenset]:
+        """Get the table groups of `compiled` whose flows were migrated,
+        leaving out the NApps deferred by ENABLE_TABLE_TIMEOUT.
+        None for all of them."""
+        with self.enable_table_lock:
+            deferred = frozenset(self.deferred_napps)
+        if not deferred:
+            return None
+        return frozenset(pair for pair in compiled.table_ids if pair[0] not in deferred)
+
+    def reconcile_switch(self, dpid: str) -> None:
+        """Migrate the flows and miss flows of a single switch to the active
+        pipeline, or to the default one if none is enabled, only fetching the
+        flows of `dpid`. While a pipeline change is in progress, the switch
+        is reconciled once the change is done."""
+        compiled = self.get_settled_pipeline()
+        if compiled is None:
+            log.debug(
+                f"of_multi_table reconciling switch {dpid} once the "
+                "pipeline change in progress is done"
+            )
+            self.pending_reconciles.add(dpid)
+            return
+        self.pending_reconciles.discard(dpid)
+        table_groups = self.get_settled_table_groups(compiled)
+        with self.tracer.start_span("reconcile_switch", dpid=dpid) as span:
+            converged = self.migrator.migrate_switches(
+                compiled, [dpid], time.monotonic(), table_groups, parent_span=span
+            )
+        log.info(
+            f"of_multi_table switch {dpid} reconciled with pipeline "
+            f"{compiled.id or 'default'} in {converged.get(dpid, 0.0):.3f}s"
+        )
+
+    def reconcile_pending_switches(self) -> None:
+        """Reconcile the switches that connected during a pipeline change,
+        once the pipeline is settled"""
+        if not self.pending_reconciles or self.get_settled_pipeline() is None:
+            return
+        for dpid in sorted(self.pending_reconciles):
+            try:
+                self.reconcile_switch(dpid)
+            except Exception:  # pylint: disable=broad-except
+                self.pending_reconciles.discard(dpid)
+                log.exception(f"of_multi_table could not reconcile switch {dpid}")
+
+    def get_audit_switches(self) -> list[str]:
+        """Get the next AUDIT_SWITCHES_PER_INTERVAL switches to audit,
+        round robin in dpid order, leaving out the disconnected and
+        disabled switches"""
+        dpids = sorted(
+            dpid
+            for dpid, switch in self.controller.switches.copy().items()
+            if switch.is_connected() and switch.is_enabled()
+        )
+        if self.audit_last_dpid is not None:
+            start = bisect_right(dpids, self.audit_last_dpid)
+            dpids = dpids[start:] + dpids[:start]
+        dpids = dpids[:AUDIT_SWITCHES_PER_INTERVAL]
+        if dpids:
+            self.audit_last_dpid = dpids[-1]
+        return dpids
+
+    def audit_switches(self) -> dict[str, dict]:
+        """Diff the stored flows of the next switches against the settled
+        pipeline, as a migration plan, keeping the drifted switches in
+        `drift`. With AUDIT_AUTO_REPAIR, the drift is repaired in
+        job_executor. Return the drifted switches."""
+        compiled = self.get_settled_pipeline()
+        if compiled is None:
+            log.debug("of_multi_table audit skipped, pipeline change in progress")
+            return {}
+        dpids = self.get_audit_switches()
+        if not dpids:
+            return {}
+        table_groups = self.get_settled_table_groups(compiled)
+        with self.metrics.stage_seconds.time(stage="audit"):
+            plan = self.migrator.plan_switches(
+                compiled, dpids, table_groups, stage="audit_fetch"
+            )
+        audited_at = datetime.utcnow().isoformat()
+        drifted = {}
+        with self.audit_lock:
+            for dpid in dpids:
+                switch_plan = plan.get(dpid, {})
+                if not any(switch_plan.values()):
+                    self.drift.pop(dpid, None)
+                    self.metrics.audited_switches.inc(result="ok")
+                    continue
+                drifted[dpid] = self.drift[dpid] = {
+                    "pipeline_id": compiled.id,
+                    "audited_at": audited_at,
+                    **switch_plan,
+                }
+                self.metrics.audited_switches.inc(result="drift")
+        if not drifted:
+            return drifted
+        log.warning(f"of_multi_table drift found in switches {sorted(drifted)}")
+        if AUDIT_AUTO_REPAIR:
+
+            def run():
+                try:
+                    self.repair_drift(compiled, drifted)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("of_multi_table could not repair drift")
+
+            self.job_executor.submit(run)
+        return drifted
+
+    def repair_drift(self, compiled: CompiledPipeline, drifted: dict[str, dict]):
+        """Migrate the drifted switches to `compiled`, unless the pipeline
+        changed since they were audited, sending at most
+        AUDIT_REPAIR_FLOW_MODS_PER_SECOND FlowMods per second"""
+        settled = self.get_settled_pipeline()
+        if settled is None or (settled.id, settled.updated_at) != (
+            compiled.id,
+            compiled.updated_at,
+        ):
+            log.info(
+                f"of_multi_table drift of switches {sorted(drifted)} not "
+                "repaired, the pipeline changed"
+            )
+            return
+        table_groups = self.get_settled_table_groups(compiled)
+        for dpid, switch_plan in drifted.items():
+            self.audit_bucket.acquire(self.migrator.count_flow_mods(switch_plan))
+            with self.tracer.start_span("repair_drift", dpid=dpid) as span:
+                self.migrator.migrate_switches(
+                    compiled, [dpid], time.monotonic(), table_groups, parent_span=span
+                )
+            with self.audit_lock:
+                self.drift.pop(dpid, None)
+            self.metrics.audited_switches.inc(result="repaired")
+            log.info(f"of_multi_table drift of switch {dpid} repaired")
 
     @listen_to("kytos/flow_manager.flow.error")
     def on_flow_mod_error(self, event):
@@ -447,16 +855,53 @@ class Main(KytosNApp):
         self.handle_flow_mod_error(event)
 
     def handle_flow_mod_error(self, event):
-        """Handle flow mod errors"""
+        """Handle flow mod errors
+        Errors are summarized by switch and flushed after FLOW_ERRORS_WINDOW
+        seconds, so a burst of errors makes a single status transition"""
         if event.content.get("error_exception"):
             return
         flow = event.content["flow"]
-        if self.check_ownership(flow.cookie):
-            # A miss flow only is installed when enabling
-            pipeline = self.pipeline_controller.get_active_pipeline()
-            status = "enabling_error"
-            self.pipeline_controller.error_pipeline(pipeline["id"], status)
-            log.error(f"Miss flow cannot be installed. Flow: {flow.as_dict()}")
+        self.migrator.rollout.record_error(flow.switch.id)
+        if not self.check_ownership(flow.cookie):
+            self.metrics.flow_errors.inc(owner="other")
+            return
+        self.metrics.flow_errors.inc(owner="of_multi_table")
+        log.debug(f"Miss flow cannot be installed. Flow: {flow.as_dict()}")
+        with self.flow_errors_lock:
+            summary = self.flow_errors.setdefault(
+                flow.switch.id, {"count": 0, "table_ids": []}
+            )
+            summary["count"] += 1
+            if flow.table_id not in summary["table_ids"]:
+                summary["table_ids"].append(flow.table_id)
+            summary["error_type"] = event.content.get("error_type")
+            summary["error_code"] = event.content.get("error_code")
+            if self.flow_errors_timer is None:
+                self.flow_errors_timer = Timer(
+                    FLOW_ERRORS_WINDOW, self.flush_flow_errors
+                )
+                self.flow_errors_timer.daemon = True
+                self.flow_errors_timer.start()
+
+    def flush_flow_errors(self):
+        """Set the active pipeline status to enabling_error once for all
+        the summarized flow mod errors"""
+        with self.flow_errors_lock:
+            errors, self.flow_errors = self.flow_errors, {}
+            self.flow_errors_timer = None
+        if not errors:
+            return
+        # A miss flow only is installed when enabling
+        pipeline = self.pipeline_controller.get_active_pipeline()
+        if not pipeline:
+            log.error(f"Miss flows cannot be installed. Errors: {errors}")
+            return
+        status = "enabling_error"
+        self.pipeline_controller.error_pipeline(pipeline["id"], status, errors)
+        log.error(
+            f"Miss flows cannot be installed in {len(errors)} switches. "
+            f"Pipeline {pipeline['id']} {status}. Errors: {errors}"
+        )
 
     @staticmethod
     def check_ownership(cookie):
@@ -465,14 +910,15 @@ class Main(KytosNApp):
         mask = 0xFF00000000000000
         return (napp_cookie & mask) == (cookie & mask)
 
-    @staticmethod
-    def get_cookie(switch_dpid) -> int:
-        """Return the cookie integer given a dpid."""
-        dpid = int(switch_dpid.replace(":", ""), 16)
-        return (0x00FFFFFFFFFFFFFF & dpid) | (COOKIE_PREFIX << 56)
-
     def shutdown(self):
         """Run when your NApp is unloaded.
 
         If you have some cleanup procedure, insert it here.
         """
+        self.watch_pipelines_stop.set()
+        self.job_executor.shutdown(wait=False, cancel_futures=True)
+        self.migrator.shutdown()
+        if self.enable_table_timer is not None:
+            self.enable_table_timer.cancel()
+        if self.tracer.exporter:
+            self.tracer.exporter.close()
@@ -0,0 +1,182 @@
+"""Metrics of pipeline migrations, rendered in Prometheus text format"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator
+
+# Upper bounds in seconds of the histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    """Format label pairs as {name="value",...}"""
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Base of the metrics, with values by label set"""
+
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_
+        self.labels = labels
+        self.values: dict[tuple, object] = {}
+        self.lock = Lock()
+
+    def key(self, labels: dict) -> tuple[tuple[str, str], ...]:
+        """Get the label pairs of a sample, in the declared order"""
+        return tuple((name, str(labels[name])) for name in self.labels)
+
+    def samples(self) -> Iterator[str]:
+        """Yield the sample lines"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the metric with its HELP and TYPE lines"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Value that only goes up"""
+
+    kind = "counter"
+
+    def inc(self, value: float = 1, **labels) -> None:
+        """Increment the counter of `labels` by `value`"""
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def get(self, **labels) -> float:
+        """Get the value of `labels`"""
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        if not values and not self.labels:
+            values = [((), 0)]
+        for key, value in values:
+            yield f"{self.name}{format_labels(key)} {value}"
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        """Observe `value` for `labels`"""
+        key = self.key(labels)
+        with self.lock:
+            sample = self.values.get(key)
+            if sample is None:
+                # Observations by bucket, sum and count
+                sample = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the block"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            values = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self.values.items()
+            )
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = format_labels(key + (("le", str(bound)),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(key + (("le", "+Inf"),))
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{format_labels(key)} {total}"
+            yield f"{self.name}_count{format_labels(key)} {count}"
+
+
+class Metrics:
+    """Metrics of of_multi_table"""
+
+    def __init__(self) -> None:
+        self.flows_fetched = Counter(
+            "of_multi_table_flows_fetched_total",
+            "Installed flows fetched to be migrated",
+        )
+        self.flows_moved = Counter(
+            "of_multi_table_flows_moved_total",
+            "Flows moved to another table, by destination table",
+            ("table_id",),
+        )
+        self.flow_mods = Counter(
+            "of_multi_table_flow_mods_total",
+            "FlowMods sent to flow_manager, by action",
+            ("action",),
+        )
+        self.flow_errors = Counter(
+            "of_multi_table_flow_errors_total",
+            "Flow errors reported by flow_manager, by owner of the flow",
+            ("owner",),
+        )
+        self.stage_seconds = Histogram(
+            "of_multi_table_stage_seconds",
+            "Seconds spent in each stage of a pipeline migration",
+            ("stage",),
+        )
+        self.enable_table_seconds = Histogram(
+            "of_multi_table_enable_table_seconds",
+            "Seconds a NApp took to respond to enable_table",
+            ("napp",),
+        )
+        self.audited_switches = Counter(
+            "of_multi_table_audited_switches_total",
+            "Switches audited, by result: ok, drift or repaired",
+            ("result",),
+        )
+
+    def render(self) -> str:
+        """Render all the metrics in Prometheus text format"""
+        metrics = (
+            self.flows_fetched,
+            self.flows_moved,
+            self.flow_mods,
+            self.flow_errors,
+            self.stage_seconds,
+            self.enable_table_seconds,
+            self.audited_switches,
+        )
+        return "\n".join(metric.render() for metric in metrics) + "\n"
@@ -0,0 +1,648 @@
+"""Migration of the flows of the switches to a pipeline"""
+
+# pylint: disable=too-many-arguments, too-many-public-methods
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from importlib.util import find_spec
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Mapping, Optional
+
+import httpx
+import tenacity
+from httpx import RequestError
+from pymongo.errors import PyMongoError
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+from kytos.core import log
+from kytos.core.events import KytosEvent
+from kytos.core.retry import before_sleep
+
+from .controllers import FlowsController
+from .flows import FlowRecord, deletes, installs, to_records
+from .jobs import PipelineJob
+from .metrics import Metrics
+from .pipeline import CompiledPipeline
+from .rollout import Rollout, RolloutAborted
+from .settings import (
+    COOKIE_PREFIX,
+    FETCH_FLOWS_CHUNK_SIZE,
+    FLOW_MANAGER_HTTP_KEEPALIVE_EXPIRY,
+    FLOW_MANAGER_HTTP_MAX_CONNECTIONS,
+    FLOW_MANAGER_HTTP_TIMEOUT,
+    FLOW_MANAGER_RETRY_MAX_WAIT,
+    FLOW_MANAGER_URL,
+    INSTALLED_FLOWS_BATCH_SIZE,
+    MAX_FLOWS_PER_EVENT,
+    MIGRATION_MAKE_BEFORE_BREAK,
+    MIGRATION_MAX_WORKERS,
+    NAPPS_COOKIE_PREFIX,
+    PLAN_FLOW_MODS_PER_SECOND,
+    ROLLOUT_FLOW_MODS_PER_SECOND,
+    ROLLOUT_MAX_ERROR_RATE,
+    ROLLOUT_SWITCH_FLOW_MODS_PER_SECOND,
+    ROLLOUT_SWITCHES_PER_WAVE,
+    ROLLOUT_WAVE_PAUSE,
+    SEND_FLOWS_BACKOFF,
+    SEND_FLOWS_BUFFER_WATERMARK,
+)
+from .tracing import Tracer
+
+
+class Migrator:
+    """Fetch, diff and push the flows and miss flows of the switches to a
+    pipeline.
+
+    Switches are migrated in waves of chunks of switches, the chunks of a
+    wave concurrently by `executor`, with the FlowMods sent within the
+    `rollout` rate limits.
+    """
+
+    def __init__(
+        self,
+        controller,
+        metrics: Metrics,
+        tracer: Tracer,
+        flows_controller: Optional[FlowsController] = None,
+    ) -> None:
+        self.controller = controller
+        self.metrics = metrics
+        self.tracer = tracer
+        self.flows_controller = flows_controller
+        self.http_client = self.get_http_client()
+        self.executor = ThreadPoolExecutor(
+            max_workers=MIGRATION_MAX_WORKERS,
+            thread_name_prefix="of_multi_table_migration",
+        )
+        self.rollout = Rollout(
+            ROLLOUT_SWITCH_FLOW_MODS_PER_SECOND, ROLLOUT_FLOW_MODS_PER_SECOND
+        )
+
+    @staticmethod
+    def get_http_client() -> httpx.Client:
+        """Get a client to flow_manager that keeps a pool of connections
+        alive, using HTTP/2 if the h2 package is installed"""
+        return httpx.Client(
+            base_url=FLOW_MANAGER_URL,
+            http2=find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=FLOW_MANAGER_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=FLOW_MANAGER_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=FLOW_MANAGER_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=FLOW_MANAGER_HTTP_TIMEOUT,
+        )
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential_jitter(max=FLOW_MANAGER_RETRY_MAX_WAIT),
+        before_sleep=before_sleep,
+        retry=retry_if_exception_type(RequestError),
+    )
+    def get_installed_flows(
+        self,
+        dpids: Optional[Iterable[str]] = None,
+        cookie_ranges: Optional[Iterable[tuple[int, int]]] = None,
+    ) -> Optional[Dict]:
+        """Get flows from flow_manager, only from `dpids` and
+        `cookie_ranges` if given"""
+        command = "v2/stored_flows"
+        params = [("state", "installed")]
+        if dpids:
+            params.extend(("dpid", dpid) for dpid in dpids)
+        for start, end in cookie_ranges or ():
+            params.extend((("cookie_range", start), ("cookie_range", end)))
+        response = self.http_client.get(command, params=params)
+
+        if response.is_server_error:
+            raise RequestError(message=f"{response.text} on {command}")
+
+        return response.json()
+
+    def fetch_installed_flows(
+        self,
+        dpids: Optional[Iterable[str]] = None,
+        cookie_ranges: Optional[Iterable[tuple[int, int]]] = None,
+        owners: Optional[Iterable[str]] = None,
+    ) -> Optional[Dict]:
+        """Get the installed flows from INSTALLED_FLOWS_SOURCE.
+        Reading flow_manager's collection also filters by `owners` and falls
+        back to its REST API."""
+        if self.flows_controller:
+            try:
+                return self.flows_controller.get_installed_flows(
+                    dpids, cookie_ranges, owners, INSTALLED_FLOWS_BATCH_SIZE
+                )
+            except (PyMongoError, tenacity.RetryError) as err:
+                log.warning(
+                    f"Could not read flow_manager flows from DB: {err}, "
+                    "falling back to flow_manager API"
+                )
+        return self.get_installed_flows(dpids, cookie_ranges)
+
+    @staticmethod
+    def get_cookie_ranges(
+        table_groups: Optional[frozenset],
+    ) -> Optional[list[tuple[int, int]]]:
+        """Get the cookie ranges of the owners of `table_groups` and of the
+        miss flows. None if all the flows are needed."""
+        if table_groups is None:
+            return None
+        prefixes = {COOKIE_PREFIX}
+        for owner, _ in table_groups:
+            if owner not in NAPPS_COOKIE_PREFIX:
+                return None
+            prefixes.add(NAPPS_COOKIE_PREFIX[owner])
+        return [
+            (prefix << 56, (prefix << 56) | 0x00FFFFFFFFFFFFFF)
+            for prefix in sorted(prefixes)
+        ]
+
+    def get_switch_chunks(
+        self, dpids: Optional[list[str]] = None
+    ) -> list[Optional[list[str]]]:
+        """Split `dpids`, all the switches by default, in chunks of
+        FETCH_FLOWS_CHUNK_SIZE dpids.
+        A single None chunk stands for all the switches."""
+        if FETCH_FLOWS_CHUNK_SIZE <= 0:
+            return [dpids]
+        if dpids is None:
+            dpids = sorted(self.controller.switches)
+        chunks = []
+        for start in range(0, len(dpids), FETCH_FLOWS_CHUNK_SIZE):
+            end = start + FETCH_FLOWS_CHUNK_SIZE
+            chunks.append(dpids[start:end])
+        return chunks
+
+    def get_switch_waves(self) -> list[list[Optional[list[str]]]]:
+        """Split the switches in waves of ROLLOUT_SWITCHES_PER_WAVE switches,
+        each one split in chunks. A single wave holds all the switches if
+        ROLLOUT_SWITCHES_PER_WAVE is 0."""
+        if ROLLOUT_SWITCHES_PER_WAVE <= 0:
+            return [self.get_switch_chunks()]
+        dpids = sorted(self.controller.switches)
+        waves = []
+        for start in range(0, len(dpids), ROLLOUT_SWITCHES_PER_WAVE):
+            end = start + ROLLOUT_SWITCHES_PER_WAVE
+            waves.append(self.get_switch_chunks(dpids[start:end]))
+        return waves
+
+    def get_switch_records(
+        self,
+        compiled: CompiledPipeline,
+        dpids: Optional[list[str]],
+        table_groups: Optional[frozenset] = None,
+        span=None,
+        stage: str = "fetch",
+    ) -> dict[str, list[FlowRecord]]:
+        """Fetch the installed flows of `dpids` that `compiled` may move or
+        replace, as records by switch. The fetch is timed as `stage`, only
+        the flows fetched by the "fetch" stage of migrations are counted."""
+        cookie_ranges = self.get_cookie_ranges(table_groups)
+        # Only the flows of the NApps in the pipeline and the miss flows
+        owners = compiled.owners | {"of_multi_table"}
+        with self.stage(stage, span) as fetch_span:
+            stored_flows = (
+                self.fetch_installed_flows(dpids, cookie_ranges, owners) or {}
+            )
+            # Stored flows are replaced by compact records switch by switch, so
+            # each switch's documents are released once converted
+            records_by_switch = {
+                dpid: to_records(stored_flows.pop(dpid)) for dpid in list(stored_flows)
+            }
+            fetched = sum(len(records) for records in records_by_switch.values())
+            fetch_span.set_attribute("flows", fetched)
+        if stage == "fetch":
+            self.metrics.flows_fetched.inc(fetched)
+        # Switches without stored flows still need their miss flows
+        for dpid in dpids or self.controller.switches:
+            records_by_switch.setdefault(dpid, [])
+        return records_by_switch
+
+    def migrate_switches(
+        self,
+        compiled: CompiledPipeline,
+        dpids: Optional[list[str]],
+        started_at: float,
+        table_groups: Optional[frozenset] = None,
+        *,
+        job: Optional[PipelineJob] = None,
+        parent_span=None,
+    ) -> dict[str, float]:
+        """Fetch, diff and push the flows and miss flows of `dpids`, only the
+        flows from `table_groups` if given.
+        Return the seconds each switch took to converge since `started_at`"""
+        with self.tracer.start_span("migrate_switches", parent_span) as span:
+            switches, moves_by_switch = self.fetch_moves(
+                compiled, dpids, table_groups, span
+            )
+            # Flow dicts are built lazily, chunk by chunk, when they are sent
+            with self.tracer.start_span("emit", span):
+                self.send_moves(moves_by_switch)
+            moved_by_table = self.count_moves(moves_by_switch)
+            if job:
+                job.add_progress(len(switches), sum(moved_by_table.values()))
+            elapsed = time.monotonic() - started_at
+            converged = {dpid: elapsed for dpid in switches}
+            span.set_attribute("flows_moved", moved_by_table)
+            span.set_attribute("switches", converged)
+        return converged
+
+    def fetch_moves(
+        self,
+        compiled: CompiledPipeline,
+        dpids: Optional[list[str]],
+        table_groups: Optional[frozenset] = None,
+        span=None,
+    ) -> tuple[list[str], dict[str, list[tuple[FlowRecord, int]]]]:
+        """Fetch the flows of `dpids`, push their miss flows and diff the
+        flows to be moved, only the flows from `table_groups` if given.
+        Return the switches fetched and the flows to move by switch"""
+        records_by_switch = self.get_switch_records(compiled, dpids, table_groups, span)
+        with self.tracer.start_span("miss_flows", span):
+            self.manage_miss_flows(compiled, records_by_switch)
+        with self.stage("diff", span):
+            moves_by_switch = self.get_flows_to_move(
+                compiled, records_by_switch, table_groups
+            )
+        return list(records_by_switch), moves_by_switch
+
+    def count_moves(
+        self, moves_by_switch: dict[str, list[tuple[FlowRecord, int]]]
+    ) -> dict[int, int]:
+        """Count the flows moved to each table_id in the metrics.
+        Return the flows moved by table_id"""
+        moved_by_table = {}
+        for moves in moves_by_switch.values():
+            for _, table_id in moves:
+                moved_by_table[table_id] = moved_by_table.get(table_id, 0) + 1
+        for table_id, moved in moved_by_table.items():
+            self.metrics.flows_moved.inc(moved, table_id=table_id)
+        return moved_by_table
+
+    def send_moves(self, moves_by_switch: dict[str, list[tuple[FlowRecord, int]]]):
+        """Send the flows to install in their new table and to delete from
+        the old one"""
+        if MIGRATION_MAKE_BEFORE_BREAK:
+            # Flows are installed in their new table before being deleted from
+            # the old one, switch by switch, so traffic is never blackholed
+            for dpid, moves in moves_by_switch.items():
+                self.send_flows({dpid: installs(moves)}, "install")
+                self.send_flows({dpid: deletes(moves)}, "delete")
+        else:
+            self.send_flows(
+                {dpid: deletes(moves) for dpid, moves in moves_by_switch.items()},
+                "delete",
+            )
+            self.send_flows(
+                {dpid: installs(moves) for dpid, moves in moves_by_switch.items()},
+                "install",
+            )
+
+    @contextmanager
+    def stage(self, name: str, parent_span=None):
+        """Time a migration stage in the metrics and in a tracing span"""
+        with self.metrics.stage_seconds.time(stage=name):
+            with self.tracer.start_span(name, parent_span) as span:
+                yield span
+
+    def migrate_waves(
+        self,
+        compiled: CompiledPipeline,
+        table_groups: Optional[frozenset],
+        job: Optional[PipelineJob] = None,
+        span=None,
+    ) -> dict[str, float]:
+        """Migrate the flows of `table_groups` of every switch to `compiled`.
+        Switches are migrated in waves, and the chunks of switches of a wave
+        concurrently by executor. After a wave, it waits ROLLOUT_WAVE_PAUSE
+        seconds and raises RolloutAborted if its flow errors per FlowMod
+        exceed ROLLOUT_MAX_ERROR_RATE.
+        Return the seconds each switch took to converge.
+        The migration of each chunk is traced as a child of `span`."""
+        if job:
+            job.start(len(self.controller.switches))
+        started_at = time.monotonic()
+        converged = {}
+        waves = self.get_switch_waves()
+        for index, chunks in enumerate(waves, 1):
+            if len(waves) > 1:
+                dpids = [dpid for chunk in chunks for dpid in chunk]
+                log.info(
+                    f"of_multi_table migrating wave {index}/{len(waves)}, "
+                    f"{len(dpids)} switches"
+                )
+            else:
+                dpids = None
+            self.rollout.start_wave(dpids)
+            futures = [
+                self.executor.submit(
+                    self.migrate_switches,
+                    compiled,
+                    chunk,
+                    started_at,
+                    table_groups,
+                    job=job,
+                    parent_span=span,
+                )
+                for chunk in chunks
+            ]
+            try:
+                for future in as_completed(futures):
+                    converged.update(future.result())
+            except tenacity.RetryError:
+                for future in futures:
+                    future.cancel()
+                raise
+            self.check_wave(index < len(waves))
+        return converged
+
+    def check_wave(self, more_waves: bool) -> None:
+        """Wait for the flow errors of the last wave, before starting the
+        next one, and raise RolloutAborted if there were too many"""
+        if more_waves and ROLLOUT_WAVE_PAUSE > 0:
+            time.sleep(ROLLOUT_WAVE_PAUSE)
+        if ROLLOUT_MAX_ERROR_RATE <= 0:
+            return
+        error_rate = self.rollout.error_rate()
+        if error_rate > ROLLOUT_MAX_ERROR_RATE:
+            raise RolloutAborted(
+                f"flow errors per FlowMod {error_rate:.3f} exceeded "
+                f"{ROLLOUT_MAX_ERROR_RATE}"
+            )
+
+    def plan_switches(
+        self,
+        compiled: CompiledPipeline,
+        dpids: Optional[list[str]],
+        table_groups: Optional[frozenset] = None,
+        stage: str = "plan_fetch",
+    ) -> dict[str, dict[str, int]]:
+        """Count, without sending them, the flows and miss flows that
+        migrate_switches would change in `dpids`, timing the fetch as
+        `stage`"""
+        records_by_switch = self.get_switch_records(
+            compiled, dpids, table_groups, stage=stage
+        )
+        plan = {}
+        for dpid, records in records_by_switch.items():
+            install, modify, delete = self.diff_miss_flows(compiled, records)
+            plan[dpid] = {
+                "flows_to_move": 0,
+                "miss_flows_to_install": len(install),
+                "miss_flows_to_modify": len(modify),
+                "miss_flows_to_delete": len(delete),
+            }
+        moves_by_switch = self.get_flows_to_move(
+            compiled, records_by_switch, table_groups
+        )
+        for dpid, moves in moves_by_switch.items():
+            plan[dpid]["flows_to_move"] = len(moves)
+        return plan
+
+    def plan(
+        self, compiled: CompiledPipeline, table_groups: Optional[frozenset] = None
+    ) -> dict[str, dict[str, int]]:
+        """Plan the migration of every switch to `compiled`, chunk by chunk,
+        without applying it. Return the plan of each switch."""
+        futures = [
+            self.executor.submit(self.plan_switches, compiled, chunk, table_groups)
+            for chunk in self.get_switch_chunks()
+        ]
+        plan_by_switch = {}
+        try:
+            for future in as_completed(futures):
+                plan_by_switch.update(future.result())
+        except tenacity.RetryError:
+            for future in futures:
+                future.cancel()
+            raise
+        return plan_by_switch
+
+    @staticmethod
+    def count_flow_mods(plan: dict[str, int]) -> int:
+        """Count the FlowMods needed to apply a plan"""
+        # A moved flow is installed and deleted, and so is a modified miss flow
+        return (
+            2 * plan["flows_to_move"]
+            + plan["miss_flows_to_install"]
+            + 2 * plan["miss_flows_to_modify"]
+            + plan["miss_flows_to_delete"]
+        )
+
+    @classmethod
+    def summarize_plan(
+        cls,
+        plan_by_switch: dict[str, dict[str, int]],
+        table_groups: Optional[frozenset],
+    ) -> dict:
+        """Sum the plans of every switch, with the FlowMods needed and their
+        estimated duration, and list the table groups to migrate by NApp"""
+        summary = {
+            "switches": len(plan_by_switch),
+            "switches_changed": 0,
+            "flows_to_move": 0,
+            "miss_flows_to_install": 0,
+            "miss_flows_to_modify": 0,
+            "miss_flows_to_delete": 0,
+        }
+        for switch_plan in plan_by_switch.values():
+            if any(switch_plan.values()):
+                summary["switches_changed"] += 1
+            for key, value in switch_plan.items():
+                summary[key] += value
+        summary["flow_mods"] = cls.count_flow_mods(summary)
+        summary["estimated_duration"] = (
+            summary["flow_mods"] / PLAN_FLOW_MODS_PER_SECOND
+            if PLAN_FLOW_MODS_PER_SECOND > 0
+            else None
+        )
+        changed = None
+        if table_groups is not None:
+            changed = {}
+            for napp, table_group in sorted(table_groups):
+                changed.setdefault(napp, []).append(table_group)
+        return {"table_groups": changed, "summary": summary}
+
+    @staticmethod
+    def get_flows_to_move(
+        compiled: CompiledPipeline,
+        records_by_switch: Dict[str, list[FlowRecord]],
+        table_groups: Optional[frozenset] = None,
+    ) -> dict[str, list[tuple[FlowRecord, int]]]:
+        """Get the flows to be moved by switch, with the table_id set by the
+        pipeline, from the flows whose table_id differs from it.
+        If `table_groups` is given, only their flows are considered."""
+        table_ids = compiled.table_ids
+        moves_by_switch = {}
+        for switch, records in records_by_switch.items():
+            moves_by_switch[switch] = moves = []
+            for record in records:
+                key = record.key
+                if table_groups is not None and key not in table_groups:
+                    continue
+                expected_table_id = table_ids.get(key)
+                # if table_id needs to change
+                if expected_table_id is None or expected_table_id == record.table_id:
+                    continue
+                moves.append((record, expected_table_id))
+        return moves_by_switch
+
+    @staticmethod
+    def get_miss_flows_installed(
+        records: list[FlowRecord],
+    ) -> tuple[dict[int, dict], set[int]]:
+        """Get miss flows reformated as {"table_id": {flow}} from
+        the flows of a single switch"""
+        miss_flows = {}
+        stored_table_ids = set()
+        # Keys needed to compare miss flow entries, except table_id
+        compare = {"priority", "instructions", "match"}
+        for record in records:
+            if record.owner == "of_multi_table":
+                flow = record.as_dict()
+                miss_flows[record.table_id] = {
+                    key: flow[key] for key in compare if flow.get(key) is not None
+                }
+                stored_table_ids.add(record.table_id)
+        return miss_flows, stored_table_ids
+
+    def manage_miss_flows(
+        self,
+        compiled: CompiledPipeline,
+        records_by_switch: Dict[str, list[FlowRecord]],
+    ):
+        """Determine, switch by switch, whether to install and/or delete
+        miss_flows. Only switches whose miss flows differ get flows sent."""
+        delete_flows = {}
+        install_flows = {}
+        for dpid, records in records_by_switch.items():
+            install, modify, delete = self.diff_miss_flows(compiled, records)
+            if delete | modify:
+                delete_flows[dpid] = delete | modify
+            if install | modify:
+                install_flows[dpid] = install | modify
+        self.delete_miss_flows(delete_flows)
+        self.install_miss_flows(compiled.miss_flows, install_flows)
+
+    @classmethod
+    def diff_miss_flows(
+        cls, compiled: CompiledPipeline, records: list[FlowRecord]
+    ) -> tuple[set[int], set[int], set[int]]:
+        """Get the tables of a switch whose miss flows have to be installed,
+        modified and deleted to match the pipeline"""
+        miss_table = compiled.miss_flows
+        pipeline_table_ids = set(miss_table)
+        miss_flows, stored_table_ids = cls.get_miss_flows_installed(records)
+        # Tables that need miss flows installed
+        install = pipeline_table_ids - stored_table_ids
+        # Tables that have extra miss flows, delete them
+        delete = stored_table_ids - pipeline_table_ids
+        # Tables that need to modify its miss flows
+        modify = set()
+        for id_ in pipeline_table_ids & stored_table_ids:
+            if miss_flows[id_] != miss_table[id_]:
+                modify.add(id_)
+        return install, modify, delete
+
+    def delete_miss_flows(self, table_ids_by_switch: Dict[str, Iterable[int]]):
+        """Delete miss flows from the tables of each switch"""
+        if not table_ids_by_switch:
+            return
+        delete_flows = {}
+        for switch, table_ids in table_ids_by_switch.items():
+            delete_flows[switch] = []
+            cookie = self.get_cookie(switch)
+            for table_id in table_ids:
+                delete = {
+                    "cookie": cookie,
+                    "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
+                    "table_id": table_id,
+                    "owner": "of_multi_table",
+                }
+
+                delete_flows[switch].append(delete)
+        self.send_flows(delete_flows, "delete")
+
+    def install_miss_flows(
+        self,
+        miss_table: Mapping[int, Dict],
+        table_ids_by_switch: Dict[str, Iterable[int]],
+    ):
+        """Install miss flow entries in the tables of each switch"""
+        if not table_ids_by_switch:
+            return
+        install_flows = {}
+        for switch, table_ids in table_ids_by_switch.items():
+            install_flows[switch] = []
+            cookie = self.get_cookie(switch)
+            for table_id in table_ids:
+                miss_flow = miss_table[table_id]
+                flow = {
+                    "priority": miss_flow.get("priority", 0),
+                    "cookie": cookie,
+                    "owner": "of_multi_table",
+                    "table_group": "base",
+                    "table_id": table_id,
+                }
+                if miss_flow.get("match"):
+                    flow["match"] = miss_flow.get("match")
+                instruction = miss_flow.get("instructions")
+                if instruction and instruction[0]:
+                    flow["instructions"] = miss_flow.get("instructions")
+                install_flows[switch].append(flow)
+        self.send_flows(install_flows, "install")
+
+    def send_flows(self, flows_dict: Dict, action: str, force: bool = True):
+        """Send flows to flow_manager through events, each one carrying
+        at most MAX_FLOWS_PER_EVENT flows, within the rollout rate limits"""
+        with self.metrics.stage_seconds.time(stage="emit"):
+            for dpid, flows in flows_dict.items():
+                for chunk in self.get_flows_chunks(flows):
+                    self.rollout.acquire(dpid, len(chunk))
+                    self.wait_buffer_capacity()
+                    self.controller.buffers.app.put(
+                        KytosEvent(
+                            name=f"kytos.flow_manager.flows.{action}",
+                            content={
+                                "dpid": dpid,
+                                "flow_dict": {"flows": chunk},
+                                "force": force,
+                            },
+                        )
+                    )
+                    self.metrics.flow_mods.inc(len(chunk), action=action)
+
+    @staticmethod
+    def get_flows_chunks(flows: Iterable[dict]) -> Iterator[list[dict]]:
+        """Split flows in non empty chunks of MAX_FLOWS_PER_EVENT flows.
+        If MAX_FLOWS_PER_EVENT is 0, all flows are in a single chunk."""
+        iterator = iter(flows)
+        size = MAX_FLOWS_PER_EVENT if MAX_FLOWS_PER_EVENT > 0 else None
+        while chunk := list(islice(iterator, size)):
+            yield chunk
+
+    def wait_buffer_capacity(self):
+        """Wait while buffers.app holds SEND_FLOWS_BUFFER_WATERMARK events
+        or more, so chunks are queued as fast as they are consumed"""
+        if SEND_FLOWS_BUFFER_WATERMARK <= 0:
+            return
+        buffer = self.controller.buffers.app
+        while buffer.qsize() >= SEND_FLOWS_BUFFER_WATERMARK:
+            time.sleep(SEND_FLOWS_BACKOFF)
+
+    @staticmethod
+    def get_cookie(switch_dpid) -> int:
+        """Return the cookie integer given a dpid."""
+        dpid = int(switch_dpid.replace(":", ""), 16)
+        return (0x00FFFFFFFFFFFFFF & dpid) | (COOKIE_PREFIX << 56)
+
+    def shutdown(self) -> None:
+        """Cancel the pending migrations and close the flow_manager client"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.http_client.close()
@@ -0,0 +1,81 @@
+"""Compiled pipelines, lookup indexes built once per pipeline version"""
+
+from collections import OrderedDict
+from threading import Lock
+from types import MappingProxyType
+from typing import Dict, Optional
+
+# Number of compiled pipelines kept in cache
+CACHE_SIZE = 16
+
+
+class CompiledPipeline:
+    """Read-only index of a pipeline.
+
+    Resolves (owner, table_group) to table_id in O(1) with a flat map.
+    """
+
+    __slots__ = ("id", "updated_at", "table_ids", "owners", "miss_flows")
+
+    def __init__(self, pipeline: Dict) -> None:
+        table_ids = {}
+        miss_flows = {}
+        for table in pipeline["multi_table"]:
+            table_id = table["table_id"]
+            for napp, table_groups in (table.get("napps_table_groups") or {}).items():
+                for table_group in table_groups:
+                    table_ids[(napp, table_group)] = table_id
+            if table.get("table_miss_flow"):
+                miss_flows[table_id] = table["table_miss_flow"]
+        self.id = pipeline.get("id")
+        self.updated_at = pipeline.get("updated_at")
+        self.table_ids = MappingProxyType(table_ids)
+        self.owners = frozenset(owner for owner, _ in table_ids)
+        self.miss_flows = MappingProxyType(miss_flows)
+
+    def delta(self, previous: Optional["CompiledPipeline"]) -> Optional[frozenset]:
+        """Get the (owner, table_group) pairs whose table_id changed from the
+        `previous` pipeline. None if `previous` is unknown, meaning all of them.
+        Pairs that are not in this pipeline are left out, their flows are not
+        moved."""
+        if previous is None:
+            return None
+        return frozenset(
+            pair
+            for pair, table_id in self.table_ids.items()
+            if previous.table_ids.get(pair) != table_id
+        )
+
+    def content(self) -> Dict[str, Dict[str, int]]:
+        """Build content to be sent through the enable_table event"""
+        content = {}
+        for (napp, table_group), table_id in self.table_ids.items():
+            content.setdefault(napp, {})[table_group] = table_id
+        return content
+
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = Lock()
+
+
+def compile_pipeline(pipeline: Dict) -> CompiledPipeline:
+    """Get the CompiledPipeline of a pipeline.
+
+    Stored pipelines are cached by id and updated_at, so they are compiled
+    once per version. Pipelines without them, like the default one, are
+    compiled on every call.
+    """
+    key = (pipeline.get("id"), pipeline.get("updated_at"))
+    if None in key:
+        return CompiledPipeline(pipeline)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+    compiled = CompiledPipeline(pipeline)
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
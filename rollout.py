@@ -0,0 +1,93 @@
+"""Rate limits and error accounting of pipeline rollouts"""
+
+import time
+from threading import Lock
+from typing import Iterable, Optional
+
+
+class RolloutAborted(Exception):
+    """A rollout stopped because a wave had too many flow errors"""
+
+
+class TokenBucket:
+    """Limit operations to `rate` per second, with bursts of up to `rate`.
+
+    Tokens are reserved before waiting, so concurrent callers queue up
+    instead of waking up together. A rate of 0 or less is unlimited.
+    """
+
+    def __init__(self, rate: float, clock=time.monotonic, sleep=time.sleep) -> None:
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = rate
+        self.updated_at = clock()
+        self.lock = Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve `tokens`, return the seconds to wait before using them"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = self.clock()
+            elapsed = now - self.updated_at
+            self.tokens = min(self.rate, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+            self.tokens -= tokens
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self, tokens: int = 1) -> None:
+        """Wait until `tokens` can be used"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.sleep(wait)
+
+
+class Rollout:
+    """FlowMods rate limits, per switch and global, and the flow errors of
+    the switches in the current wave"""
+
+    def __init__(
+        self, switch_rate: float, global_rate: float, sleep=time.sleep
+    ) -> None:
+        self.switch_rate = switch_rate
+        self.sleep = sleep
+        self.global_bucket = TokenBucket(global_rate, sleep=sleep)
+        self.switch_buckets: dict[str, TokenBucket] = {}
+        self.wave_dpids: Optional[frozenset] = None
+        self.wave_flow_mods = 0
+        self.wave_errors = 0
+        self.lock = Lock()
+
+    def acquire(self, dpid: str, flow_mods: int) -> None:
+        """Wait until `flow_mods` FlowMods can be sent to `dpid`"""
+        with self.lock:
+            self.wave_flow_mods += flow_mods
+            bucket = self.switch_buckets.get(dpid)
+            if bucket is None:
+                bucket = TokenBucket(self.switch_rate, sleep=self.sleep)
+                self.switch_buckets[dpid] = bucket
+        wait = max(self.global_bucket.reserve(flow_mods), bucket.reserve(flow_mods))
+        if wait > 0:
+            self.sleep(wait)
+
+    def start_wave(self, dpids: Optional[Iterable[str]]) -> None:
+        """Start counting the FlowMods and errors of a wave of `dpids`,
+        None for all the switches"""
+        with self.lock:
+            self.wave_dpids = None if dpids is None else frozenset(dpids)
+            self.wave_flow_mods = 0
+            self.wave_errors = 0
+
+    def record_error(self, dpid: str) -> None:
+        """Count a flow error of `dpid` if it is in the current wave"""
+        with self.lock:
+            if self.wave_dpids is None or dpid in self.wave_dpids:
+                self.wave_errors += 1
+
+    def error_rate(self) -> float:
+        """Errors per FlowMod sent in the current wave"""
+        with self.lock:
+            if not self.wave_flow_mods:
+                return 0.0
+            return self.wave_errors / self.wave_flow_mods
@@ -3,9 +3,132 @@
 FLOW_MANAGER_URL = "http://localhost:8181/api/kytos/flow_manager"
 COOKIE_PREFIX = 0xAD
 
+# Connections to flow_manager kept alive and shared by the migration workers
+FLOW_MANAGER_HTTP_MAX_CONNECTIONS = 8
+
+# Seconds an idle connection to flow_manager is kept alive
+FLOW_MANAGER_HTTP_KEEPALIVE_EXPIRY = 30.0
+
+# Seconds to wait for flow_manager responses
+FLOW_MANAGER_HTTP_TIMEOUT = 20.0
+
+# Maximum seconds between retries of flow_manager requests, which back off
+# exponentially with jitter
+FLOW_MANAGER_RETRY_MAX_WAIT = 20.0
+
+# Number of switches whose installed flows are fetched per flow_manager request
+# while migrating a pipeline. Peak memory depends on this value, not on the
+# size of the network. If 0, all flows are fetched in a single request.
+FETCH_FLOWS_CHUNK_SIZE = 10
+
+# Where installed flows are read from during a migration:
+# "rest" requests flow_manager v2/stored_flows, "mongo" reads flow_manager's
+# flows collection directly, falling back to "rest" on DB errors
+INSTALLED_FLOWS_SOURCE = "rest"
+
+# Flows read per round trip from flow_manager's collection when
+# INSTALLED_FLOWS_SOURCE is "mongo"
+INSTALLED_FLOWS_BATCH_SIZE = 10000
+
+# Maximum number of chunks of switches that are fetched, diffed and pushed
+# concurrently while migrating a pipeline
+MIGRATION_MAX_WORKERS = 8
+
+# If True, the flows of each switch are installed in their new table before
+# being deleted from the old one. Otherwise, the flows are deleted first.
+MIGRATION_MAKE_BEFORE_BREAK = True
+
+# FlowMods per second used to estimate the duration of a planned migration
+PLAN_FLOW_MODS_PER_SECOND = 1000
+
+# Switches migrated per wave when a pipeline is enabled or disabled, 0 to
+# migrate all of them in a single wave
+ROLLOUT_SWITCHES_PER_WAVE = 0
+
+# Seconds to wait between waves, giving time to the flow errors to arrive
+ROLLOUT_WAVE_PAUSE = 0.0
+
+# Maximum FlowMods per second sent to each switch, 0 for no limit
+ROLLOUT_SWITCH_FLOW_MODS_PER_SECOND = 0
+
+# Maximum FlowMods per second sent to all the switches, 0 for no limit
+ROLLOUT_FLOW_MODS_PER_SECOND = 0
+
+# Flow errors per FlowMod sent in a wave that abort the rollout, setting the
+# pipeline status to enabling_error or disabling_error. 0 to never abort
+ROLLOUT_MAX_ERROR_RATE = 0.0
+
+# Maximum number of flows carried by each kytos.flow_manager.flows.* event.
+# If 0, all the flows of a switch are sent in a single event.
+MAX_FLOWS_PER_EVENT = 500
+
+# While buffers.app holds this number of events or more, wait
+# SEND_FLOWS_BACKOFF seconds before queueing the next chunk of flows.
+# If 0, chunks are queued without waiting.
+SEND_FLOWS_BUFFER_WATERMARK = 256
+SEND_FLOWS_BACKOFF = 0.05
+
 # NApps that push flows and are subscribed to enable_table event
 SUBSCRIBED_NAPPS = {"coloring", "of_lldp", "mef_eline", "telemetry_int"}
 
+# Seconds to wait for the subscribed NApps to acknowledge enable_table. Once
+# it expires, the flows of the NApps that acknowledged are migrated, and the
+# flows of each remaining NApp are migrated when it acknowledges.
+# 0 to wait for all of them indefinitely
+ENABLE_TABLE_TIMEOUT = 0.0
+
+# Cookie prefix of the flows of each subscribed NApp, used to only fetch
+# the flows of the NApps whose table groups changed
+NAPPS_COOKIE_PREFIX = {
+    "coloring": 0xAC,
+    "of_lldp": 0xAB,
+    "mef_eline": 0xAA,
+    "telemetry_int": 0xA8,
+}
+
+# If True, only the flows of the table groups whose table_id changed from
+# the previously applied pipeline are fetched and moved
+INCREMENTAL_MIGRATION = True
+
+# The active pipeline is cached in memory and updated on every status
+# transition made by this NApp. If True, the cache is also invalidated
+# through a MongoDB change stream when pipelines are changed by another
+# process. Change streams need MongoDB running as a replica set.
+PIPELINES_CHANGE_STREAM = False
+
+# Seconds during which flow_manager errors of miss flows are summarized
+# before setting the active pipeline status to enabling_error
+FLOW_ERRORS_WINDOW = 1.0
+
+# Number of pipeline jobs kept to be queried through the API
+JOBS_HISTORY_SIZE = 100
+
+# Trace the stages of pipeline changes, kept in memory and listed by
+# GET /v1/traces
+TRACING_ENABLED = False
+
+# Number of ended spans kept in memory
+TRACES_BUFFER_SIZE = 1000
+
+# OTLP/HTTP collector the traces are exported to, like "http://localhost:4318",
+# None to not export them
+TRACES_OTLP_ENDPOINT = None
+
+# Seconds between audits of the stored flows of the next switches, round
+# robin, against the active pipeline. The drift found is listed by
+# GET /v1/drift. 0 to disable the auditor
+AUDIT_INTERVAL = 0
+
+# Switches whose flows are fetched and diffed per audit, bounding the DB
+# queries and CPU time of each one
+AUDIT_SWITCHES_PER_INTERVAL = 1
+
+# If True, the drifted switches are migrated to the active pipeline
+AUDIT_AUTO_REPAIR = False
+
+# Maximum FlowMods per second sent to repair drift, 0 for no limit
+AUDIT_REPAIR_FLOW_MODS_PER_SECOND = 100
+
 DEFAULT_PIPELINE = {
     "multi_table": [
         {
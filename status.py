@@ -12,3 +12,14 @@ class PipelineStatus(Enum):
     DISABLED = "disabled"
     DISABLING = "disabling"
     DISABLING_ERROR = "disabling_error"
+
+
+class JobStatus(Enum):
+    """Enum for pipeline job status"""
+
+    PENDING = "pending"
+    WAITING_NAPPS = "waiting_napps"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    SUPERSEDED = "superseded"
@@ -1,11 +1,13 @@
 """Test the Pipeline controllers"""
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
 from pydantic import ValidationError
 
-from controllers import PipelineController
+from bson.decimal128 import Decimal128
+
+from controllers import FlowsController, PipelineController
 
 
 class TestController:
@@ -27,7 +29,8 @@ class TestController:
                         ],
                     },
                     "napps_table_groups": {"of_lldp": ["base"]},
-                }
+                },
+                {"table_id": 1, "napps_table_groups": {"mef_eline": ["epl"]}},
             ]
         }
 
@@ -35,28 +38,101 @@ class TestController:
         """Test insert_pipeline"""
         self.controller.insert_pipeline(self.pipeline)
         assert self.controller.db.pipelines.insert_one.call_count == 1
+        assert "warnings" not in self.controller.db.pipelines.insert_one.call_args[0][0]
+
+    @patch("controllers.log")
+    def test_insert_pipeline_warnings(self, mock_log):
+        """Test insert_pipeline stores and logs the unreachable tables"""
+        self.pipeline["multi_table"][0].pop("table_miss_flow")
+        self.controller.insert_pipeline(self.pipeline)
+        inserted = self.controller.db.pipelines.insert_one.call_args[0][0]
+        assert inserted["warnings"] == [
+            "Table 1 is not reachable from table 0 by miss flows, "
+            "with table groups {'mef_eline': ['epl']}"
+        ]
+        assert mock_log.warning.call_count == 1
 
     def test_insert_pipeline_error(self):
         """Test insert_pipeline with ValidationError"""
         with pytest.raises(ValidationError):
             self.controller.insert_pipeline({})
 
+    def test_bootstrap_indexes(self):
+        """Test bootstrap_indexes"""
+        self.controller.bootstrap_indexes()
+        calls = self.controller.mongo.bootstrap_index.call_args_list
+        assert len(calls) == 3
+        assert calls[0][0] == ("pipelines", [("id", 1)])
+        assert calls[0][1] == {"unique": True}
+        assert calls[1][0] == ("pipelines", [("status", 1)])
+        partial = calls[2][1]["partialFilterExpression"]
+        assert "disabled" not in partial["status"]["$in"]
+
     def test_get_active_pipeline(self):
         """Test get_active_pipeline"""
         self.controller.get_active_pipeline()
         args = self.controller.db.pipelines.find_one.call_args[0]
-        assert args[0]["status"]["$ne"] == "disabled"
+        assert "disabled" not in args[0]["status"]["$in"]
+        assert "enabling" in args[0]["status"]["$in"]
+
+    def test_get_active_pipeline_cached(self):
+        """Test get_active_pipeline is read from the DB only once"""
+        find_one = self.controller.db.pipelines.find_one
+        find_one.return_value = {"id": "pipeline_id", "status": "enabling"}
+        assert self.controller.get_active_pipeline()["id"] == "pipeline_id"
+        assert self.controller.get_active_pipeline()["id"] == "pipeline_id"
+        assert find_one.call_count == 1
+
+        self.controller.invalidate_active_pipeline()
+        find_one.return_value = None
+        assert self.controller.get_active_pipeline() == {}
+        assert self.controller.get_active_pipeline() == {}
+        assert find_one.call_count == 2
+
+    def test_active_pipeline_transitions(self):
+        """Test the cached active pipeline follows status transitions"""
+        find_one = self.controller.db.pipelines.find_one
+        update = self.controller.db.pipelines.find_one_and_update
+        update.return_value = {"id": "pipeline_id", "status": "enabling"}
+        self.controller.enabling_pipeline("pipeline_id")
+        assert self.controller.get_active_pipeline()["status"] == "enabling"
+
+        update.return_value = {"id": "pipeline_id", "status": "enabled"}
+        self.controller.enabled_pipeline("pipeline_id")
+        assert self.controller.get_active_pipeline()["status"] == "enabled"
+
+        self.controller.error_pipeline("pipeline_id", "enabling_error")
+        assert self.controller.get_active_pipeline()["status"] == "enabling_error"
+
+        self.controller.disabling_pipeline("pipeline_id")
+        assert self.controller.get_active_pipeline()["status"] == "disabling"
+
+        self.controller.disabled_pipeline("pipeline_id")
+        assert self.controller.get_active_pipeline() == {}
+        assert find_one.call_count == 0
+
+    def test_watch_pipelines(self):
+        """Test watch_pipelines invalidates the active pipeline"""
+        stop = MagicMock()
+        stop.is_set.side_effect = [False, False, True]
+        stream = self.controller.db.pipelines.watch.return_value.__enter__()
+        stream.try_next.side_effect = [{"operationType": "update"}, None]
+        self.controller.set_active_pipeline({"id": "pipeline_id"})
+        self.controller.watch_pipelines(stop)
+        assert stream.try_next.call_count == 2
+        self.controller.get_active_pipeline()
+        assert self.controller.db.pipelines.find_one.call_count == 1
 
     def test_get_pipelines(self):
         """Test get pipelines"""
         self.controller.get_pipelines()
         args = self.controller.db.pipelines.aggregate.call_args[0][0]
-        assert "$project" in args[0]
-        assert "status" not in args[1]["$match"]
+        assert "status" not in args[0]["$match"]
+        assert "$project" in args[1]
 
         self.controller.get_pipelines("enabled")
         args = self.controller.db.pipelines.aggregate.call_args[0][0]
-        assert "enabled" in args[1]["$match"]["status"]
+        assert "enabled" in args[0]["$match"]["status"]
         assert self.controller.db.pipelines.aggregate.call_count == 2
 
     def test_get_pipeline(self):
@@ -84,9 +160,13 @@ class TestController:
         self.controller.enabled_pipeline("pipeline_id")
         assert self.controller.db.pipelines.find_one_and_update.call_count == 1
         args = self.controller.db.pipelines.find_one_and_update.call_args[0]
-        assert args[0] == {"id": "pipeline_id"}
+        assert args[0] == {"id": "pipeline_id", "status": "enabling"}
         assert args[1]["$set"]["status"] == "enabled"
 
+        self.controller.enabled_pipeline("pipeline_id", "enabling_error")
+        args = self.controller.db.pipelines.find_one_and_update.call_args[0]
+        assert args[0] == {"id": "pipeline_id", "status": "enabling_error"}
+
     def test_disabling_pipeline(self):
         """Test disabling_pipeline"""
         self.controller.disabling_pipeline("pipeline_id")
@@ -100,5 +180,74 @@ class TestController:
         self.controller.disabled_pipeline("pipeline_id")
         assert self.controller.db.pipelines.find_one_and_update.call_count == 1
         args = self.controller.db.pipelines.find_one_and_update.call_args[0]
-        assert args[0] == {"id": "pipeline_id"}
+        assert args[0] == {"id": "pipeline_id", "status": "disabling"}
         assert args[1]["$set"]["status"] == "disabled"
+
+    def test_disabled_pipeline_changed(self):
+        """Test disabled_pipeline keeps a pipeline enabled again meanwhile"""
+        update = self.controller.db.pipelines.find_one_and_update
+        self.controller.set_active_pipeline({"id": "pipeline_id", "status": "enabling"})
+        update.return_value = None
+        assert self.controller.disabled_pipeline("pipeline_id") is None
+        self.controller.db.pipelines.find_one.return_value = {
+            "id": "pipeline_id",
+            "status": "enabling",
+        }
+        assert self.controller.get_active_pipeline()["status"] == "enabling"
+
+    def test_error_pipeline(self):
+        """Test error_pipeline"""
+        errors = {"00:00:00:00:00:00:00:01": {"count": 1, "table_ids": [1]}}
+        self.controller.error_pipeline("pipeline_id", "enabling_error", errors)
+        args = self.controller.db.pipelines.find_one_and_update.call_args[0]
+        assert args[0] == {"id": "pipeline_id"}
+        assert args[1]["$set"]["status"] == "enabling_error"
+        assert args[1]["$set"]["errors"] == errors
+
+
+class TestFlowsController:
+    """Test the FlowsController class"""
+
+    def setup_method(self):
+        """Execute steps before each test"""
+        self.controller = FlowsController(MagicMock())
+
+    def test_get_installed_flows(self):
+        """Test get_installed_flows grouped by switch"""
+        flows = [
+            {
+                "switch": "00:00:00:00:00:00:00:01",
+                "flow": {"owner": "of_lldp", "cookie": Decimal128("12538021201")},
+                "state": "installed",
+            },
+            {
+                "switch": "00:00:00:00:00:00:00:02",
+                "flow": {"owner": "of_lldp", "cookie": 1},
+                "state": "installed",
+            },
+        ]
+        self.controller.db.flows.find.return_value = flows
+        result = self.controller.get_installed_flows()
+        assert self.controller.db.flows.find.call_args[0][0] == {"state": "installed"}
+        assert result["00:00:00:00:00:00:00:01"][0]["flow"]["cookie"] == 12538021201
+        assert result["00:00:00:00:00:00:00:02"] == [flows[1]]
+
+    def test_get_installed_flows_filters(self):
+        """Test get_installed_flows filtered by dpids and cookie ranges"""
+        self.controller.db.flows.find.return_value = []
+        dpids = ["00:00:00:00:00:00:00:01"]
+        owners = {"of_multi_table", "of_lldp"}
+        assert not self.controller.get_installed_flows(dpids, [(1, 2)], owners, 500)
+        query, projection = self.controller.db.flows.find.call_args[0]
+        assert self.controller.db.flows.find.call_args[1] == {"batch_size": 500}
+        assert projection["_id"] == 0
+        assert projection["flow.instructions"] == 1
+        assert "flow_id" not in projection
+        assert query == {
+            "state": "installed",
+            "switch": {"$in": dpids},
+            "flow.owner": {"$in": ["of_lldp", "of_multi_table"]},
+            "$or": [
+                {"flow.cookie": {"$gte": Decimal128("1"), "$lte": Decimal128("2")}}
+            ],
+        }
@@ -3,6 +3,7 @@
 import pytest
 from db.models import PipelineBaseDoc
 from pydantic import ValidationError
+from settings import DEFAULT_PIPELINE
 
 
 class TestDBModels:
@@ -23,7 +24,8 @@ class TestDBModels:
                         ],
                     },
                     "napps_table_groups": {"of_lldp": ["base"]},
-                }
+                },
+                {"table_id": 1, "napps_table_groups": {"mef_eline": ["epl"]}},
             ]
         }
 
@@ -82,3 +84,82 @@ class TestDBModels:
         pipeline = {"multi_table": [{"table_id": 1}, {"table_id": 1}]}
         with pytest.raises(ValidationError):
             PipelineBaseDoc(**pipeline)
+
+    def test_validate_multi_table_errors(self):
+        """Test every error of the tables is reported at once"""
+        goto_table = {"instruction_type": "goto_table", "table_id": 1}
+        pipeline = {
+            "multi_table": [
+                {
+                    "table_id": 0,
+                    "napps_table_groups": {"mef_eline": ["epl"]},
+                    "table_miss_flow": {"priority": 0, "instructions": [goto_table]},
+                },
+                {
+                    "table_id": 1,
+                    "table_miss_flow": {"priority": 0, "instructions": [goto_table]},
+                },
+                {"table_id": 1, "napps_table_groups": {"mef_eline": ["epl"]}},
+            ]
+        }
+        with pytest.raises(ValidationError) as exc_info:
+            PipelineBaseDoc(**pipeline)
+        errors = exc_info.value.errors()
+        assert len(errors) == 1
+        assert errors[0]["loc"] == ("multi_table",)
+        assert errors[0]["msg"] == (
+            "Value error, Table 1 has a lower or equal table_id 1 in instructions; "
+            "Table id 1 repeated; "
+            "Repeated mef_eline table groups, {'epl'} in table id: 1"
+        )
+
+    def test_validate_goto_table_graph(self):
+        """Test reject tables going to missing tables, dead tables and
+        pipelines without table 0"""
+        pipeline = {
+            "multi_table": [
+                {
+                    "table_id": 0,
+                    "napps_table_groups": {"of_lldp": ["base"]},
+                    "table_miss_flow": {
+                        "priority": 0,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 3}
+                        ],
+                    },
+                },
+                {"table_id": 1},
+                {"table_id": 2, "napps_table_groups": {"mef_eline": ["epl"]}},
+            ]
+        }
+        with pytest.raises(ValidationError) as exc_info:
+            PipelineBaseDoc(**pipeline)
+        assert exc_info.value.errors()[0]["msg"] == (
+            "Value error, Table 0 goes to table ids [3] missing from the pipeline; "
+            "Table 1 is dead, it has no table groups and no miss flow goes to it"
+        )
+
+        pipeline["multi_table"][0]["table_miss_flow"]["instructions"][0]["table_id"] = 1
+        assert PipelineBaseDoc(**pipeline)
+
+        pipeline = {"multi_table": [{"table_id": 1, "napps_table_groups": {}}]}
+        with pytest.raises(ValidationError) as exc_info:
+            PipelineBaseDoc(**pipeline)
+        assert exc_info.value.errors()[0]["msg"] == (
+            "Value error, Table 0 is missing, packets are matched from it; "
+            "Table 1 is dead, it has no table groups and no miss flow goes to it"
+        )
+
+    def test_validate_unreachable_tables(self):
+        """Test the tables not reachable from table 0 by miss flows, which
+        NApps flows can go to, are valid but reported in the warnings"""
+        pipeline = PipelineBaseDoc(**DEFAULT_PIPELINE)
+        assert pipeline.warnings == [
+            "Table 2 is not reachable from table 0 by miss flows, "
+            "with table groups {'telemetry_int': ['evpl']}",
+            "Table 3 is not reachable from table 0 by miss flows, "
+            "with table groups {'telemetry_int': ['epl']}",
+        ]
+
+        pipeline = PipelineBaseDoc(**self.pipeline)
+        assert pipeline.warnings is None
@@ -0,0 +1,62 @@
+"""Test the compact flow records"""
+
+from flows import FlowRecord, deletes, installs, to_records
+
+
+class TestFlowRecord:
+    """Test the FlowRecord class"""
+
+    def setup_method(self):
+        """Execute steps before each test"""
+        self.flow = {
+            "owner": "mef_eline",
+            "table_group": "evpl",
+            "table_id": 1,
+            "cookie": 0xAA00000000000001,
+            "priority": 20000,
+            "match": {"in_port": 1, "dl_vlan": 100},
+            "actions": [{"action_type": "output", "port": 2}],
+            "hard_timeout": None,
+        }
+
+    def test_from_flow(self):
+        """Test build a record from a flow dict"""
+        record = FlowRecord.from_flow(self.flow)
+        assert record.key == ("mef_eline", "evpl")
+        assert record.match == (("dl_vlan", 100), ("in_port", 1))
+        assert hash(record.match)
+        assert record.fields == (("actions", self.flow["actions"]),)
+        assert not hasattr(record, "__dict__")
+
+    def test_as_dict(self):
+        """Test build the flow dict in another table"""
+        record = FlowRecord.from_flow(self.flow)
+        del self.flow["hard_timeout"]
+        assert record.as_dict() == self.flow
+        assert record.as_dict(0) == {**self.flow, "table_id": 0}
+
+        record = FlowRecord.from_flow({"owner": "of_lldp", "table_id": 0})
+        assert record.as_dict() == {"owner": "of_lldp", "table_id": 0}
+
+        record = FlowRecord.from_flow({"owner": "of_multi_table", "match": {}})
+        assert record.as_dict()["match"] == {}
+
+    def test_as_delete(self):
+        """Test build the dict to delete the flow"""
+        record = FlowRecord.from_flow(self.flow)
+        assert record.as_delete() == {
+            "cookie": 0xAA00000000000001,
+            "cookie_mask": 0xFFFFFFFFFFFFFFFF,
+            "table_id": 1,
+            "owner": "mef_eline",
+            "match": {"in_port": 1, "dl_vlan": 100},
+        }
+        record = FlowRecord.from_flow({**self.flow, "match": {}})
+        assert "match" not in record.as_delete()
+
+    def test_installs_deletes(self):
+        """Test build the flow dicts of moved flows lazily"""
+        records = to_records([{"flow": self.flow}])
+        moves = [(records[0], 0)]
+        assert list(installs(moves)) == [records[0].as_dict(0)]
+        assert list(deletes(moves)) == [records[0].as_delete()]
@@ -0,0 +1,58 @@
+"""Test the pipeline jobs"""
+
+from unittest.mock import MagicMock, patch
+
+from napps.kytos.of_multi_table.jobs import PipelineJob
+from napps.kytos.of_multi_table.status import JobStatus
+
+
+class TestPipelineJob:
+    """Test the PipelineJob class"""
+
+    def setup_method(self):
+        """Execute steps before each test"""
+        self.job = PipelineJob("pipeline_id", "enable")
+
+    def test_progress(self):
+        """Test the progress of a job"""
+        assert self.job.status == JobStatus.PENDING
+        assert self.job.eta() is None
+        with patch(
+            "napps.kytos.of_multi_table.jobs.time.monotonic", side_effect=[10.0, 14.0]
+        ):
+            self.job.start(4)
+            self.job.add_progress(2, 30)
+            assert self.job.eta() == 4.0
+        assert self.job.status == JobStatus.RUNNING
+        assert self.job.flows_moved == 30
+
+        self.job.set_status(JobStatus.FINISHED)
+        assert self.job.done
+        assert self.job.finished_at is not None
+        assert self.job.eta() is None
+
+    def test_set_status_done(self):
+        """Test the status of a done job is not changed"""
+        self.job.fail("error")
+        self.job.set_status(JobStatus.FINISHED)
+        assert self.job.status == JobStatus.FAILED
+        assert self.job.errors == ["error"]
+
+    def test_as_dict(self):
+        """Test the dictionary representation of a job"""
+        result = self.job.as_dict()
+        assert result["id"] == self.job.id
+        assert result["pipeline_id"] == "pipeline_id"
+        assert result["action"] == "enable"
+        assert result["status"] == "pending"
+        assert result["finished_at"] is None
+        assert result["eta"] is None
+
+    def test_set_status_ends_span(self):
+        """Test the span of a job ends once the job is done"""
+        self.job.span = MagicMock()
+        self.job.set_status(JobStatus.RUNNING)
+        assert not self.job.span.end.call_count
+        self.job.set_status(JobStatus.FINISHED)
+        self.job.span.set_attribute.assert_called_once_with("status", "finished")
+        assert self.job.span.end.call_count == 1
@@ -1,9 +1,15 @@
 """Test the Main class"""
 
 import asyncio
-from unittest.mock import call, MagicMock, patch
+from unittest.mock import MagicMock, patch
 
+import pytest
+import tenacity
 from napps.kytos.of_multi_table.main import Main
+from napps.kytos.of_multi_table.pipeline import compile_pipeline
+from napps.kytos.of_multi_table.rollout import RolloutAborted
+from napps.kytos.of_multi_table.status import JobStatus
+from napps.kytos.of_multi_table.tracing import Tracer
 from pydantic import ValidationError
 
 from kytos.lib.helpers import get_controller_mock, get_test_client
@@ -19,6 +25,9 @@ class TestMain:
         Main.get_pipeline_controller = MagicMock()
         controller = get_controller_mock()
         self.napp = Main(controller)
+        # Wait for the migration of the pipeline loaded on setup
+        self.napp.job_executor.submit(lambda: None).result()
+        self.napp.pipeline_controller.reset_mock()
         self.napp.controller.switches = {"00:00:00:00:00:00:00:01"}
         self.base_endpoint = "kytos/of_multi_table/v1"
 
@@ -68,7 +77,7 @@ class TestMain:
     @patch("napps.kytos.of_multi_table.main.Main.build_content")
     async def test_load_pipeline(self, *args):
         """Test load an enabled table"""
-        (mock_content, mock_napps, mock_enabling) = args
+        mock_content, mock_napps, mock_enabling = args
         content = {
             "of_lldp": {"base": 0},
             "coloring": {"base": 0},
@@ -76,7 +85,12 @@ class TestMain:
         }
         mock_content.return_value = content
         mock_napps.return_value = {"of_lldp"}
+        self.napp.deferred_napps = {"of_lldp", "telemetry_int"}
+        load_job = self.napp.create_job(None, "load")
         self.napp.load_pipeline(self.napp.default_pipeline, 1)
+        assert load_job.status == JobStatus.WAITING_NAPPS
+        # Deferred NApps not in the pipeline are no longer waited for
+        assert self.napp.deferred_napps == {"of_lldp"}
 
         assert mock_content.call_count == 1
         assert mock_napps.call_count == 1
@@ -86,6 +100,22 @@ class TestMain:
         assert mock_enabling.call_args[0][1] == 1
         assert self.napp.controller.buffers.app.put.call_count == 1
 
+        # A job superseded while it was queued is not loaded
+        job = self.napp.create_job("pipeline_id", "enable")
+        self.napp.create_job("pipeline_id", "disable")
+        self.napp.load_pipeline(self.napp.default_pipeline, job=job)
+        assert job.status == JobStatus.SUPERSEDED
+        assert mock_enabling.call_count == 1
+
+        # Without NApps to wait for, flows are migrated right away
+        mock_napps.return_value = set()
+        job = self.napp.create_job(None, "load")
+        with patch.object(self.napp, "submit_job") as mock_submit:
+            self.napp.load_pipeline(self.napp.default_pipeline, job=job)
+        assert not self.napp.required_napps
+        assert job.status == JobStatus.WAITING_NAPPS
+        mock_submit.assert_called_with(job, self.napp.get_flows_to_be_installed, job)
+
     async def test_get_enabled_napps(self):
         """Test get the current enabled napps"""
         self.napp.subscribed_napps = {"mef_eline", "of_lldp"}
@@ -127,31 +157,207 @@ class TestMain:
         assert controller.buffers.app.put.call_count == 1
         assert controller.buffers.app.put.call_args[1] == {"timeout": 2}
 
-    @patch("napps.kytos.of_multi_table.main.Main.get_flows_to_be_installed")
-    async def test_handle_enable_table(self, mock_flows_to_be_installed):
+    @patch("napps.kytos.of_multi_table.main.Main.submit_job")
+    async def test_handle_enable_table(self, mock_submit):
         """Test handle content of enable_table event"""
         self.napp.required_napps = {"mef_eline", "of_lldp"}
         event = MagicMock()
         event.name = "kytos/mef_eline.enable_table"
         self.napp.handle_enable_table(event)
-        assert mock_flows_to_be_installed.call_count == 0
+        assert mock_submit.call_count == 0
+        event.name = "kytos/of_lldp.enable_table"
+        self.napp.handle_enable_table(event)
+        assert mock_submit.call_count == 1
+        metrics = self.napp.metrics.render()
+        assert 'of_multi_table_enable_table_seconds_count{napp="of_lldp"} 1' in metrics
+        job = self.napp.current_job
+        assert mock_submit.call_args[0] == (
+            job,
+            self.napp.get_flows_to_be_installed,
+            job,
+        )
+
+    @patch("napps.kytos.of_multi_table.main.Main.submit_job")
+    @patch("napps.kytos.of_multi_table.main.ENABLE_TABLE_TIMEOUT", 30)
+    async def test_handle_enable_table_timeout(self, mock_submit):
+        """Test migrate the acknowledged NApps on the deadline and the
+        deferred ones when they acknowledge"""
+        job = self.napp.current_job
+        self.napp.required_napps = {"mef_eline", "of_lldp"}
+        self.napp.start_enable_table_timer()
+        timer = self.napp.enable_table_timer
+        assert timer.interval == 30
+        event = MagicMock()
         event.name = "kytos/of_lldp.enable_table"
         self.napp.handle_enable_table(event)
-        assert mock_flows_to_be_installed.call_count == 1
+        assert mock_submit.call_count == 0
+
+        # A superseded job's deadline is ignored
+        self.napp.handle_enable_table_timeout(MagicMock())
+        assert mock_submit.call_count == 0
+
+        self.napp.handle_enable_table_timeout(job)
+        timer.cancel()
+        assert not self.napp.required_napps
+        assert self.napp.deferred_napps == {"mef_eline"}
+        assert mock_submit.call_args[0] == (
+            job,
+            self.napp.get_flows_to_be_installed,
+            job,
+        )
+
+        event.name = "kytos/mef_eline.enable_table"
+        self.napp.handle_enable_table(event)
+        assert not self.napp.deferred_napps
+        late_job = mock_submit.call_args[0][0]
+        assert late_job.action == "migrate_napp"
+        assert self.napp.jobs[late_job.id] is late_job
+        assert mock_submit.call_args[0][1:] == (
+            self.napp.migrate_deferred_napp,
+            "mef_eline",
+            late_job,
+        )
+
+        # Acknowledging again is not expected
+        self.napp.handle_enable_table(event)
+        assert mock_submit.call_count == 2
+
+    async def test_create_job(self):
+        """Test create a job superseding the previous pending one"""
+        load_job = self.napp.create_job(None, "load")
+        load_job.set_status(JobStatus.WAITING_NAPPS)
+        job = self.napp.create_job("pipeline_id", "enable")
+        assert self.napp.current_job is job
+        assert self.napp.jobs[job.id] is job
+        assert load_job.status == JobStatus.SUPERSEDED
+
+        # A running job is not superseded
+        job.start(1)
+        self.napp.create_job("pipeline_id", "disable")
+        assert job.status == JobStatus.RUNNING
+
+        with patch("napps.kytos.of_multi_table.main.JOBS_HISTORY_SIZE", 2):
+            last_job = self.napp.create_job("pipeline_id", "enable")
+        assert len(self.napp.jobs) == 2
+        assert last_job.id in self.napp.jobs
 
-    @patch("napps.kytos.of_multi_table.main.Main.send_flows")
-    @patch("napps.kytos.of_multi_table.main.Main.manage_miss_flows")
-    @patch("napps.kytos.of_multi_table.main.Main.get_installed_flows")
+    async def test_submit_job(self):
+        """Test submit a job failing it if it raises"""
+        self.napp.job_executor = MagicMock()
+        self.napp.reconcile_pending_switches = MagicMock()
+        job = self.napp.create_job("pipeline_id", "enable")
+        func = MagicMock(side_effect=ValueError("boom"))
+        self.napp.submit_job(job, func, "arg")
+        run = self.napp.job_executor.submit.call_args[0][0]
+        run()
+        func.assert_called_with("arg")
+        assert job.status == JobStatus.FAILED
+        assert job.errors == ["boom"]
+        # Switches connected meanwhile are reconciled once the job is done
+        assert self.napp.reconcile_pending_switches.call_count == 1
+
+        # A job superseded before it runs is skipped
+        job = self.napp.create_job("pipeline_id", "enable")
+        self.napp.submit_job(job, func, "arg")
+        run = self.napp.job_executor.submit.call_args[0][0]
+        self.napp.create_job("pipeline_id", "disable")
+        func.reset_mock()
+        run()
+        assert func.call_count == 0
+        assert job.status == JobStatus.SUPERSEDED
+
+    async def test_start_job(self):
+        """Test start a job loading its pipeline in the background"""
+        self.napp.job_executor = MagicMock()
+        self.napp.load_pipeline = MagicMock()
+        pipeline = {"id": "pipeline_id", "status": "enabling"}
+        job = self.napp.start_job("enable", pipeline)
+        assert self.napp.current_job is job
+        assert job.pipeline == pipeline
+        run = self.napp.job_executor.submit.call_args[0][0]
+        run()
+        self.napp.load_pipeline.assert_called_with(pipeline, None, job)
+
+        # The default pipeline is loaded to disable a pipeline
+        pipeline = {"id": "pipeline_id", "status": "disabling"}
+        job = self.napp.start_job("disable", pipeline)
+        assert job.pipeline_id == "pipeline_id"
+        run = self.napp.job_executor.submit.call_args[0][0]
+        run()
+        self.napp.load_pipeline.assert_called_with(
+            self.napp.default_pipeline, None, job
+        )
+
+    async def test_get_applied_pipeline(self):
+        """Test get the pipeline whose flows are in place"""
+        controller = self.napp.pipeline_controller
+        controller.get_active_pipeline.return_value = {}
+        applied = self.napp.get_applied_pipeline()
+        assert applied.table_ids[("telemetry_int", "epl")] == 3
+        controller.get_active_pipeline.return_value = {
+            "id": "pipeline_id",
+            "status": "enabled",
+            "multi_table": [
+                {"table_id": 4, "napps_table_groups": {"of_lldp": ["base"]}}
+            ],
+        }
+        assert self.napp.get_applied_pipeline().table_ids[("of_lldp", "base")] == 4
+        controller.get_active_pipeline.return_value["status"] = "enabling"
+        assert self.napp.get_applied_pipeline() is None
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.plan_switches")
+    async def test_get_migration_plan(self, mock_plan):
+        """Test plan the migration to a pipeline"""
+        mock_plan.return_value = {
+            "00:00:00:00:00:00:00:01": {
+                "flows_to_move": 10,
+                "miss_flows_to_install": 1,
+                "miss_flows_to_modify": 1,
+                "miss_flows_to_delete": 0,
+            },
+            "00:00:00:00:00:00:00:02": {
+                "flows_to_move": 0,
+                "miss_flows_to_install": 0,
+                "miss_flows_to_modify": 0,
+                "miss_flows_to_delete": 0,
+            },
+        }
+        self.napp.applied_pipeline = None
+        applied = self.napp.applied_pipeline
+        with patch("napps.kytos.of_multi_table.migration.PLAN_FLOW_MODS_PER_SECOND", 4):
+            plan = self.napp.get_migration_plan(self.napp.default_pipeline)
+        assert plan == {
+            "table_groups": None,
+            "summary": {
+                "switches": 2,
+                "switches_changed": 1,
+                "flows_to_move": 10,
+                "miss_flows_to_install": 1,
+                "miss_flows_to_modify": 1,
+                "miss_flows_to_delete": 0,
+                "flow_mods": 23,
+                "estimated_duration": 5.75,
+            },
+        }
+        # Planning does not change the applied pipeline
+        assert self.napp.applied_pipeline is applied
+
+        self.napp.applied_pipeline = compile_pipeline({"multi_table": []})
+        plan = self.napp.get_migration_plan(self.napp.default_pipeline, detail=True)
+        assert plan["switches"] == mock_plan.return_value
+        assert plan["table_groups"]["of_lldp"] == ["base"]
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.send_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.manage_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_installed_flows")
     async def test_get_flows_to_be_installed(self, *args):
         """Test get flows from flow manager to be installed"""
-        (mock_flows, mock_manage_miss, mock_send) = args
+        mock_flows, mock_manage_miss, mock_send = args
         controller = self.napp.pipeline_controller
 
         # Disabling pipeline
-        controller.get_active_pipeline.return_value = {
-            "id": "mock_pipeline",
-            "status": "disabling",
-        }
+        pipeline = {"id": "mock_pipeline", "status": "disabling"}
+        self.napp.create_job("mock_pipeline", "disable", pipeline)
         flow_of_lldp = {
             "flow": {
                 "owner": "of_lldp",
@@ -175,315 +381,360 @@ class TestMain:
         self.napp.get_flows_to_be_installed()
         assert mock_manage_miss.call_count == 1
         assert controller.enabled_pipeline.call_count == 0
+        job = self.napp.current_job
+        assert job.status == JobStatus.FINISHED
+        assert job.switches_total == job.switches_done == 1
+        assert job.flows_moved == 1
+        assert self.napp.metrics.flows_fetched.get() == 3
+        assert self.napp.metrics.flows_moved.get(table_id=0) == 1
 
-        args = mock_send.call_args[0]
+        # Flows are installed before being deleted
+        args = mock_send.call_args_list[-2][0]
         flow_of_lldp["flow"]["table_id"] = 0
         assert mock_send.call_count == 2
-        assert args[0]["00:00:00:00:00:00:00:01"][0] == flow_of_lldp["flow"]
+        assert list(args[0]["00:00:00:00:00:00:00:01"])[0] == flow_of_lldp["flow"]
         assert args[1] == "install"
-        assert controller.disabled_pipeline.call_args[0][0] == "mock_pipeline"
+        assert controller.disabled_pipeline.call_args[0] == (
+            "mock_pipeline",
+            "disabling",
+        )
 
         # Enabling pipeline
-        controller.get_active_pipeline.return_value = {
+        pipeline = {
             "multi_table": [
                 {"table_id": 2, "napps_table_groups": {"of_lldp": ["base"]}}
             ],
             "id": "mocked_pipeline",
             "status": "enabling",
         }
+        self.napp.create_job("mocked_pipeline", "enable", pipeline)
         mock_flows.return_value = {"00:00:00:00:00:00:00:01": [flow_of_lldp]}
         self.napp.get_flows_to_be_installed()
         assert mock_manage_miss.call_count == 2
         assert controller.enabled_pipeline.call_count == 1
 
-        args = mock_send.call_args[0]
+        args = mock_send.call_args_list[-2][0]
         flow_of_lldp["flow"]["table_id"] = 2
         assert mock_send.call_count == 4
-        assert args[0]["00:00:00:00:00:00:00:01"][0] == flow_of_lldp["flow"]
+        assert list(args[0]["00:00:00:00:00:00:00:01"])[0] == flow_of_lldp["flow"]
         assert args[1] == "install"
 
         # Enabled pipeline
-        controller.get_active_pipeline.return_value = {"status": "enabled"}
+        self.napp.create_job("mocked_pipeline", "load", {"status": "enabled"})
         self.napp.get_flows_to_be_installed()
         assert mock_manage_miss.call_count == 2
         assert controller.enabled_pipeline.call_count == 1
         assert mock_send.call_count == 4
 
-    @patch("napps.kytos.of_multi_table.main.Main.delete_miss_flows")
-    @patch("napps.kytos.of_multi_table.main.Main.install_miss_flows")
-    async def test_manage_miss_flows_no_miss_installed(self, mock_install, mock_delete):
-        """Test manage miss flows with no miss flows installed"""
-        pipeline = {
-            "multi_table": [
-                {
-                    "table_id": 1,
-                    "table_miss_flow": {
-                        "priority": 0,
-                        "instructions": [
-                            {"instruction_type": "goto_table", "table_id": 2}
-                        ],
-                    },
-                }
-            ],
-        }
-        flows_by_switch = {"00:00:00:00:00:00:00:01": [{"flow": {"owner": "of_lldp"}}]}
-        self.napp.get_miss_flows_installed = MagicMock()
-        self.napp.get_miss_flows_installed.return_value = ({}, set())
-        self.napp.manage_miss_flows(pipeline, flows_by_switch)
-        expected_arg = {
-            1: {
-                "priority": 0,
-                "instructions": [{"instruction_type": "goto_table", "table_id": 2}],
-            }
-        }
-        assert mock_install.call_count == 1
-        args = mock_install.call_args[0]
-        assert args[0] == expected_arg
-        assert args[1] == expected_arg.keys()
-        assert mock_delete.call_count == 0
-        assert self.napp.get_miss_flows_installed.call_count == 1
-
-    @patch("napps.kytos.of_multi_table.main.Main.delete_miss_flows")
-    @patch("napps.kytos.of_multi_table.main.Main.install_miss_flows")
-    async def test_manage_miss_flows_no_miss_pipeline(self, mock_install, mock_delete):
-        """Test manage miss flows with no miss flows in pipeline"""
-        pipeline = {"multi_table": [{"table_id": 1}]}
-        flows_by_switch = {
-            "00:00:00:00:00:00:00:01": [{"flow": {"owner": "of_multi_table"}}]
+    @patch("napps.kytos.of_multi_table.migration.FETCH_FLOWS_CHUNK_SIZE", 1)
+    @patch("napps.kytos.of_multi_table.migration.Migrator.send_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.manage_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_installed_flows")
+    async def test_get_flows_to_be_installed_chunks(self, *args):
+        """Test get flows to be installed migrating chunks of switches"""
+        mock_flows, mock_manage_miss, mock_send = args
+        controller = self.napp.pipeline_controller
+        pipeline = {"id": "mock_pipeline", "status": "disabling"}
+        self.napp.create_job("mock_pipeline", "disable", pipeline)
+        self.napp.controller.switches = {
+            "00:00:00:00:00:00:00:01",
+            "00:00:00:00:00:00:00:02",
+            "00:00:00:00:00:00:00:03",
         }
+        mock_flows.side_effect = lambda dpids, _: {dpid: [] for dpid in dpids}
+        self.napp.get_flows_to_be_installed()
+        assert mock_flows.call_count == 3
+        # Miss flows are managed in every chunk
+        assert mock_manage_miss.call_count == 3
+        assert mock_send.call_count == 6
+        assert controller.disabled_pipeline.call_count == 1
 
-        flows_by_switch = {
-            "00:00:00:00:00:00:00:01": [
-                {"flow": {"owner": "of_multi_table", "table_id": 0, "priority": 100}}
-            ]
-        }
-        miss_flows = {0: {"priority": 100}}
-        self.napp.get_miss_flows_installed = MagicMock()
-        self.napp.get_miss_flows_installed.return_value = (miss_flows, {0})
-        self.napp.manage_miss_flows(pipeline, flows_by_switch)
-        assert mock_install.call_count == 0
-        assert mock_delete.call_count == 1
-        args = mock_delete.call_args[0]
-        assert args[0] == {0}
-        assert self.napp.get_miss_flows_installed.call_count == 1
-
-    @patch("napps.kytos.of_multi_table.main.Main.delete_miss_flows")
-    @patch("napps.kytos.of_multi_table.main.Main.install_miss_flows")
-    async def test_manage_miss_flows(self, mock_install, mock_delete):
-        """Test manage miss flows"""
+        controller.error_pipeline.reset_mock()
+        mock_flows.side_effect = tenacity.RetryError(None)
+        job = self.napp.create_job("mock_pipeline", "disable", pipeline)
+        self.napp.get_flows_to_be_installed(job)
+        assert controller.error_pipeline.call_count == 1
+        assert controller.disabled_pipeline.call_count == 1
+        assert job.status == JobStatus.FAILED
+
+    @patch("napps.kytos.of_multi_table.main.Main.migrate_pipeline")
+    async def test_get_flows_to_be_installed_superseded(self, mock_migrate):
+        """Test a pipeline change requested during a migration keeps the
+        status it sets, and the next job migrates its own pipeline"""
+        controller = self.napp.pipeline_controller
+        pipeline_a = {"id": "pipeline_a", "status": "enabling"}
+        pipeline_b = {"id": "pipeline_b", "status": "enabling"}
+        job_a = self.napp.create_job("pipeline_a", "enable", pipeline_a)
+
+        def enable_b(*_):
+            # The REST handler enables B, disabling A, while A is migrating
+            self.napp.create_job("pipeline_b", "enable", pipeline_b)
+            return {}
+
+        mock_migrate.side_effect = enable_b
+        self.napp.get_flows_to_be_installed(job_a)
+        assert job_a.status == JobStatus.SUPERSEDED
+        assert controller.enabled_pipeline.call_count == 0
+
+        mock_migrate.side_effect = None
+        mock_migrate.return_value = {}
+        job_b = self.napp.current_job
+        self.napp.get_flows_to_be_installed(job_b)
+        assert mock_migrate.call_args[0][0] is pipeline_b
+        controller.enabled_pipeline.assert_called_once_with("pipeline_b", "enabling")
+        assert job_b.status == JobStatus.FINISHED
+
+        # A failed migration superseded meanwhile keeps the status too
+        pipeline_b = {"id": "pipeline_b", "status": "disabling"}
+        job_c = self.napp.create_job("pipeline_b", "disable", pipeline_b)
+
+        def disable_b_failing(*_):
+            self.napp.create_job("pipeline_b", "enable", pipeline_b)
+            raise tenacity.RetryError(None)
+
+        mock_migrate.side_effect = disable_b_failing
+        self.napp.get_flows_to_be_installed(job_c)
+        assert job_c.status == JobStatus.SUPERSEDED
+        assert controller.error_pipeline.call_count == 0
+        assert controller.disabled_pipeline.call_count == 0
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.migrate_waves")
+    async def test_migrate_pipeline_aborted(self, mock_waves):
+        """Test the pipeline is not applied when the rollout is aborted"""
+        self.napp.applied_pipeline = compile_pipeline(self.napp.default_pipeline)
+        mock_waves.side_effect = RolloutAborted("error rate")
+        with pytest.raises(RolloutAborted):
+            self.napp.migrate_pipeline(self.napp.default_pipeline)
+        assert self.napp.applied_pipeline is None
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.migrate_switches")
+    async def test_migrate_pipeline_incremental(self, mock_migrate):
+        """Test migrate only the table groups that changed"""
+        mock_migrate.return_value = {}
+        self.napp.applied_pipeline = compile_pipeline(self.napp.default_pipeline)
         pipeline = {
+            "id": "pipeline_id",
             "multi_table": [
                 {
-                    "table_id": 1,
-                    "table_miss_flow": {
-                        "priority": 0,
-                        "instructions": [
-                            {"instruction_type": "goto_table", "table_id": 2}
-                        ],
-                    },
-                },
-                {
-                    "table_id": 2,
-                    "table_miss_flow": {
-                        "priority": 0,
-                        "instructions": [
-                            {"instruction_type": "goto_table", "table_id": 5}
-                        ],
+                    "table_id": 0,
+                    "napps_table_groups": {
+                        "coloring": ["base"],
+                        "of_lldp": ["base"],
+                        "mef_eline": ["evpl", "epl"],
                     },
                 },
-                {
-                    "table_id": 5,
-                    "table_miss_flow": {"priority": 99, "instructions": [{}]},
-                },
-            ]
+                {"table_id": 2, "napps_table_groups": {"telemetry_int": ["evpl"]}},
+                {"table_id": 4, "napps_table_groups": {"telemetry_int": ["epl"]}},
+            ],
         }
-        dpid = "00:00:00:00:00:00:00:01"
-        flows_by_switch = {dpid: []}
-        for table_id in range(4):
-            flow = {
-                "flow": {
-                    "owner": "of_multi_table",
-                    "priority": 0,
-                    "instructions": [
-                        {"instruction_type": "goto_table", "table_id": table_id + 1}
-                    ],
-                    "table_id": table_id,
-                }
+        self.napp.migrate_pipeline(pipeline)
+        assert mock_migrate.call_args[0][3] == frozenset({("telemetry_int", "epl")})
+        assert self.napp.applied_pipeline.table_ids[("telemetry_int", "epl")] == 4
+
+        with patch("napps.kytos.of_multi_table.main.INCREMENTAL_MIGRATION", False):
+            self.napp.migrate_pipeline(pipeline)
+        assert mock_migrate.call_args[0][3] is None
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.migrate_switches")
+    async def test_migrate_pipeline_deferred(self, mock_migrate):
+        """Test leave out the table groups of the deferred NApps"""
+        mock_migrate.return_value = {}
+        self.napp.deferred_napps = {"mef_eline"}
+        self.napp.migrate_pipeline(self.napp.default_pipeline)
+        assert mock_migrate.call_args[0][3] == frozenset(
+            {
+                ("coloring", "base"),
+                ("of_lldp", "base"),
+                ("telemetry_int", "evpl"),
+                ("telemetry_int", "epl"),
             }
-            flows_by_switch[dpid].append(flow)
-        self.napp.get_miss_flows_installed = MagicMock()
-        miss_flows, stored_tables = Main.get_miss_flows_installed(flows_by_switch)
-        self.napp.get_miss_flows_installed.return_value = (miss_flows, stored_tables)
-        self.napp.manage_miss_flows(pipeline, flows_by_switch)
-        assert mock_install.call_count == 1
-        args = mock_install.call_args[0]
-        assert args[1] == {2, 5}
-        assert mock_delete.call_count == 1
-        args = mock_delete.call_args[0]
-        assert args[0] == {0, 2, 3}
-        assert self.napp.get_miss_flows_installed.call_count == 1
-
-    @patch("napps.kytos.of_multi_table.main.Main.delete_miss_flows")
-    @patch("napps.kytos.of_multi_table.main.Main.install_miss_flows")
-    async def test_manage_miss_flows_no_changes(self, mock_install, mock_delete):
-        """Test manage miss flows where no changes were made"""
-        pipeline = {
+        )
+        assert self.napp.applied_pipeline is None
+
+    async def test_handle_handshake_completed(self):
+        """Test reconcile a connected switch in job_executor"""
+        self.napp.job_executor = MagicMock()
+        self.napp.reconcile_switch = MagicMock()
+        event = KytosEvent(
+            name="kytos/of_core.handshake.completed",
+            content={"switch": MagicMock(id="00:00:00:00:00:00:00:02")},
+        )
+        self.napp.handle_handshake_completed(event)
+        run = self.napp.job_executor.submit.call_args[0][0]
+        run()
+        self.napp.reconcile_switch.assert_called_once_with("00:00:00:00:00:00:00:02")
+
+        # Errors are logged
+        self.napp.reconcile_switch.side_effect = ValueError
+        run()
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.migrate_switches")
+    async def test_reconcile_switch(self, mock_migrate):
+        """Test reconcile a single switch with the active pipeline"""
+        dpid = "00:00:00:00:00:00:00:02"
+        mock_migrate.return_value = {dpid: 0.1}
+        controller = self.napp.pipeline_controller
+        self.napp.current_job.set_status(JobStatus.FINISHED)
+        controller.get_active_pipeline.return_value = {
+            "id": "reconcile_id",
+            "status": "enabled",
             "multi_table": [
-                {
-                    "table_id": 0,
-                    "table_miss_flow": {
-                        "priority": 200,
-                        "instructions": [
-                            {"instruction_type": "goto_table", "table_id": 1}
-                        ],
-                    },
-                },
-                {
-                    "table_id": 1,
-                    "table_miss_flow": {
-                        "priority": 0,
-                        "instructions": [
-                            {"instruction_type": "goto_table", "table_id": 2}
-                        ],
-                        "match": {"in_port": 1, "dl_vlan": 0},
-                    },
-                },
-                {"table_id": 2},
-            ]
-        }
-        flows_by_switch = {
-            "00:00:00:00:00:00:00:01": [
-                {
-                    "flow": {
-                        "owner": "of_multi_table",
-                        "table_id": 0,
-                        "priority": 200,
-                        "instructions": [
-                            {"instruction_type": "goto_table", "table_id": 1}
-                        ],
-                    }
-                },
-                {
-                    "flow": {
-                        "owner": "of_multi_table",
-                        "table_id": 1,
-                        "priority": 0,
-                        "instructions": [
-                            {"instruction_type": "goto_table", "table_id": 2}
-                        ],
-                        "match": {"in_port": 1, "dl_vlan": 0},
-                    }
-                },
-            ]
+                {"table_id": 0, "napps_table_groups": {"of_lldp": ["base"]}}
+            ],
         }
-        miss_flows, stored_tables = Main.get_miss_flows_installed(flows_by_switch)
-        self.napp.get_miss_flows_installed = MagicMock()
-        self.napp.get_miss_flows_installed.return_value = (miss_flows, stored_tables)
-        self.napp.manage_miss_flows(pipeline, flows_by_switch)
-        assert mock_install.call_count == 1
-        args = mock_install.call_args[0]
-        assert args[1] == set()
-        assert mock_delete.call_count == 1
-        args = mock_delete.call_args[0]
-        assert args[0] == set()
-        assert self.napp.get_miss_flows_installed.call_count == 1
-
-    async def test_get_miss_flows_installed(self):
-        """Test get miss flows"""
-        dpid = "00:00:00:00:00:00:00:01"
-        flows_by_switch = {dpid: []}
-        expected_flows = {}
-        for table_id in range(4):
-            flow = {
-                "flow": {
-                    "owner": "of_multi_table",
-                    "priority": 0,
-                    "instructions": [
-                        {"instruction_type": "goto_table", "table_id": table_id + 1}
-                    ],
-                    "table_id": table_id,
-                    "match": {"in_port": 1, "dl_vlan": 0},
-                }
-            }
-            flows_by_switch[dpid].append(flow)
-            expected_flows[table_id] = {
-                "priority": 0,
-                "instructions": [
-                    {"instruction_type": "goto_table", "table_id": table_id + 1}
-                ],
-                "match": {"in_port": 1, "dl_vlan": 0},
-            }
-        miss_flows, flow_ids = Main.get_miss_flows_installed(flows_by_switch)
-        assert miss_flows == expected_flows
-        assert flow_ids == {0, 1, 2, 3}
-
-    @patch("napps.kytos.of_multi_table.main.Main.get_cookie")
-    @patch("napps.kytos.of_multi_table.main.Main.send_flows")
-    async def test_delete_miss_flows(self, mock_send, mock_cookie):
-        """Test delete miss flows"""
-        mock_cookie.return_value = 999
-        expected_flows = {
-            "00:00:00:00:00:00:00:01": [
-                {
-                    "cookie": 999,
-                    "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
-                    "table_id": 0,
-                    "owner": "of_multi_table",
-                },
-                {
-                    "cookie": 999,
-                    "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
-                    "table_id": 2,
-                    "owner": "of_multi_table",
-                },
-            ]
+        self.napp.reconcile_switch(dpid)
+        compiled, dpids, _, table_groups = mock_migrate.call_args[0]
+        assert compiled.id == "reconcile_id"
+        assert dpids == [dpid]
+        assert table_groups is None
+
+        # NApps deferred by the enable_table deadline are left out
+        self.napp.deferred_napps = {"of_lldp"}
+        self.napp.reconcile_switch(dpid)
+        assert mock_migrate.call_args[0][3] == frozenset()
+
+        # The switch is left to a pipeline change in progress
+        controller.get_active_pipeline.return_value["status"] = "enabling"
+        self.napp.reconcile_switch(dpid)
+        self.napp.create_job("pipeline_id", "disable")
+        self.napp.reconcile_switch(dpid)
+        assert mock_migrate.call_count == 2
+        assert self.napp.pending_reconciles == {dpid}
+
+        # and reconciled once the pipeline is settled
+        self.napp.reconcile_pending_switches()
+        assert mock_migrate.call_count == 2
+        self.napp.current_job.set_status(JobStatus.FINISHED)
+        controller.get_active_pipeline.return_value["status"] = "enabled"
+        self.napp.reconcile_pending_switches()
+        assert mock_migrate.call_count == 3
+        assert mock_migrate.call_args[0][1] == [dpid]
+        assert not self.napp.pending_reconciles
+
+    @patch("napps.kytos.of_multi_table.main.AUDIT_SWITCHES_PER_INTERVAL", 2)
+    async def test_get_audit_switches(self):
+        """Test get the connected and enabled switches to audit round robin"""
+        switches = {dpid: MagicMock() for dpid in ["03", "01", "02", "04", "05"]}
+        switches["04"].is_connected.return_value = False
+        switches["05"].is_enabled.return_value = False
+        self.napp.controller.switches = switches
+        assert self.napp.get_audit_switches() == ["01", "02"]
+        assert self.napp.get_audit_switches() == ["03", "01"]
+        del self.napp.controller.switches["02"]
+        assert self.napp.get_audit_switches() == ["03", "01"]
+        self.napp.controller.switches = {}
+        assert not self.napp.get_audit_switches()
+
+    @patch("napps.kytos.of_multi_table.main.log")
+    async def test_get_settled_pipeline(self, mock_log):
+        """Test get the settled pipeline, warning once of a failed one"""
+        self.napp.current_job.set_status(JobStatus.FINISHED)
+        get_active = self.napp.pipeline_controller.get_active_pipeline
+        get_active.return_value = None
+        assert self.napp.get_settled_pipeline().id is None
+
+        get_active.return_value = {"id": "pipeline_id", "status": "enabling_error"}
+        assert self.napp.get_settled_pipeline() is None
+        assert self.napp.get_settled_pipeline() is None
+        assert mock_log.warning.call_count == 1
+        assert "enabling_error" in mock_log.warning.call_args[0][0]
+
+        get_active.return_value = {"id": "pipeline_id", "status": "disabling"}
+        assert self.napp.get_settled_pipeline() is None
+        assert mock_log.warning.call_count == 1
+        get_active.return_value = {"id": "pipeline_id", "status": "enabling_error"}
+        assert self.napp.get_settled_pipeline() is None
+        assert mock_log.warning.call_count == 2
+
+    @patch("napps.kytos.of_multi_table.main.AUDIT_SWITCHES_PER_INTERVAL", 2)
+    @patch("napps.kytos.of_multi_table.migration.Migrator.plan_switches")
+    async def test_audit_switches(self, mock_plan):
+        """Test audit switches keeping the drifted ones"""
+        no_drift = {
+            "flows_to_move": 0,
+            "miss_flows_to_install": 0,
+            "miss_flows_to_modify": 0,
+            "miss_flows_to_delete": 0,
         }
-        self.napp.delete_miss_flows({0, 2})
-        assert mock_send.call_count == 1
-        assert mock_send.call_args[0][0] == expected_flows
-
-    @patch("napps.kytos.of_multi_table.main.Main.get_cookie")
-    @patch("napps.kytos.of_multi_table.main.Main.send_flows")
-    async def test_install_miss_flows(self, mock_send, mock_cookie):
-        """Test install miss flows"""
-        pipeline = {
-            2: {
-                "priority": 10,
-                "instructions": [{"instruction_type": "goto_table", "table_id": 3}],
-                "match": {"in_port": 1},
-            }
+        self.napp.controller.switches = {"01": MagicMock(), "02": MagicMock()}
+        self.napp.current_job.set_status(JobStatus.FINISHED)
+        self.napp.pipeline_controller.get_active_pipeline.return_value = None
+        self.napp.job_executor = MagicMock()
+        self.napp.drift = {"01": {"flows_to_move": 1}}
+        mock_plan.side_effect = lambda _, dpids, __, stage: {
+            "01": no_drift,
+            "02": {**no_drift, "flows_to_move": 3},
         }
-        mock_cookie.return_value = 999
-        self.napp.install_miss_flows(pipeline, {2})
-        args = mock_send.call_args[0]
-        expected_arg = {
-            "00:00:00:00:00:00:00:01": [
-                {
-                    "priority": 10,
-                    "cookie": 999,
-                    "owner": "of_multi_table",
-                    "table_group": "base",
-                    "table_id": 2,
-                    "match": {"in_port": 1},
-                    "instructions": [{"instruction_type": "goto_table", "table_id": 3}],
-                }
-            ]
+        drifted = self.napp.audit_switches()
+        assert mock_plan.call_args[0][1] == ["01", "02"]
+        assert mock_plan.call_args[1] == {"stage": "audit_fetch"}
+        assert list(drifted) == ["02"]
+        assert self.napp.drift == drifted
+        assert drifted["02"]["flows_to_move"] == 3
+        assert drifted["02"]["pipeline_id"] is None
+        assert self.napp.metrics.audited_switches.get(result="drift") == 1
+        assert self.napp.metrics.audited_switches.get(result="ok") == 1
+        assert self.napp.job_executor.submit.call_count == 0
+
+        with patch("napps.kytos.of_multi_table.main.AUDIT_AUTO_REPAIR", True):
+            self.napp.repair_drift = MagicMock()
+            self.napp.audit_switches()
+        self.napp.job_executor.submit.call_args[0][0]()
+        assert self.napp.repair_drift.call_args[0][1] == {"02": self.napp.drift["02"]}
+
+        # Audits wait for the pipeline changes to finish
+        self.napp.create_job("pipeline_id", "enable")
+        assert not self.napp.audit_switches()
+        assert mock_plan.call_count == 2
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.migrate_switches")
+    async def test_repair_drift(self, mock_migrate):
+        """Test repair the drifted switches within the FlowMods budget"""
+        self.napp.current_job.set_status(JobStatus.FINISHED)
+        self.napp.pipeline_controller.get_active_pipeline.return_value = None
+        self.napp.audit_bucket = MagicMock()
+        compiled = compile_pipeline(self.napp.default_pipeline)
+        switch_plan = {
+            "flows_to_move": 3,
+            "miss_flows_to_install": 1,
+            "miss_flows_to_modify": 0,
+            "miss_flows_to_delete": 0,
         }
-        assert args[0] == expected_arg
-        assert args[1] == "install"
+        self.napp.drift = {"01": switch_plan}
+        self.napp.repair_drift(compiled, {"01": switch_plan})
+        self.napp.audit_bucket.acquire.assert_called_once_with(7)
+        assert mock_migrate.call_args[0][1] == ["01"]
+        assert not self.napp.drift
+        assert self.napp.metrics.audited_switches.get(result="repaired") == 1
 
-    @patch("time.sleep", return_value=None)
-    async def test_send_flows(self, _):
-        """Test send flows"""
-        self.napp.controller.buffers.app.put = MagicMock()
-        flows = {"01": ["flow1", "flow2", "flow3"]}
-        self.napp.send_flows(flows, "install", True)
-        last_call = self.napp.controller.buffers.app.put.call_args
-        event = last_call.args[0]
+        # Not repaired if the pipeline changed
+        other = compile_pipeline({"id": "other_id", "multi_table": []})
+        self.napp.repair_drift(other, {"01": switch_plan})
+        assert mock_migrate.call_count == 1
 
-        assert event.name == "kytos.flow_manager.flows.install"
-        assert event.content["dpid"] == "01"
-        assert event.content["flow_dict"]["flows"] == ["flow1", "flow2", "flow3"]
+    @patch("napps.kytos.of_multi_table.migration.Migrator.migrate_switches")
+    async def test_migrate_deferred_napp(self, mock_migrate):
+        """Test migrate the table groups of a NApp that acknowledged late"""
+        mock_migrate.return_value = {"00:00:00:00:00:00:00:01": 1.0}
+        self.napp.applied_pipeline = None
+        controller = self.napp.pipeline_controller
+        controller.get_active_pipeline.return_value = None
+        job = self.napp.add_job(None, "migrate_napp")
+        self.napp.migrate_deferred_napp("mef_eline", job)
+        assert mock_migrate.call_args[0][3] == frozenset(
+            {("mef_eline", "evpl"), ("mef_eline", "epl")}
+        )
+        assert job.status == JobStatus.FINISHED
+        assert self.napp.applied_pipeline.id is None
+
+        controller.get_active_pipeline.return_value = {
+            "id": "pipeline_id",
+            "status": "enabling",
+        }
+        job = self.napp.add_job("pipeline_id", "migrate_napp")
+        self.napp.migrate_deferred_napp("mef_eline", job)
+        assert mock_migrate.call_count == 1
+        assert job.status == JobStatus.FAILED
 
     async def test_add_pipeline(self):
         """Test adding a pipeline"""
@@ -592,19 +843,21 @@ class TestMain:
         response = await api.delete(url)
         assert response.status_code == 404
 
-    @patch("napps.kytos.of_multi_table.main.Main.load_pipeline")
-    async def test_enable_pipeline(self, mock_load):
+    @patch("napps.kytos.of_multi_table.main.Main.start_job")
+    async def test_enable_pipeline(self, mock_start):
         """Test enable a pipeline"""
         controller = self.napp.pipeline_controller
         # All pipelines are disabled
         controller.enabling_pipeline.return_value = {"id": "pipeline_id"}
+        mock_start.return_value.id = "job_id"
         api = get_test_client(self.napp.controller, self.napp)
         pipeline_id = "pipeline_id"
         url = f"{self.base_endpoint}/pipeline/{pipeline_id}/enable"
         response = await api.post(url)
-        assert response.status_code == 200
-        assert mock_load.call_count == 1
-        assert mock_load.call_args[0][0] == {"id": "pipeline_id"}
+        assert response.status_code == 202
+        assert response.json()["job_id"] == "job_id"
+        assert mock_start.call_count == 1
+        assert mock_start.call_args[0] == ("enable", {"id": "pipeline_id"})
 
     async def test_enable_pipeline_not_found(self):
         """Test enable a pipeline not found"""
@@ -617,19 +870,25 @@ class TestMain:
         response = await api.post(url)
         assert response.status_code == 404
 
-    @patch("napps.kytos.of_multi_table.main.Main.load_pipeline")
-    async def test_disable_pipeline(self, mock_load):
+    @patch("napps.kytos.of_multi_table.main.Main.start_job")
+    async def test_disable_pipeline(self, mock_start):
         """Test disable a pipeline"""
         controller = self.napp.pipeline_controller
         controller.get_pipeline.return_value = {"id": "mocked_id"}
+        mock_start.return_value.id = "job_id"
         # Disable an enabled pipeline
         controller.get_active_pipeline.return_value = {}
         pipeline_id = "mocked_id"
         api = get_test_client(self.napp.controller, self.napp)
         url = f"{self.base_endpoint}/pipeline/{pipeline_id}/disable"
         response = await api.post(url)
-        assert response.status_code == 200
-        assert mock_load.call_count == 1
+        assert response.status_code == 202
+        assert response.json()["job_id"] == "job_id"
+        assert mock_start.call_count == 1
+        assert mock_start.call_args[0] == (
+            "disable",
+            {"id": "mocked_id", "status": "disabling"},
+        )
 
         # Retry a disabling pipeline
         controller.get_active_pipeline.return_value = {
@@ -639,8 +898,17 @@ class TestMain:
         api = get_test_client(self.napp.controller, self.napp)
         url = f"{self.base_endpoint}/pipeline/{pipeline_id}/disable"
         response = await api.post(url)
+        assert response.status_code == 202
+        assert mock_start.call_count == 2
+
+        # Another pipeline is active
+        controller.get_active_pipeline.return_value = {
+            "id": "other_id",
+            "status": "enabled",
+        }
+        response = await api.post(url)
         assert response.status_code == 200
-        assert mock_load.call_count == 2
+        assert mock_start.call_count == 2
 
     async def test_disable_pipeline_not_found(self):
         """Test disable a pipeline not found"""
@@ -652,6 +920,79 @@ class TestMain:
         response = await api.post(url)
         assert response.status_code == 404
 
+    @patch("napps.kytos.of_multi_table.main.Main.get_migration_plan")
+    async def test_plan_pipeline(self, mock_plan):
+        """Test plan a pipeline"""
+        controller = self.napp.pipeline_controller
+        controller.get_pipeline.return_value = {"id": "pipeline_id"}
+        mock_plan.return_value = {"table_groups": None, "summary": {}}
+        api = get_test_client(self.napp.controller, self.napp)
+        url = f"{self.base_endpoint}/pipeline/pipeline_id/plan?detail=true"
+        response = await api.post(url)
+        assert response.status_code == 200
+        assert response.json() == mock_plan.return_value
+        assert mock_plan.call_args[0] == ({"id": "pipeline_id"}, True)
+
+        mock_plan.side_effect = tenacity.RetryError(None)
+        response = await api.post(url)
+        assert response.status_code == 503
+
+        controller.get_pipeline.return_value = {}
+        response = await api.post(url)
+        assert response.status_code == 404
+
+    async def test_get_metrics(self):
+        """Test get the metrics in Prometheus text format"""
+        self.napp.metrics.flow_mods.inc(2, action="install")
+        api = get_test_client(self.napp.controller, self.napp)
+        response = await api.get(f"{self.base_endpoint}/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'of_multi_table_flow_mods_total{action="install"} 2' in response.text
+
+    async def test_get_traces(self):
+        """Test get the spans of the traced pipeline changes"""
+        self.napp.tracer = Tracer(True, 10)
+        job = self.napp.create_job("pipeline_id", "enable")
+        with self.napp.tracer.start_span("migration", job.span):
+            pass
+        job.set_status(JobStatus.FINISHED)
+        api = get_test_client(self.napp.controller, self.napp)
+        response = await api.get(f"{self.base_endpoint}/traces")
+        assert response.status_code == 200
+        traces = response.json()
+        assert len(traces) == 1
+        assert [span["name"] for span in traces[0]["spans"]] == [
+            "migration",
+            "pipeline_change",
+        ]
+        assert traces[0]["spans"][1]["attributes"]["status"] == "finished"
+
+    async def test_get_drift(self):
+        """Test get the drifted switches"""
+        self.napp.drift = {"00:00:00:00:00:00:00:01": {"flows_to_move": 1}}
+        api = get_test_client(self.napp.controller, self.napp)
+        response = await api.get(f"{self.base_endpoint}/drift")
+        assert response.status_code == 200
+        assert response.json() == self.napp.drift
+
+    async def test_get_pipeline_job(self):
+        """Test get a pipeline job"""
+        job = self.napp.create_job("pipeline_id", "enable")
+        api = get_test_client(self.napp.controller, self.napp)
+        url = f"{self.base_endpoint}/pipeline/pipeline_id/jobs/{job.id}"
+        response = await api.get(url)
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+
+        url = f"{self.base_endpoint}/pipeline/other_id/jobs/{job.id}"
+        response = await api.get(url)
+        assert response.status_code == 404
+
+        url = f"{self.base_endpoint}/pipeline/pipeline_id/jobs/unknown"
+        response = await api.get(url)
+        assert response.status_code == 404
+
     async def test_check_ownership(self):
         """Test check of_multi_table ownership"""
         result = self.napp.check_ownership(int(0xAD00000000000001))
@@ -660,7 +1001,8 @@ class TestMain:
         result = self.napp.check_ownership(int(0xAC00000000000001))
         assert result is False
 
-    async def test_handle_flow_mod_error(self):
+    @patch("napps.kytos.of_multi_table.main.Timer")
+    async def test_handle_flow_mod_error(self, mock_timer):
         """Test handle flow_mod error"""
         controller = self.napp.pipeline_controller
         controller.reset_mock()
@@ -670,24 +1012,52 @@ class TestMain:
         # Event with error_exception
         event.content = {"error_exception": "exception_mock"}
         self.napp.handle_flow_mod_error(event)
-        assert controller.get_active_pipeline.call_count == 0
-        assert controller.error_pipeline.call_count == 0
+        assert not self.napp.flow_errors
+        assert mock_timer.call_count == 0
 
         # Event with flow from another napp
         flow.cookie = int(0xAC00000000000001)
         event.content = {"flow": flow}
         self.napp.handle_flow_mod_error(event)
-        assert controller.get_active_pipeline.call_count == 0
-        assert controller.error_pipeline.call_count == 0
+        assert not self.napp.flow_errors
+        assert mock_timer.call_count == 0
 
-        # Event with flow from this napp
+        # Events with flows from this napp
         flow.cookie = int(0xAD00000000000001)
-        event.content = {"flow": flow}
+        flow.switch.id = "00:00:00:00:00:00:00:01"
+        flow.table_id = 1
+        event.content = {"flow": flow, "error_type": 5, "error_code": 0}
         self.napp.handle_flow_mod_error(event)
-        assert controller.get_active_pipeline.call_count == 1
-        assert controller.error_pipeline.call_count == 1
+        flow.table_id = 2
+        self.napp.handle_flow_mod_error(event)
+        assert self.napp.flow_errors == {
+            "00:00:00:00:00:00:00:01": {
+                "count": 2,
+                "table_ids": [1, 2],
+                "error_type": 5,
+                "error_code": 0,
+            }
+        }
+        assert mock_timer.call_count == 1
+        assert controller.get_active_pipeline.call_count == 0
+        assert controller.error_pipeline.call_count == 0
 
-    async def test_get_cookie(self):
-        """Test get cookie"""
-        switch = "00:00:00:00:00:00:00:01"
-        assert self.napp.get_cookie(switch) == 12465963768561532929
+    async def test_flush_flow_errors(self):
+        """Test flush the summarized flow errors"""
+        controller = self.napp.pipeline_controller
+        controller.reset_mock()
+        self.napp.flush_flow_errors()
+        assert controller.error_pipeline.call_count == 0
+
+        errors = {"00:00:00:00:00:00:00:01": {"count": 2, "table_ids": [1, 2]}}
+        self.napp.flow_errors = dict(errors)
+        controller.get_active_pipeline.return_value = {"id": "pipeline_id"}
+        self.napp.flush_flow_errors()
+        assert controller.error_pipeline.call_count == 1
+        assert controller.error_pipeline.call_args[0] == (
+            "pipeline_id",
+            "enabling_error",
+            errors,
+        )
+        assert not self.napp.flow_errors
+        assert self.napp.flow_errors_timer is None
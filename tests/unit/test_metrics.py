@@ -0,0 +1,59 @@
+"""Test the migration metrics"""
+
+from unittest.mock import patch
+
+from metrics import Counter, Histogram, Metrics, format_labels
+
+
+class TestMetrics:
+    """Test the metrics"""
+
+    def test_format_labels(self):
+        """Test format label pairs escaping their values"""
+        assert format_labels(()) == ""
+        assert format_labels((("a", "1"), ("b", 'x"y'))) == '{a="1",b="x\\"y"}'
+
+    def test_counter(self):
+        """Test increment and render a counter"""
+        counter = Counter("flow_mods_total", "FlowMods", ("action",))
+        assert counter.render() == (
+            "# HELP flow_mods_total FlowMods\n# TYPE flow_mods_total counter"
+        )
+        counter.inc(2, action="install")
+        counter.inc(action="install")
+        counter.inc(action="delete")
+        assert counter.get(action="install") == 3
+        assert counter.render().splitlines()[2:] == [
+            'flow_mods_total{action="delete"} 1',
+            'flow_mods_total{action="install"} 3',
+        ]
+        assert Counter("fetched_total", "Fetched").render().endswith("fetched_total 0")
+
+    def test_histogram(self):
+        """Test observe and render a histogram"""
+        histogram = Histogram("seconds", "Seconds", ("stage",), buckets=(1.0, 5.0))
+        histogram.observe(0.5, stage="fetch")
+        histogram.observe(2, stage="fetch")
+        histogram.observe(10, stage="fetch")
+        assert histogram.render().splitlines()[2:] == [
+            'seconds_bucket{stage="fetch",le="1.0"} 1',
+            'seconds_bucket{stage="fetch",le="5.0"} 2',
+            'seconds_bucket{stage="fetch",le="+Inf"} 3',
+            'seconds_sum{stage="fetch"} 12.5',
+            'seconds_count{stage="fetch"} 3',
+        ]
+
+    def test_histogram_time(self):
+        """Test observe the seconds spent in a block"""
+        histogram = Histogram("seconds", "Seconds", ("stage",))
+        with patch("metrics.time.monotonic", side_effect=[1.0, 3.0]):
+            with histogram.time(stage="emit"):
+                pass
+        assert 'seconds_sum{stage="emit"} 2.0' in histogram.render()
+
+    def test_render(self):
+        """Test render all the metrics"""
+        result = Metrics().render()
+        assert result.endswith("\n")
+        assert "# TYPE of_multi_table_stage_seconds histogram" in result
+        assert "of_multi_table_flows_fetched_total 0" in result
@@ -0,0 +1,684 @@
+"""Test the Migrator class"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from napps.kytos.of_multi_table.flows import FlowRecord, to_records
+from napps.kytos.of_multi_table.metrics import Metrics
+from napps.kytos.of_multi_table.migration import Migrator
+from napps.kytos.of_multi_table.pipeline import compile_pipeline
+from napps.kytos.of_multi_table.rollout import RolloutAborted
+from napps.kytos.of_multi_table.settings import DEFAULT_PIPELINE
+from napps.kytos.of_multi_table.tracing import Tracer
+from pymongo.errors import PyMongoError
+
+from kytos.lib.helpers import get_controller_mock
+
+
+def to_records_by_switch(flows_by_switch: dict) -> dict:
+    """Get the records of stored flows by switch"""
+    return {dpid: to_records(flows) for dpid, flows in flows_by_switch.items()}
+
+
+class TestMigrator:
+    """Test the Migrator class"""
+
+    def setup_method(self):
+        """Execute steps before each test"""
+        controller = get_controller_mock()
+        controller.switches = {"00:00:00:00:00:00:00:01"}
+        self.migrator = Migrator(controller, Metrics(), Tracer(False, 10))
+
+    def teardown_method(self):
+        """Execute steps after each test"""
+        self.migrator.shutdown()
+
+    async def test_get_installed_flows(self):
+        """Test get installed flows from flow_manager"""
+        self.migrator.http_client = MagicMock()
+        mock_get = self.migrator.http_client.get
+        mock_get.return_value.is_server_error = False
+        mock_get.return_value.json.return_value = {"00:00:00:00:00:00:00:01": []}
+        dpids = ["00:00:00:00:00:00:00:01", "00:00:00:00:00:00:00:02"]
+        assert self.migrator.get_installed_flows(dpids) == {
+            "00:00:00:00:00:00:00:01": []
+        }
+        params = mock_get.call_args[1]["params"]
+        assert params == [
+            ("state", "installed"),
+            ("dpid", "00:00:00:00:00:00:00:01"),
+            ("dpid", "00:00:00:00:00:00:00:02"),
+        ]
+
+        self.migrator.get_installed_flows()
+        assert mock_get.call_args[1]["params"] == [("state", "installed")]
+
+        self.migrator.get_installed_flows(None, [(1, 2), (3, 4)])
+        assert mock_get.call_args[1]["params"] == [
+            ("state", "installed"),
+            ("cookie_range", 1),
+            ("cookie_range", 2),
+            ("cookie_range", 3),
+            ("cookie_range", 4),
+        ]
+        assert mock_get.call_args[0][0] == "v2/stored_flows"
+
+    @patch("napps.kytos.of_multi_table.migration.find_spec")
+    @patch("napps.kytos.of_multi_table.migration.httpx.Client")
+    async def test_get_http_client(self, mock_client, mock_find_spec):
+        """Test get the pooled client to flow_manager"""
+        mock_find_spec.return_value = None
+        assert Migrator.get_http_client() == mock_client.return_value
+        kwargs = mock_client.call_args[1]
+        assert kwargs["base_url"] == "http://localhost:8181/api/kytos/flow_manager"
+        assert kwargs["http2"] is False
+
+        mock_find_spec.return_value = MagicMock()
+        Migrator.get_http_client()
+        assert mock_client.call_args[1]["http2"] is True
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_installed_flows")
+    async def test_fetch_installed_flows(self, mock_get):
+        """Test fetch installed flows from the DB falling back to the API"""
+        dpids = ["00:00:00:00:00:00:00:01"]
+        self.migrator.fetch_installed_flows(dpids)
+        mock_get.assert_called_with(dpids, None)
+
+        self.migrator.flows_controller = MagicMock()
+        get_flows = self.migrator.flows_controller.get_installed_flows
+        get_flows.return_value = {"00:00:00:00:00:00:00:01": []}
+        assert self.migrator.fetch_installed_flows(dpids, [(1, 2)], {"of_lldp"}) == {
+            "00:00:00:00:00:00:00:01": []
+        }
+        get_flows.assert_called_with(dpids, [(1, 2)], {"of_lldp"}, 10000)
+        mock_get.assert_called_with(dpids, None)
+        assert mock_get.call_count == 1
+
+        get_flows.side_effect = PyMongoError("error")
+        self.migrator.fetch_installed_flows(dpids)
+        assert mock_get.call_count == 2
+
+    async def test_get_cookie_ranges(self):
+        """Test get the cookie ranges of the table groups owners"""
+        assert self.migrator.get_cookie_ranges(None) is None
+        assert self.migrator.get_cookie_ranges(frozenset()) == [
+            (0xAD00000000000000, 0xADFFFFFFFFFFFFFF)
+        ]
+        table_groups = frozenset({("mef_eline", "epl"), ("mef_eline", "evpl")})
+        assert self.migrator.get_cookie_ranges(table_groups) == [
+            (0xAA00000000000000, 0xAAFFFFFFFFFFFFFF),
+            (0xAD00000000000000, 0xADFFFFFFFFFFFFFF),
+        ]
+        table_groups = frozenset({("mef_eline", "epl"), ("unknown", "base")})
+        assert self.migrator.get_cookie_ranges(table_groups) is None
+
+    @patch("napps.kytos.of_multi_table.migration.FETCH_FLOWS_CHUNK_SIZE", 2)
+    async def test_get_switch_chunks(self):
+        """Test split the switches in chunks"""
+        self.migrator.controller.switches = {
+            "00:00:00:00:00:00:00:03",
+            "00:00:00:00:00:00:00:01",
+            "00:00:00:00:00:00:00:02",
+        }
+        assert self.migrator.get_switch_chunks() == [
+            ["00:00:00:00:00:00:00:01", "00:00:00:00:00:00:00:02"],
+            ["00:00:00:00:00:00:00:03"],
+        ]
+        with patch("napps.kytos.of_multi_table.migration.FETCH_FLOWS_CHUNK_SIZE", 0):
+            assert self.migrator.get_switch_chunks() == [None]
+        assert self.migrator.get_switch_chunks(["00:00:00:00:00:00:00:03"]) == [
+            ["00:00:00:00:00:00:00:03"]
+        ]
+
+    @patch("napps.kytos.of_multi_table.migration.FETCH_FLOWS_CHUNK_SIZE", 1)
+    async def test_get_switch_waves(self):
+        """Test split the switches in waves of chunks"""
+        self.migrator.controller.switches = {
+            "00:00:00:00:00:00:00:03",
+            "00:00:00:00:00:00:00:01",
+            "00:00:00:00:00:00:00:02",
+        }
+        assert len(self.migrator.get_switch_waves()) == 1
+        with patch("napps.kytos.of_multi_table.migration.ROLLOUT_SWITCHES_PER_WAVE", 2):
+            assert self.migrator.get_switch_waves() == [
+                [["00:00:00:00:00:00:00:01"], ["00:00:00:00:00:00:00:02"]],
+                [["00:00:00:00:00:00:00:03"]],
+            ]
+
+    @patch("napps.kytos.of_multi_table.migration.time.sleep")
+    @patch("napps.kytos.of_multi_table.migration.ROLLOUT_SWITCHES_PER_WAVE", 1)
+    @patch("napps.kytos.of_multi_table.migration.ROLLOUT_WAVE_PAUSE", 5)
+    @patch("napps.kytos.of_multi_table.migration.Migrator.migrate_switches")
+    async def test_migrate_waves(self, mock_migrate, mock_sleep):
+        """Test migrate the switches in waves, aborting on flow errors"""
+        self.migrator.controller.switches = {
+            "00:00:00:00:00:00:00:01",
+            "00:00:00:00:00:00:00:02",
+        }
+        compiled = compile_pipeline(DEFAULT_PIPELINE)
+        mock_migrate.side_effect = lambda _, chunk, *args, **kwargs: {chunk[0]: 1.0}
+        converged = self.migrator.migrate_waves(compiled, None)
+        assert set(converged) == self.migrator.controller.switches
+        assert mock_migrate.call_count == 2
+        # Pause only between waves
+        mock_sleep.assert_called_once_with(5)
+
+        self.migrator.rollout = MagicMock()
+        self.migrator.rollout.error_rate.return_value = 0.5
+        with patch("napps.kytos.of_multi_table.migration.ROLLOUT_MAX_ERROR_RATE", 0.1):
+            with pytest.raises(RolloutAborted):
+                self.migrator.migrate_waves(compiled, None)
+        assert mock_migrate.call_count == 3
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.send_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.manage_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_installed_flows")
+    async def test_migrate_switches(self, *args):
+        """Test migrate the flows of a chunk of switches"""
+        mock_flows, mock_manage_miss, mock_send = args
+        dpids = ["00:00:00:00:00:00:00:01", "00:00:00:00:00:00:00:02"]
+        mock_flows.side_effect = lambda *_: {"00:00:00:00:00:00:00:01": []}
+        compiled = compile_pipeline(DEFAULT_PIPELINE)
+        converged = self.migrator.migrate_switches(compiled, dpids, 0)
+        assert set(converged) == set(dpids)
+        assert mock_flows.call_args[0][0] == dpids
+        assert mock_manage_miss.call_count == 1
+        # Switches without stored flows are also reconciled
+        assert mock_manage_miss.call_args[0][1] == {dpid: [] for dpid in dpids}
+        assert mock_send.call_count == 4
+
+        converged = self.migrator.migrate_switches(compiled, None, 0)
+        assert set(converged) == {"00:00:00:00:00:00:00:01"}
+        assert mock_manage_miss.call_count == 2
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.send_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_flows_to_move")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.manage_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_installed_flows")
+    async def test_migrate_switches_make_before_break(self, *args):
+        """Test migrate switches installing flows before deleting them"""
+        mock_flows, _, mock_move, mock_send = args
+        mock_flows.return_value = {}
+        record_1 = FlowRecord("of_lldp", "base", 1, cookie=1)
+        record_2 = FlowRecord("of_lldp", "base", 1, cookie=2)
+        mock_move.return_value = {"01": [(record_1, 0)], "02": [(record_2, 0)]}
+
+        def sent():
+            return [
+                ({dpid: list(flows) for dpid, flows in args[0].items()}, args[1])
+                for args, _ in mock_send.call_args_list
+            ]
+
+        self.migrator.migrate_switches(MagicMock(), ["01", "02"], 0)
+        assert sent() == [
+            ({"01": [record_1.as_dict(0)]}, "install"),
+            ({"01": [record_1.as_delete()]}, "delete"),
+            ({"02": [record_2.as_dict(0)]}, "install"),
+            ({"02": [record_2.as_delete()]}, "delete"),
+        ]
+
+        mock_send.reset_mock()
+        with patch(
+            "napps.kytos.of_multi_table.migration.MIGRATION_MAKE_BEFORE_BREAK", False
+        ):
+            self.migrator.migrate_switches(MagicMock(), ["01", "02"], 0)
+        assert sent() == [
+            ({"01": [record_1.as_delete()], "02": [record_2.as_delete()]}, "delete"),
+            ({"01": [record_1.as_dict(0)], "02": [record_2.as_dict(0)]}, "install"),
+        ]
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.send_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_installed_flows")
+    async def test_plan_switches(self, mock_flows, mock_send):
+        """Test plan the migration of switches without sending flows"""
+        dpids = ["00:00:00:00:00:00:00:01", "00:00:00:00:00:00:00:02"]
+        mock_flows.return_value = {
+            "00:00:00:00:00:00:00:01": [
+                {"flow": {"owner": "mef_eline", "table_group": "epl", "table_id": 1}},
+                {"flow": {"owner": "of_multi_table", "table_id": 3, "priority": 0}},
+            ]
+        }
+        compiled = compile_pipeline(DEFAULT_PIPELINE)
+        plan = self.migrator.plan_switches(compiled, dpids)
+        assert plan == {
+            "00:00:00:00:00:00:00:01": {
+                "flows_to_move": 1,
+                "miss_flows_to_install": 0,
+                "miss_flows_to_modify": 0,
+                "miss_flows_to_delete": 1,
+            },
+            "00:00:00:00:00:00:00:02": {
+                "flows_to_move": 0,
+                "miss_flows_to_install": 0,
+                "miss_flows_to_modify": 0,
+                "miss_flows_to_delete": 0,
+            },
+        }
+        assert mock_send.call_count == 0
+        # Planned flows are not counted as fetched to be migrated
+        assert self.migrator.metrics.flows_fetched.get() == 0
+        metrics = self.migrator.metrics.render()
+        assert 'of_multi_table_stage_seconds_count{stage="plan_fetch"} 1' in metrics
+        assert 'stage_seconds_count{stage="fetch"}' not in metrics
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.plan_switches")
+    async def test_plan(self, mock_plan):
+        """Test plan the migration of every chunk of switches"""
+        self.migrator.controller.switches = {
+            "00:00:00:00:00:00:00:01",
+            "00:00:00:00:00:00:00:02",
+        }
+        mock_plan.side_effect = lambda _, chunk, *args: {
+            dpid: {"moves": 1} for dpid in chunk
+        }
+        compiled = compile_pipeline(DEFAULT_PIPELINE)
+        with patch("napps.kytos.of_multi_table.migration.FETCH_FLOWS_CHUNK_SIZE", 1):
+            plan = self.migrator.plan(compiled)
+        assert plan == {
+            "00:00:00:00:00:00:00:01": {"moves": 1},
+            "00:00:00:00:00:00:00:02": {"moves": 1},
+        }
+        assert mock_plan.call_count == 2
+        assert mock_plan.call_args[0][2] is None
+
+    async def test_get_flows_to_move(self):
+        """Test get the flows to be deleted and installed"""
+        compiled = compile_pipeline(DEFAULT_PIPELINE)
+        flow_mef_eline = {
+            "flow": {
+                "owner": "mef_eline",
+                "table_id": 1,
+                "table_group": "epl",
+                "cookie": 0xAA00000000000001,
+                "priority": 20000,
+            }
+        }
+        flow_of_lldp = {
+            "flow": {"owner": "of_lldp", "table_id": 0, "table_group": "base"}
+        }
+        flow_unknown_group = {
+            "flow": {"owner": "of_lldp", "table_id": 1, "table_group": "unknown"}
+        }
+        flows_by_switch = {
+            "00:00:00:00:00:00:00:01": [
+                flow_mef_eline,
+                flow_of_lldp,
+                flow_unknown_group,
+                {"flow": {"owner": "of_multi_table", "table_id": 1}},
+            ]
+        }
+        moves = Migrator.get_flows_to_move(
+            compiled, to_records_by_switch(flows_by_switch)
+        )
+        delete_flows = {
+            dpid: [record.as_delete() for record, _ in records]
+            for dpid, records in moves.items()
+        }
+        install_flows = {
+            dpid: [record.as_dict(table_id) for record, table_id in records]
+            for dpid, records in moves.items()
+        }
+        assert delete_flows == {
+            "00:00:00:00:00:00:00:01": [
+                {
+                    "cookie": 0xAA00000000000001,
+                    "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
+                    "table_id": 1,
+                    "owner": "mef_eline",
+                }
+            ]
+        }
+        assert install_flows == {
+            "00:00:00:00:00:00:00:01": [
+                {
+                    "owner": "mef_eline",
+                    "table_id": 0,
+                    "table_group": "epl",
+                    "cookie": 0xAA00000000000001,
+                    "priority": 20000,
+                }
+            ]
+        }
+
+    async def test_get_flows_to_move_table_groups(self):
+        """Test get the flows to be moved only from some table groups"""
+        compiled = compile_pipeline(DEFAULT_PIPELINE)
+        flows_by_switch = {
+            "00:00:00:00:00:00:00:01": [
+                {"flow": {"owner": "mef_eline", "table_id": 1, "table_group": "epl"}},
+                {"flow": {"owner": "mef_eline", "table_id": 1, "table_group": "evpl"}},
+            ]
+        }
+        table_groups = frozenset({("mef_eline", "evpl")})
+        moves = Migrator.get_flows_to_move(
+            compiled, to_records_by_switch(flows_by_switch), table_groups
+        )
+        assert len(moves["00:00:00:00:00:00:00:01"]) == 1
+        record, table_id = moves["00:00:00:00:00:00:00:01"][0]
+        assert record.as_dict(table_id) == {
+            "owner": "mef_eline",
+            "table_id": 0,
+            "table_group": "evpl",
+        }
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.delete_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.install_miss_flows")
+    async def test_manage_miss_flows_no_miss_installed(self, mock_install, mock_delete):
+        """Test manage miss flows with no miss flows installed"""
+        pipeline = {
+            "multi_table": [
+                {
+                    "table_id": 1,
+                    "table_miss_flow": {
+                        "priority": 0,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 2}
+                        ],
+                    },
+                }
+            ],
+        }
+        dpid = "00:00:00:00:00:00:00:01"
+        flows_by_switch = {dpid: [{"flow": {"owner": "of_lldp"}}]}
+        self.migrator.manage_miss_flows(
+            compile_pipeline(pipeline), to_records_by_switch(flows_by_switch)
+        )
+        expected_arg = {
+            1: {
+                "priority": 0,
+                "instructions": [{"instruction_type": "goto_table", "table_id": 2}],
+            }
+        }
+        assert mock_install.call_count == 1
+        args = mock_install.call_args[0]
+        assert args[0] == expected_arg
+        assert args[1] == {dpid: {1}}
+        assert mock_delete.call_count == 1
+        assert mock_delete.call_args[0][0] == {}
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.delete_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.install_miss_flows")
+    async def test_manage_miss_flows_no_miss_pipeline(self, mock_install, mock_delete):
+        """Test manage miss flows with no miss flows in pipeline"""
+        pipeline = {"multi_table": [{"table_id": 1}]}
+        dpid = "00:00:00:00:00:00:00:01"
+        flows_by_switch = {
+            dpid: [
+                {"flow": {"owner": "of_multi_table", "table_id": 0, "priority": 100}}
+            ]
+        }
+        self.migrator.manage_miss_flows(
+            compile_pipeline(pipeline), to_records_by_switch(flows_by_switch)
+        )
+        assert mock_install.call_args[0][1] == {}
+        assert mock_delete.call_count == 1
+        args = mock_delete.call_args[0]
+        assert args[0] == {dpid: {0}}
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.delete_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.install_miss_flows")
+    async def test_manage_miss_flows(self, mock_install, mock_delete):
+        """Test manage miss flows only in the switches that differ"""
+        pipeline = {
+            "multi_table": [
+                {
+                    "table_id": 1,
+                    "table_miss_flow": {
+                        "priority": 0,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 2}
+                        ],
+                    },
+                },
+                {
+                    "table_id": 2,
+                    "table_miss_flow": {
+                        "priority": 0,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 5}
+                        ],
+                    },
+                },
+                {
+                    "table_id": 5,
+                    "table_miss_flow": {"priority": 99, "instructions": [{}]},
+                },
+            ]
+        }
+        dpid = "00:00:00:00:00:00:00:01"
+        flows_by_switch = {dpid: []}
+        for table_id in range(4):
+            flow = {
+                "flow": {
+                    "owner": "of_multi_table",
+                    "priority": 0,
+                    "instructions": [
+                        {"instruction_type": "goto_table", "table_id": table_id + 1}
+                    ],
+                    "table_id": table_id,
+                }
+            }
+            flows_by_switch[dpid].append(flow)
+        # This switch already has the pipeline miss flows
+        converged_dpid = "00:00:00:00:00:00:00:02"
+        flows_by_switch[converged_dpid] = [
+            {"flow": {"owner": "of_multi_table", "table_id": table_id, **miss_flow}}
+            for table_id, miss_flow in (
+                (table["table_id"], table["table_miss_flow"])
+                for table in pipeline["multi_table"]
+            )
+        ]
+        self.migrator.manage_miss_flows(
+            compile_pipeline(pipeline), to_records_by_switch(flows_by_switch)
+        )
+        assert mock_install.call_count == 1
+        args = mock_install.call_args[0]
+        assert args[1] == {dpid: {2, 5}}
+        assert mock_delete.call_count == 1
+        args = mock_delete.call_args[0]
+        assert args[0] == {dpid: {0, 2, 3}}
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.delete_miss_flows")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.install_miss_flows")
+    async def test_manage_miss_flows_no_changes(self, mock_install, mock_delete):
+        """Test manage miss flows where no changes were made"""
+        pipeline = {
+            "multi_table": [
+                {
+                    "table_id": 0,
+                    "table_miss_flow": {
+                        "priority": 200,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 1}
+                        ],
+                    },
+                },
+                {
+                    "table_id": 1,
+                    "table_miss_flow": {
+                        "priority": 0,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 2}
+                        ],
+                        "match": {"in_port": 1, "dl_vlan": 0},
+                    },
+                },
+                {"table_id": 2},
+            ]
+        }
+        flows_by_switch = {
+            "00:00:00:00:00:00:00:01": [
+                {
+                    "flow": {
+                        "owner": "of_multi_table",
+                        "table_id": 0,
+                        "priority": 200,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 1}
+                        ],
+                    }
+                },
+                {
+                    "flow": {
+                        "owner": "of_multi_table",
+                        "table_id": 1,
+                        "priority": 0,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 2}
+                        ],
+                        "match": {"in_port": 1, "dl_vlan": 0},
+                    }
+                },
+            ]
+        }
+        self.migrator.manage_miss_flows(
+            compile_pipeline(pipeline), to_records_by_switch(flows_by_switch)
+        )
+        assert mock_install.call_count == 1
+        args = mock_install.call_args[0]
+        assert args[1] == {}
+        assert mock_delete.call_count == 1
+        args = mock_delete.call_args[0]
+        assert args[0] == {}
+
+    async def test_get_miss_flows_installed(self):
+        """Test get miss flows"""
+        flows = []
+        expected_flows = {}
+        for table_id in range(4):
+            flow = {
+                "flow": {
+                    "owner": "of_multi_table",
+                    "priority": 0,
+                    "instructions": [
+                        {"instruction_type": "goto_table", "table_id": table_id + 1}
+                    ],
+                    "table_id": table_id,
+                    "match": {"in_port": 1, "dl_vlan": 0},
+                }
+            }
+            flows.append(flow)
+            expected_flows[table_id] = {
+                "priority": 0,
+                "instructions": [
+                    {"instruction_type": "goto_table", "table_id": table_id + 1}
+                ],
+                "match": {"in_port": 1, "dl_vlan": 0},
+            }
+        flows.append({"flow": {"owner": "of_lldp", "table_id": 0}})
+        miss_flows, flow_ids = Migrator.get_miss_flows_installed(to_records(flows))
+        assert miss_flows == expected_flows
+        assert flow_ids == {0, 1, 2, 3}
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_cookie")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.send_flows")
+    async def test_delete_miss_flows(self, mock_send, mock_cookie):
+        """Test delete miss flows"""
+        mock_cookie.return_value = 999
+        expected_flows = {
+            "00:00:00:00:00:00:00:01": [
+                {
+                    "cookie": 999,
+                    "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
+                    "table_id": 0,
+                    "owner": "of_multi_table",
+                },
+                {
+                    "cookie": 999,
+                    "cookie_mask": int(0xFFFFFFFFFFFFFFFF),
+                    "table_id": 2,
+                    "owner": "of_multi_table",
+                },
+            ]
+        }
+        self.migrator.delete_miss_flows({"00:00:00:00:00:00:00:01": [0, 2]})
+        assert mock_send.call_count == 1
+        assert mock_send.call_args[0][0] == expected_flows
+
+        self.migrator.delete_miss_flows({})
+        assert mock_send.call_count == 1
+
+    @patch("napps.kytos.of_multi_table.migration.Migrator.get_cookie")
+    @patch("napps.kytos.of_multi_table.migration.Migrator.send_flows")
+    async def test_install_miss_flows(self, mock_send, mock_cookie):
+        """Test install miss flows"""
+        pipeline = {
+            2: {
+                "priority": 10,
+                "instructions": [{"instruction_type": "goto_table", "table_id": 3}],
+                "match": {"in_port": 1},
+            }
+        }
+        mock_cookie.return_value = 999
+        self.migrator.install_miss_flows(pipeline, {"00:00:00:00:00:00:00:01": {2}})
+        args = mock_send.call_args[0]
+        expected_arg = {
+            "00:00:00:00:00:00:00:01": [
+                {
+                    "priority": 10,
+                    "cookie": 999,
+                    "owner": "of_multi_table",
+                    "table_group": "base",
+                    "table_id": 2,
+                    "match": {"in_port": 1},
+                    "instructions": [{"instruction_type": "goto_table", "table_id": 3}],
+                }
+            ]
+        }
+        assert args[0] == expected_arg
+        assert args[1] == "install"
+
+    @patch("time.sleep", return_value=None)
+    async def test_send_flows(self, _):
+        """Test send flows"""
+        self.migrator.controller.buffers.app.put = MagicMock()
+        flows = {"01": ["flow1", "flow2", "flow3"]}
+        self.migrator.send_flows(flows, "install", True)
+        last_call = self.migrator.controller.buffers.app.put.call_args
+        event = last_call.args[0]
+
+        assert event.name == "kytos.flow_manager.flows.install"
+        assert event.content["dpid"] == "01"
+        assert event.content["flow_dict"]["flows"] == ["flow1", "flow2", "flow3"]
+
+    @patch("napps.kytos.of_multi_table.migration.MAX_FLOWS_PER_EVENT", 2)
+    @patch("napps.kytos.of_multi_table.migration.Migrator.wait_buffer_capacity")
+    async def test_send_flows_chunks(self, mock_wait):
+        """Test send flows in chunks of MAX_FLOWS_PER_EVENT"""
+        self.migrator.controller.buffers.app.put = MagicMock()
+        self.migrator.rollout = MagicMock()
+        flows = {"01": ["flow1", "flow2", "flow3"], "02": []}
+        self.migrator.send_flows(flows, "delete")
+        put = self.migrator.controller.buffers.app.put
+        assert put.call_count == 2
+        assert mock_wait.call_count == 2
+        events = [args[0][0] for args in put.call_args_list]
+        assert events[0].content["flow_dict"]["flows"] == ["flow1", "flow2"]
+        assert events[1].content["flow_dict"]["flows"] == ["flow3"]
+        assert events[1].name == "kytos.flow_manager.flows.delete"
+        acquired = [args[0] for args in self.migrator.rollout.acquire.call_args_list]
+        assert acquired == [("01", 2), ("01", 1)]
+        assert self.migrator.metrics.flow_mods.get(action="delete") == 3
+
+    async def test_get_flows_chunks(self):
+        """Test split flows in chunks"""
+        with patch("napps.kytos.of_multi_table.migration.MAX_FLOWS_PER_EVENT", 2):
+            chunks = list(self.migrator.get_flows_chunks(iter(range(5))))
+            assert chunks == [[0, 1], [2, 3], [4]]
+            assert not list(self.migrator.get_flows_chunks([]))
+        with patch("napps.kytos.of_multi_table.migration.MAX_FLOWS_PER_EVENT", 0):
+            assert list(self.migrator.get_flows_chunks(range(5))) == [[0, 1, 2, 3, 4]]
+
+    @patch("napps.kytos.of_multi_table.migration.SEND_FLOWS_BUFFER_WATERMARK", 10)
+    @patch("time.sleep", return_value=None)
+    async def test_wait_buffer_capacity(self, mock_sleep):
+        """Test wait for buffers.app capacity"""
+        self.migrator.controller.buffers.app.qsize = MagicMock()
+        self.migrator.controller.buffers.app.qsize.side_effect = [12, 10, 9]
+        self.migrator.wait_buffer_capacity()
+        assert mock_sleep.call_count == 2
+
+    async def test_get_cookie(self):
+        """Test get cookie"""
+        switch = "00:00:00:00:00:00:00:01"
+        assert self.migrator.get_cookie(switch) == 12465963768561532929
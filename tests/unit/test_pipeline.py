@@ -0,0 +1,78 @@
+"""Test the compiled pipelines"""
+
+from pipeline import CompiledPipeline, compile_pipeline
+
+
+class TestCompiledPipeline:
+    """Test the CompiledPipeline class"""
+
+    def setup_method(self):
+        """Execute steps before each test"""
+        self.pipeline = {
+            "id": "pipeline_id",
+            "updated_at": "2024-01-01T00:00:00",
+            "multi_table": [
+                {
+                    "table_id": 0,
+                    "table_miss_flow": {
+                        "priority": 0,
+                        "instructions": [
+                            {"instruction_type": "goto_table", "table_id": 1}
+                        ],
+                    },
+                    "napps_table_groups": {"of_lldp": ["base"]},
+                },
+                {
+                    "table_id": 1,
+                    "napps_table_groups": {"mef_eline": ["epl", "evpl"]},
+                },
+            ],
+        }
+
+    def test_compiled_pipeline(self):
+        """Test CompiledPipeline lookups"""
+        compiled = CompiledPipeline(self.pipeline)
+        assert compiled.id == "pipeline_id"
+        assert compiled.owners == {"of_lldp", "mef_eline"}
+        assert compiled.table_ids[("mef_eline", "evpl")] == 1
+        assert ("mef_eline", "unknown") not in compiled.table_ids
+        assert ("coloring", "base") not in compiled.table_ids
+        assert list(compiled.miss_flows) == [0]
+        assert compiled.content() == {
+            "of_lldp": {"base": 0},
+            "mef_eline": {"epl": 1, "evpl": 1},
+        }
+
+    def test_compile_pipeline_cache(self):
+        """Test compile_pipeline caches by id and updated_at"""
+        compiled = compile_pipeline(self.pipeline)
+        assert compile_pipeline(dict(self.pipeline)) is compiled
+        self.pipeline["updated_at"] = "2024-01-02T00:00:00"
+        assert compile_pipeline(self.pipeline) is not compiled
+
+        default_pipeline = {"multi_table": self.pipeline["multi_table"]}
+        assert compile_pipeline(default_pipeline) is not compile_pipeline(
+            default_pipeline
+        )
+
+    def test_delta(self):
+        """Test CompiledPipeline delta"""
+        compiled = CompiledPipeline(self.pipeline)
+        assert compiled.delta(None) is None
+        assert not compiled.delta(compiled)
+        previous = CompiledPipeline(
+            {
+                "multi_table": [
+                    {
+                        "table_id": 0,
+                        "napps_table_groups": {
+                            "of_lldp": ["base"],
+                            "mef_eline": ["epl"],
+                            "coloring": ["base"],
+                        },
+                    },
+                    {"table_id": 1, "napps_table_groups": {"mef_eline": ["evpl"]}},
+                ]
+            }
+        )
+        assert compiled.delta(previous) == {("mef_eline", "epl")}
@@ -0,0 +1,71 @@
+"""Test the rollout rate limits"""
+
+from unittest.mock import MagicMock
+
+from rollout import Rollout, TokenBucket
+
+
+class TestTokenBucket:
+    """Test the TokenBucket class"""
+
+    def test_reserve(self):
+        """Test reserve tokens waiting for the ones in debt"""
+        clock = MagicMock(return_value=0.0)
+        bucket = TokenBucket(10, clock=clock)
+        assert bucket.reserve(10) == 0.0
+        assert bucket.reserve(5) == 0.5
+        assert bucket.reserve(5) == 1.0
+        clock.return_value = 1.0
+        assert bucket.reserve(1) == 0.1
+
+    def test_unlimited(self):
+        """Test a bucket without rate never waits"""
+        sleep = MagicMock()
+        bucket = TokenBucket(0, sleep=sleep)
+        bucket.acquire(1000)
+        assert bucket.reserve(1000) == 0.0
+        assert sleep.call_count == 0
+
+    def test_acquire(self):
+        """Test acquire sleeps for the tokens in debt"""
+        sleep = MagicMock()
+        bucket = TokenBucket(10, clock=MagicMock(return_value=0.0), sleep=sleep)
+        bucket.acquire(10)
+        assert sleep.call_count == 0
+        bucket.acquire(20)
+        sleep.assert_called_with(2.0)
+
+
+class TestRollout:
+    """Test the Rollout class"""
+
+    def test_acquire(self):
+        """Test acquire waits for the slowest limit"""
+        sleep = MagicMock()
+        rollout = Rollout(0, 0, sleep=sleep)
+        rollout.acquire("00:00:00:00:00:00:00:01", 100)
+        assert sleep.call_count == 0
+
+        rollout = Rollout(10, 1000, sleep=sleep)
+        rollout.acquire("00:00:00:00:00:00:00:01", 10)
+        rollout.acquire("00:00:00:00:00:00:00:02", 10)
+        assert sleep.call_count == 0
+        rollout.acquire("00:00:00:00:00:00:00:01", 10)
+        assert sleep.call_count == 1
+        assert 0.9 < sleep.call_args[0][0] <= 1.0
+
+    def test_error_rate(self):
+        """Test the flow errors per FlowMod of a wave"""
+        rollout = Rollout(0, 0)
+        assert rollout.error_rate() == 0.0
+        rollout.start_wave(["00:00:00:00:00:00:00:01"])
+        rollout.acquire("00:00:00:00:00:00:00:01", 10)
+        rollout.record_error("00:00:00:00:00:00:00:01")
+        rollout.record_error("00:00:00:00:00:00:00:02")
+        assert rollout.error_rate() == 0.1
+
+        rollout.start_wave(None)
+        assert rollout.error_rate() == 0.0
+        rollout.acquire("00:00:00:00:00:00:00:01", 4)
+        rollout.record_error("00:00:00:00:00:00:00:02")
+        assert rollout.error_rate() == 0.25
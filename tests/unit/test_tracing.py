@@ -0,0 +1,121 @@
+"""Test the tracing spans"""
+
+import json
+from threading import Event
+
+import httpx
+from napps.kytos.of_multi_table.tracing import (
+    NOOP_SPAN,
+    OTLPExporter,
+    Tracer,
+    otlp_attributes,
+)
+
+
+class TestTracer:
+    """Test the Tracer class"""
+
+    def test_disabled(self):
+        """Test a disabled tracer records nothing"""
+        tracer = Tracer(False, 10)
+        with tracer.start_span("migration") as span:
+            span.set_attribute("flows", 1)
+        assert span is NOOP_SPAN
+        assert not tracer.traces()
+
+    def test_traces(self):
+        """Test spans are grouped by trace, the most recent first"""
+        tracer = Tracer(True, 10)
+        with tracer.start_span("pipeline_change", action="enable") as root:
+            with tracer.start_span("fetch", root) as child:
+                child.set_attribute("flows", 2)
+        with tracer.start_span("pipeline_change", action="disable"):
+            pass
+        traces = tracer.traces()
+        assert len(traces) == 2
+        assert traces[0]["spans"][0]["attributes"] == {"action": "disable"}
+        fetch, pipeline_change = traces[1]["spans"]
+        assert traces[1]["trace_id"] == root.trace_id == child.trace_id
+        assert fetch["parent_id"] == pipeline_change["span_id"]
+        assert fetch["attributes"] == {"flows": 2}
+        assert pipeline_change["parent_id"] is None
+        assert pipeline_change["duration"] >= fetch["duration"]
+
+    def test_span_error(self):
+        """Test a span records the exception raised in its block"""
+        tracer = Tracer(True, 10)
+        try:
+            with tracer.start_span("emit"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        span = tracer.traces()[0]["spans"][0]
+        assert span["attributes"] == {"error": "ValueError('boom')"}
+
+    def test_end_once(self):
+        """Test a span is recorded once and the buffer is bounded"""
+        tracer = Tracer(True, 2)
+        span = tracer.start_span("enable_table")
+        span.end()
+        span.end()
+        assert len(tracer.spans) == 1
+        for _ in range(3):
+            tracer.start_span("fetch").end()
+        assert len(tracer.spans) == 2
+
+    def test_export(self):
+        """Test the spans of a trace are exported when its root span ends,
+        without waiting for the collector"""
+        requests = []
+        release = Event()
+
+        def collector(request):
+            release.wait(5)
+            requests.append(request)
+            return httpx.Response(200, json={})
+
+        client = httpx.Client(transport=httpx.MockTransport(collector))
+        exporter = OTLPExporter("http://collector:4318/", client)
+        tracer = Tracer(True, 10, exporter)
+        with tracer.start_span("pipeline_change") as root:
+            with tracer.start_span("diff", root):
+                pass
+            assert not requests
+        assert not requests
+        release.set()
+        exporter.close()
+        assert len(requests) == 1
+        assert str(requests[0].url) == "http://collector:4318/v1/traces"
+        body = json.loads(requests[0].content)
+        resource_spans = body["resourceSpans"][0]
+        spans = resource_spans["scopeSpans"][0]["spans"]
+        assert [span["name"] for span in spans] == ["diff", "pipeline_change"]
+        assert spans[0]["parentSpanId"] == spans[1]["spanId"] == root.span_id
+        assert spans[1]["traceId"] == root.trace_id
+
+    def test_export_error(self):
+        """Test a collector error does not raise"""
+        client = httpx.Client(
+            transport=httpx.MockTransport(lambda request: httpx.Response(503))
+        )
+        exporter = OTLPExporter("http://collector:4318", client)
+        tracer = Tracer(True, 10)
+        span = tracer.start_span("pipeline_change")
+        assert not exporter.export([span])
+        exporter.close()
+
+
+def test_otlp_attributes():
+    """Test convert attributes to OTLP KeyValues"""
+    assert otlp_attributes(
+        {"ok": True, "flows": 2, "seconds": 0.5, "napps": ["mef_eline"], "id": "x"}
+    ) == [
+        {"key": "ok", "value": {"boolValue": True}},
+        {"key": "flows", "value": {"intValue": "2"}},
+        {"key": "seconds", "value": {"doubleValue": 0.5}},
+        {
+            "key": "napps",
+            "value": {"arrayValue": {"values": [{"stringValue": "mef_eline"}]}},
+        },
+        {"key": "id", "value": {"stringValue": "x"}},
+    ]
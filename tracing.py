@@ -0,0 +1,254 @@
+"""Opt-in tracing spans of pipeline changes, kept in a ring buffer and
+optionally exported to an OTLP/HTTP collector"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Optional
+
+import httpx
+
+from kytos.core import log
+
+
+class Span:
+    """Timed stage of a pipeline change.
+
+    Use it as a context manager or call end(), which records it once.
+    """
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_time",
+        "end_time",
+        "attributes",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        attributes: Dict,
+    ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+        self.attributes = attributes
+
+    def set_attribute(self, key: str, value) -> None:
+        """Set an attribute of the span"""
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        """End and record the span, if it has not ended yet"""
+        if self.end_time is not None:
+            return
+        self.end_time = time.time_ns()
+        self.tracer.record(self)
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Seconds between the start and the end of the span"""
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1e9
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc is not None:
+            self.set_attribute("error", repr(exc))
+        self.end()
+
+    def as_dict(self) -> Dict:
+        """Return a dictionary representation of the span"""
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "attributes": dict(self.attributes),
+        }
+
+
+class NoopSpan:
+    """Span that records nothing, used while tracing is disabled"""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value) -> None:
+        """Ignore the attribute"""
+
+    def end(self) -> None:
+        """Do nothing"""
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def otlp_value(value) -> Dict:
+    """Convert an attribute value to an OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return {"arrayValue": {"values": [otlp_value(item) for item in value]}}
+    if isinstance(value, dict):
+        return {"kvlistValue": {"values": otlp_attributes(value)}}
+    return {"stringValue": str(value)}
+
+
+def otlp_attributes(attributes: Dict) -> list[Dict]:
+    """Convert attributes to OTLP KeyValues"""
+    return [
+        {"key": str(key), "value": otlp_value(value)}
+        for key, value in attributes.items()
+    ]
+
+
+class OTLPExporter:
+    """Export the spans of a trace to an OTLP/HTTP collector, as JSON.
+
+    Traces are sent from a single worker thread, so ending a root span does
+    not wait for the collector.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        client: Optional[httpx.Client] = None,
+        service_name: str = "kytos.of_multi_table",
+    ) -> None:
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.client = client or httpx.Client(timeout=5)
+        self.service_name = service_name
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="of_multi_table_traces"
+        )
+
+    def payload(self, spans: list[Span]) -> Dict:
+        """Build the OTLP ExportTraceServiceRequest of `spans`"""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": otlp_attributes(
+                            {"service.name": self.service_name}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "of_multi_table"},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    "parentSpanId": span.parent_id or "",
+                                    "name": span.name,
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(span.start_time),
+                                    "endTimeUnixNano": str(span.end_time),
+                                    "attributes": otlp_attributes(span.attributes),
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def export(self, spans: list[Span]) -> bool:
+        """Send `spans` to the collector, return if it accepted them"""
+        try:
+            response = self.client.post(self.url, json=self.payload(spans))
+        except httpx.HTTPError as err:
+            log.warning(f"Could not export traces to {self.url}: {err}")
+            return False
+        if response.is_error:
+            log.warning(
+                f"Could not export traces to {self.url}: "
+                f"{response.status_code} {response.text}"
+            )
+            return False
+        return True
+
+    def submit(self, spans: list[Span]) -> Future:
+        """Queue `spans` to be sent to the collector by the worker thread"""
+        return self.executor.submit(self.export, spans)
+
+    def close(self) -> None:
+        """Drop the queued traces, wait for the one being sent and close the
+        HTTP client"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.client.close()
+
+
+class Tracer:
+    """Create spans and keep the last `size` ended ones.
+
+    When a root span ends, the spans of its trace are queued to be exported
+    if there is an exporter.
+    """
+
+    def __init__(
+        self, enabled: bool, size: int, exporter: Optional[OTLPExporter] = None
+    ) -> None:
+        self.enabled = enabled
+        self.spans: deque = deque(maxlen=size)
+        self.exporter = exporter
+        self.lock = Lock()
+
+    def start_span(self, name: str, parent=None, **attributes):
+        """Start a span, child of `parent` if given"""
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None or parent.trace_id is None:
+            return Span(self, name, os.urandom(16).hex(), None, attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def record(self, span: Span) -> None:
+        """Keep an ended span, exporting its trace if it is a root span"""
+        with self.lock:
+            self.spans.append(span)
+            if self.exporter is None or span.parent_id is not None:
+                return
+            spans = [item for item in self.spans if item.trace_id == span.trace_id]
+        self.exporter.submit(spans)
+
+    def traces(self) -> list[Dict]:
+        """Get the ended spans grouped by trace, the most recent first"""
+        with self.lock:
+            spans = list(self.spans)
+        traces: dict[str, list] = {}
+        for span in reversed(spans):
+            traces.setdefault(span.trace_id, []).append(span.as_dict())
+        return [
+            {"trace_id": trace_id, "spans": trace_spans[::-1]}
+            for trace_id, trace_spans in traces.items()
+        ]